@@ -9,6 +9,7 @@
 #     Created by rUv
 # /app.py
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from fastapi.openapi.docs import get_swagger_ui_html
@@ -20,8 +21,33 @@ from routers.bedrock_router import router as bedrock_router
 from routers.management_router import management_router
 from routers.users import router as users_router   
 from deployment.aws.deploy import deploy_router
+from services.deploy_jobs import deploy_jobs, QUEUED
+from services.build_workspace import cleanup_stale_workspaces
+from services.warm_pool import warm_pool
+from services.async_invoker import async_invoker
+from services.power_tuner import power_tuner
+from services.invocation_history import invocation_history
 import subprocess
 
+@asynccontextmanager
+async def lifespan(app):
+    # Mark deploy jobs cut short by a restart as interrupted and reschedule queued ones
+    deploy_jobs.ensure_started()
+    # Remove build workspaces a killed worker left behind, except those of queued jobs
+    queued = deploy_jobs.list(status=QUEUED, limit=1000)
+    cleanup_stale_workspaces(keep={job["request"].get("workspace_id") for job in queued})
+    # Resume keep-warm pings configured before a restart
+    warm_pool.ensure_started()
+    # Keep collecting results of asynchronous invocations still pending
+    await async_invoker.resume()
+    # Mark power-tuning runs cut short by a restart as interrupted
+    power_tuner.recover()
+    yield
+    await warm_pool.stop()
+    await async_invoker.stop()
+    # Write invocations still buffered in memory
+    invocation_history.flush()
+
 app = FastAPI(
     title="Agile Agents",
     description="This is the Agile Agents API documentation.",
@@ -38,6 +64,7 @@ app = FastAPI(
     openapi_url="/api/v1/openapi.json",
     docs_url=None,
     redoc_url=None,
+    lifespan=lifespan,
 )
 
 @app.get("/", include_in_schema=False)
@@ -0,0 +1,62 @@
+# bench_aws_client_registry.py measures per-request latency of a typical
+# handler (create a Lambda client, make one call) with and without the pooled
+# client registry in services.aws_services. moto stands in for AWS.
+#
+# Usage: python benchmarks/bench_aws_client_registry.py [iterations]
+
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import boto3
+from moto import mock_aws
+
+from services.aws_services import get_aws_client, invalidate_aws_clients
+
+REGION = "us-west-2"
+
+
+def per_request_client():
+    return boto3.client("lambda", region_name=REGION)
+
+
+def pooled_client():
+    return get_aws_client("lambda", region_name=REGION)
+
+
+def measure(make_client, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        make_client().list_functions()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<22} mean={statistics.mean(timings):8.2f} ms  p50={statistics.median(timings):8.2f} ms  p95={p95:8.2f} ms")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", REGION)
+    with mock_aws():
+        invalidate_aws_clients()
+        # Warm both paths once so import and moto start-up costs are excluded.
+        per_request_client().list_functions()
+        pooled_client().list_functions()
+
+        print(f"{iterations} requests against moto")
+        report("boto3.client per call", measure(per_request_client, iterations))
+        report("get_aws_client", measure(pooled_client, iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# bench_dockerfile_rebuild.py measures how long `docker build` takes after a
+# code-only change, for a Dockerfile that copies the whole context before
+# installing requirements versus one generated by
+# services.dockerfile_generator (dependency layer first, code layer last).
+# Needs a running Docker daemon with BuildKit and network access for pip.
+#
+# Usage: python benchmarks/bench_dockerfile_rebuild.py [base_image] [requirements] [rebuilds]
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.dockerfile_generator import generate_dockerfile
+
+CMD = '["python", "app.py"]'
+
+
+def code_first_dockerfile(base_image):
+    return f"FROM {base_image}\nCOPY . .\nRUN pip install --no-cache-dir -r requirements.txt\nCMD {CMD}\n"
+
+
+def build(context, tag):
+    start = time.perf_counter()
+    subprocess.run(["docker", "build", "-q", "-t", tag, context], check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def measure(label, dockerfile, requirements, rebuilds):
+    context = tempfile.mkdtemp(prefix="bench-dockerfile-")
+    tag = f"bench-dockerfile-{label}:latest"
+    try:
+        with open(os.path.join(context, "Dockerfile"), "w") as f:
+            f.write(dockerfile)
+        with open(os.path.join(context, "requirements.txt"), "w") as f:
+            f.write(requirements)
+        with open(os.path.join(context, "app.py"), "w") as f:
+            f.write("print(0)\n")
+        cold = build(context, tag)
+        timings = []
+        for i in range(1, rebuilds + 1):
+            # A code-only change, as in a typical redeploy
+            with open(os.path.join(context, "app.py"), "w") as f:
+                f.write(f"print({i})\n")
+            timings.append(build(context, tag))
+        print(f"{label:<12} cold={cold:7.2f} s  rebuild mean={statistics.mean(timings):7.2f} s  "
+              f"min={min(timings):7.2f} s  max={max(timings):7.2f} s")
+    finally:
+        shutil.rmtree(context, ignore_errors=True)
+        subprocess.run(["docker", "rmi", "-f", tag], capture_output=True)
+
+
+def main():
+    if shutil.which("docker") is None:
+        sys.exit("docker is not installed")
+    base_image = sys.argv[1] if len(sys.argv) > 1 else "python:3.11-slim"
+    requirements = (sys.argv[2] if len(sys.argv) > 2 else "requests boto3").replace(" ", "\n") + "\n"
+    rebuilds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    subprocess.run(["docker", "pull", "-q", base_image], check=True, capture_output=True)
+
+    print(f"{rebuilds} rebuilds after a code-only change on {base_image}")
+    measure("code-first", code_first_dockerfile(base_image), requirements, rebuilds)
+    measure("generated", generate_dockerfile(base_image, CMD, source_files=["app.py"]), requirements, rebuilds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# bench_upload_memory.py compares the peak RSS of saving an uploaded file
+# into a build workspace by reading it whole (the old /advanced-deploy path)
+# with streaming it through services.uploads.save_upload. Each strategy runs
+# in its own child process so their peaks do not mix.
+#
+# Usage: python benchmarks/bench_upload_memory.py [size_mb]   (default 2048)
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+CHUNK = 1024 * 1024
+
+CHILD = """
+import resource, sys, time
+sys.path.insert(0, {root!r})
+from services.build_workspace import BuildWorkspace
+from services.uploads import save_upload
+
+strategy, source, workdir = sys.argv[1:4]
+start = time.perf_counter()
+with BuildWorkspace(root=workdir, quota_bytes=1 << 62) as workspace, open(source, "rb") as f:
+    if strategy == "read":
+        workspace.write_bytes("upload.bin", f.read())
+    else:
+        save_upload(workspace, "upload.bin", f, max_bytes=1 << 62)
+elapsed = time.perf_counter() - start
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, elapsed)
+"""
+
+
+def make_upload(path, size_mb):
+    block = os.urandom(CHUNK)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def measure(strategy, source, workdir):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(root=os.path.abspath(ROOT)), strategy, source, workdir],
+        check=True, capture_output=True, text=True
+    ).stdout.split()
+    # ru_maxrss is in kilobytes on Linux
+    return int(output[0]) / 1024, float(output[1])
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "upload.bin")
+        make_upload(source, size_mb)
+        print(f"upload size: {size_mb} MB")
+        for strategy in ("read", "stream"):
+            peak_mb, elapsed = measure(strategy, source, tmp)
+            print(f"{strategy:>6}: peak RSS {peak_mb:8.1f} MB, {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# bench_zip_vs_image.py compares end-to-end deploy latency of a small
+# pure-Python agent deployed as a container image and as a zip package.
+# moto stands in for AWS and a stub docker binary for Docker; the stub can
+# sleep per build and push to approximate a real daemon and registry.
+#
+# Usage: python benchmarks/bench_zip_vs_image.py [iterations] [docker_latency_s]
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+STATE_DIR = tempfile.mkdtemp(prefix="bench-zip-")
+os.environ["AGILEAGENTS_STATE_DIR"] = STATE_DIR
+os.environ["BUILD_WORKSPACE_ROOT"] = os.path.join(STATE_DIR, "builds")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import boto3
+from moto import mock_aws
+
+REGION = "us-west-2"
+
+STUB_DOCKER = """#!{python}
+import hashlib, os, sys, time
+args = sys.argv[1:]
+latency = float(os.environ.get("STUB_DOCKER_LATENCY_S", "0"))
+if args[0] in ("build", "push"):
+    time.sleep(latency)
+if args[:2] == ["image", "inspect"]:
+    print("sha256:" + hashlib.sha256(args[-1].encode()).hexdigest())
+"""
+
+SCRIPT = "def lambda_handler(event, context):\n    return {{'statusCode': 200, 'body': '{i}'}}\n"
+
+
+def install_stub_docker(latency):
+    bin_dir = os.path.join(STATE_DIR, "bin")
+    os.makedirs(bin_dir)
+    path = os.path.join(bin_dir, "docker")
+    with open(path, "w") as f:
+        f.write(STUB_DOCKER.format(python=sys.executable))
+    os.chmod(path, 0o755)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+    os.environ["STUB_DOCKER_LATENCY_S"] = str(latency)
+
+
+def register_pushed_image(repository_name, image_tag):
+    # moto cannot receive a push from the stub docker binary, so register the
+    # manifest the push would create; its config digest never matches the
+    # stub's image ID, so the push itself still runs
+    ecr = boto3.client("ecr", region_name=REGION)
+    try:
+        ecr.create_repository(repositoryName=repository_name)
+    except ecr.exceptions.RepositoryAlreadyExistsException:
+        pass
+    ecr.put_image(repositoryName=repository_name, imageTag=image_tag, imageManifest=json.dumps({
+        "schemaVersion": 2,
+        "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+        "config": {"digest": "sha256:" + "0" * 64, "size": 100},
+        "layers": [],
+    }))
+
+
+async def deploy(manager, package_type, i):
+    request = {
+        "python_script": SCRIPT.format(i=i),
+        "requirements": "",
+        "repository_name": "bench-agents",
+        "image_tag": f"{package_type.lower()}-{i}",
+        "region": REGION,
+        "function_name": f"bench-{package_type.lower()}-{i}",
+        "package_type": package_type,
+    }
+    if package_type == "Image":
+        register_pushed_image(request["repository_name"], request["image_tag"])
+    start = time.perf_counter()
+    job = await manager.wait(manager.submit("deploy", request))
+    if job["status"] != "succeeded":
+        raise RuntimeError(job["error"])
+    return (time.perf_counter() - start) * 1000
+
+
+async def measure(iterations):
+    from deployment.aws import deploy as deploy_module
+    from services.deploy_jobs import DeployJobManager, JobStore
+
+    manager = DeployJobManager(store=JobStore(os.path.join(STATE_DIR, "jobs.sqlite3")))
+    manager.register("deploy", deploy_module.run_deploy_pipeline)
+    timings = {"Image": [], "Zip": []}
+    for i in range(iterations):
+        for package_type in timings:
+            timings[package_type].append(await deploy(manager, package_type, i))
+    return timings
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    install_stub_docker(latency)
+    with mock_aws():
+        timings = asyncio.run(measure(iterations))
+    print(f"{iterations} deploys each, stub docker latency {latency}s per build/push")
+    for package_type, samples in timings.items():
+        print(f"{package_type:>5}: median {statistics.median(samples):8.1f} ms, max {max(samples):8.1f} ms")
+    print(f"speedup: {statistics.median(timings['Image']) / statistics.median(timings['Zip']):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
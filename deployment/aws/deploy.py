@@ -2,28 +2,54 @@ import os
 import subprocess
 import json
 import boto3
+import asyncio
+import functools
 import logging
+import time
 
-from fastapi import APIRouter, HTTPException, File, UploadFile
+from fastapi import APIRouter, HTTPException, File, Form, Header, UploadFile
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
 from models.base_models import DeployRequest, AdvancedDeployRequest
 from services.aws_services import (
     get_aws_client,
+    get_account_id,
     ensure_iam_role,
-    create_ecr_repository,
-    push_docker_image_to_ecr,
-    create_or_update_lambda_function,
+    find_ecr_image_by_config,
+    get_ecr_image_size,
+    get_ecr_replication_regions,
+    wait_for_ecr_image,
+    tag_ecr_image,
+    ecr_credentials,
+    lambda_code_arguments,
+    upload_lambda_package,
+    run_blocking,
 )
-from typing import List, Optional  # Add this import
+from services.build_cache import build_cache, compute_context_hash
+from services.build_workspace import BuildWorkspace, WorkspaceQuotaExceeded
+from services.dockerfile_generator import generate_dockerfile
+from services.uploads import save_upload, UploadTooLarge
+from services.zip_packager import zip_packages, ZIP_DIRECT_UPLOAD_MAX_MB, ZIP_S3_BUCKET
+from services.layer_manager import layer_manager
+from services.lambda_readiness import readiness, function_lock
+from services.warm_pool import warm_pool
+from services.deploy_jobs import deploy_jobs, JobNotFound, IdempotencyKeyConflict, QUEUED, SUCCEEDED, FINISHED_STATUSES
+from services.deploy_metrics import summarize_stages, prometheus_exposition, CONTENT_TYPE_LATEST, DEPLOY_METRICS_WINDOW
+from utils.streaming_utils import encode_stream, stream_media_type
+from utils.subprocess_runner import run_command
+from utils.payload_codec import AGENT_MODULE_NAME, agent_module_source
+from services.wheelhouse import wheelhouse, parse_requirements, requirements_hash, python_version_for_image
+from typing import List, Literal, Optional  # Add this import
 import uuid  # Add this import to generate unique filenames
 
 deploy_router = APIRouter()
 
 # Function to install AWS CLI
 async def install_aws_cli():
-    subprocess.run(["curl", "https://awscli.amazonaws.com/awscli-exe-linux-x86_64.zip", "-o", "awscliv2.zip"], check=True)
-    subprocess.run(["unzip", "awscliv2.zip"], check=True)
-    subprocess.run(["sudo", "./aws/install"], check=True)
-    subprocess.run(["rm", "-rf", "awscliv2.zip", "aws"], check=True)
+    await run_blocking(subprocess.run, ["curl", "https://awscli.amazonaws.com/awscli-exe-linux-x86_64.zip", "-o", "awscliv2.zip"], check=True)
+    await run_blocking(subprocess.run, ["unzip", "awscliv2.zip"], check=True)
+    await run_blocking(subprocess.run, ["sudo", "./aws/install"], check=True)
+    await run_blocking(subprocess.run, ["rm", "-rf", "awscliv2.zip", "aws"], check=True)
 
 
 # Define the logger
@@ -43,7 +69,7 @@ def validate_aws_cli_credentials():
 # Function to validate AWS credentials using boto3
 def validate_boto3_credentials():
     try:
-        boto3.client('sts').get_caller_identity()
+        get_aws_client('sts').get_caller_identity()
         logger.info("boto3 credentials validated successfully.")
     except boto3.exceptions.Boto3Error as e:
         logger.error(f"boto3 credentials validation failed: {str(e)}")
@@ -54,17 +80,17 @@ def validate_boto3_credentials():
 async def list_security_groups(region: Optional[str] = None):
     try:
         # Validate AWS credentials
-        validate_aws_cli_credentials()
-        validate_boto3_credentials()
+        await run_blocking(validate_aws_cli_credentials)
+        await run_blocking(validate_boto3_credentials)
 
         # Set region
         region = region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
 
         # Create EC2 client
-        ec2_client = boto3.client('ec2', region_name=region)
+        ec2_client = get_aws_client('ec2', region_name=region)
 
         # Describe security groups
-        response = ec2_client.describe_security_groups()
+        response = await run_blocking(ec2_client.describe_security_groups)
         security_groups = response['SecurityGroups']
 
         # Extract and return relevant information
@@ -76,101 +102,525 @@ async def list_security_groups(region: Optional[str] = None):
         raise HTTPException(status_code=500, detail=f"An error occurred while listing security groups: {str(e)}")
 
 
-#docker deploy endpoint 
-@deploy_router.post("/dockerdeploy")
-async def deploy(request: DeployRequest):
-    try:
+# Function to run a command for a deploy job and stream its output into the job log
+async def run_job_command(job, cmd, check=True, input=None, log_output=True, timeout=None):
+    """
+    Run a command for a deploy job without blocking the event loop.
+
+    Output lines are appended to the job log as they are produced, so they
+    can be followed live from /deployment/jobs/{job_id}/logs/stream.
+
+    Args:
+        job (DeployJob): The job whose log receives the output.
+        cmd (list): The command and its arguments.
+        check (bool): Raise CalledProcessError on a non-zero exit code.
+        input (str, optional): Text written to the command's stdin.
+        log_output (bool): Whether to log the command's output.
+        timeout (float, optional): Seconds before the command is stopped.
+            Defaults to COMMAND_TIMEOUT_S.
+
+    Returns:
+        subprocess.CompletedProcess: The return code and the retained output.
+    """
+    job.log(f"$ {' '.join(cmd)}")
+    on_line = (lambda stream, line: job.log(line)) if log_output else None
+    result = await run_command(cmd, input=input, timeout=timeout, on_line=on_line)
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
+    return result
+
+# Function to run the docker deploy pipeline as named stages
+async def run_deploy_pipeline(job, request, use_request_dockerfile=True):
+    """
+    Build the image, push it to ECR and create or update the Lambda function.
+
+    Each step runs as a named job stage so its timing and outcome are
+    recorded on the job.
+
+    Args:
+        job (DeployJob): The job recording stages and logs.
+        request (dict): The DeployRequest fields.
+        use_request_dockerfile (bool): Use the request's base image and CMD
+            (/dockerdeploy) instead of the default Lambda Python image (/deploy).
+
+    Returns:
+        dict: The deployment result.
+    """
+    request = DeployRequest(**request)
+    # Each job builds in its own workspace so concurrent deploys never share files
+    with BuildWorkspace(job.job_id) as workspace:
+        return await _deploy_in_workspace(job, request, workspace, use_request_dockerfile)
+
+async def _deploy_in_workspace(job, request, workspace, use_request_dockerfile):
+    region = request.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+    regions = list(dict.fromkeys([region, *(request.regions or [])]))
+    multi_region = len(regions) > 1
+
+    # Step 1: Validate the requirements once, before anything is installed
+    async with job.stage("validate_requirements"):
+        requirements = parse_requirements(request.requirements)
+        req_hash = requirements_hash(requirements)
+
+    # Step 2: Write the Python script, the requirements and the Dockerfile to the build context
+    if use_request_dockerfile:
+        base_image, cmd = request.dockerfile_base_image, request.dockerfile_cmd
+    else:
+        base_image, cmd = "public.ecr.aws/lambda/python:3.9", '["app.lambda_handler"]'
+    python_version = python_version_for_image(base_image)
+    dependency_mode = request.dependency_mode
+    if dependency_mode == "wheelhouse" and python_version is None:
+        job.log(f"Cannot tell the Python version of {base_image}; installing requirements in the image instead")
+        dependency_mode = "image"
+    job.set_metric("dependency_mode", dependency_mode)
+
+    if request.package_type == "Zip":
+        return await deploy_zip_package(job, request, workspace, regions, req_hash, base_image, cmd)
+
+    async with job.stage("write_sources") as stage:
+        workspace.write_text("app.py", request.python_script)
+        # The payload helper lets the agent read and return gzipped or S3-offloaded payloads
+        workspace.write_bytes(AGENT_MODULE_NAME, agent_module_source())
+        requirements_path = workspace.write_text("requirements.txt", request.requirements)
+        dockerfile_content = generate_dockerfile(
+            base_image, cmd,
+            source_files=["app.py", AGENT_MODULE_NAME],
+            wheelhouse=dependency_mode == "wheelhouse"
+        )
+        workspace.write_text("Dockerfile", dockerfile_content)
+        stage["bytes"] = workspace.bytes_written
+
+    # Step 3: Reuse identical images already pushed to ECR
+    build_hash, image_uris = await lookup_cached_images(
+        job, workspace, request.repository_name, regions, request.use_build_cache
+    )
+    results = {r: {"region": r, "build_cache": job.metrics["build_cache_regions"][r]} for r in regions}
+    missing = [r for r in regions if image_uris[r] is None]
+
+    if missing:
         # Ensure Docker is running
-        docker_running = subprocess.run(["docker", "info"], capture_output=True, text=True)
-        if docker_running.returncode != 0:
-            raise HTTPException(status_code=500, detail="Docker daemon is not running. Please start Docker daemon.")
-
-        # Ensure AWS CLI is installed
-        aws_cli_installed = subprocess.run(["aws", "--version"], capture_output=True, text=True)
-        if aws_cli_installed.returncode != 0:
-            await install_aws_cli()
-
-        # Step 1: Create a virtual environment
-        subprocess.run(["python3", "-m", "venv", "venv"], check=True)
-
-        # Step 2: Write the Python script to a temporary file
-        temp_dir = "/tmp/deployment"
-        os.makedirs(temp_dir, exist_ok=True)
-        python_script_path = os.path.join(temp_dir, "app.py")
-        with open(python_script_path, "w") as f:
-            f.write(request.python_script)
-
-        # Step 3: Write the requirements to a file
-        requirements_path = os.path.join(temp_dir, "requirements.txt")
-        with open(requirements_path, "w") as f:
-            f.write(request.requirements)
-
-        # Step 4: Install dependencies
-        subprocess.run(["venv/bin/pip", "install", "-r", requirements_path], check=True)
-
-        # Step 5: Create a Dockerfile with the specified attributes
-        dockerfile_content = f"""
-        FROM {request.dockerfile_base_image}
-        COPY requirements.txt .
-        RUN pip install -r requirements.txt
-        COPY app.py .
-        CMD {request.dockerfile_cmd}
-        """
-        dockerfile_path = os.path.join(temp_dir, "Dockerfile")
-        with open(dockerfile_path, "w") as f:
-            f.write(dockerfile_content)
-
-        # Step 6: Build the Docker image
-        image_name = f"{request.repository_name}:{request.image_tag}"
-        build_result = subprocess.run(["docker", "build", "-t", image_name, temp_dir], capture_output=True, text=True)
-
-        if build_result.returncode != 0:
-            raise HTTPException(status_code=500, detail=f"Docker build failed: {build_result.stderr}")
-
-        # Step 7: Authenticate Docker to AWS ECR
-        region = request.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
-        account_id = boto3.client('sts').get_caller_identity().get('Account')
-        ecr_uri = f"{account_id}.dkr.ecr.{region}.amazonaws.com"
-        
-        login_password = subprocess.run(
-            ["aws", "ecr", "get-login-password", "--region", region], 
-            capture_output=True, text=True, check=True
-        ).stdout.strip()
-        
-        login_result = subprocess.run(
-            ["docker", "login", "--username", "AWS", "--password-stdin", ecr_uri],
-            input=login_password, text=True, capture_output=True
+        async with job.stage("docker_info"):
+            docker_running = await run_job_command(job, ["docker", "info"], check=False, log_output=False, timeout=30)
+            if docker_running.returncode != 0:
+                raise HTTPException(status_code=500, detail="Docker daemon is not running. Please start Docker daemon.")
+
+        # Step 4: Prepare the dependencies the image build installs
+        build_options = await prepare_dependencies(
+            job, workspace, dependency_mode, requirements_path, req_hash, python_version
         )
 
-        if login_result.returncode != 0:
-            raise HTTPException(status_code=500, detail=f"Docker login failed: {login_result.stderr}")
+        # Step 5: Build the Docker image under a tag unique to this build
+        image_name = f"{request.repository_name}:{request.image_tag}"
+        local_image = f"{image_name}-build-{workspace.workspace_id[:12]}"
+        async with job.stage("docker_build") as stage:
+            # The build context sent to the daemon
+            stage["bytes"] = workspace.bytes_written
+            build_result = await run_job_command(
+                job, ["docker", "build", *build_options, "-t", local_image, workspace.context_dir], check=False
+            )
+            if build_result.returncode != 0:
+                raise HTTPException(status_code=500, detail=f"Docker build failed: {build_result.stderr}")
+
+        # Step 6: Push the image to every region that lacks it, concurrently
+        replicated = []
+        if multi_region and request.use_ecr_replication and region in missing:
+            async with job.stage("ecr_replication_config"):
+                replicated = [
+                    r for r in await run_blocking(get_ecr_replication_regions, request.repository_name, region)
+                    if r in missing and r != region
+                ]
+
+        async def push_to_region(push_region):
+            uri, push = await distribute_image(job, request, push_region, local_image, multi_region)
+            await store_cached_image(
+                job, build_hash, request.repository_name, request.image_tag, push_region, uri,
+                stage_name=region_stage("build_cache_store", push_region, multi_region)
+            )
+            results[push_region].update(push)
+            return uri
+
+        async def replicate_to_region(replica_region):
+            # The primary push triggers ECR replication; wait for the copy to arrive
+            await region_tasks[region]
+            async with job.stage(region_stage("ecr_replication_wait", replica_region, True)):
+                await run_blocking(wait_for_ecr_image, request.repository_name, request.image_tag, replica_region)
+            account_id = await run_blocking(get_account_id)
+            uri = f"{account_id}.dkr.ecr.{replica_region}.amazonaws.com/{request.repository_name}:{request.image_tag}"
+            await store_cached_image(
+                job, build_hash, request.repository_name, request.image_tag, replica_region, uri,
+                stage_name=region_stage("build_cache_store", replica_region, True)
+            )
+            results[replica_region].update(replicated=True, push_skipped=True, push_bytes_avoided=0)
+            return uri
+
+        region_tasks = {}
+        for r in missing:
+            runner = replicate_to_region if r in replicated else push_to_region
+            region_tasks[r] = asyncio.ensure_future(timed_region_step(results[r], "push_s", runner(r)))
+        await asyncio.gather(*region_tasks.values(), return_exceptions=True)
+        for r, task in region_tasks.items():
+            if not task.exception():
+                image_uris[r] = task.result()
+        await run_job_command(job, ["docker", "rmi", local_image], check=False)
+
+    pushed = [results[r] for r in missing]
+    job.set_metric("push_skipped", all(result.get("push_skipped", False) for result in pushed) if pushed else None)
+    job.set_metric("push_bytes_avoided", sum(result.get("push_bytes_avoided", 0) for result in pushed))
+
+    # Step 7: Create or update the Lambda function in every region with an image, in parallel
+    async with job.stage("ensure_iam_role"):
+        account_id = await run_blocking(get_account_id)
+        role_arn = await run_blocking(ensure_iam_role, "lambda-execution-role", account_id)
+
+    async def deploy_to_region(deploy_region):
+        async with job.stage(region_stage("create_or_update_function", deploy_region, multi_region)):
+            response = await deploy_lambda_function(request, deploy_region, image_uris[deploy_region], role_arn)
+        await wait_for_ready(job, request, deploy_region, multi_region, results[deploy_region])
+        results[deploy_region].update(image_uri=image_uris[deploy_region], lambda_arn=response['FunctionArn'])
+
+    await asyncio.gather(*(
+        timed_region_step(results[r], "lambda_s", deploy_to_region(r))
+        for r in regions if image_uris[r] is not None
+    ), return_exceptions=True)
+
+    return region_response(job, results, region, {
+        "image_uri": results[region].get("image_uri"),
+        "build_cache": job.metrics.get("build_cache"),
+        "push_skipped": job.metrics.get("push_skipped"),
+        "push_bytes_avoided": job.metrics.get("push_bytes_avoided"),
+        "dependency_time_saved_s": job.metrics.get("dependency_time_saved_s"),
+        "time_to_ready_s": results[region].get("time_to_ready_s"),
+    })
+
+# Function to get the handler of a zip package, by default the first entry of the Dockerfile CMD
+def zip_package_handler(handler, cmd):
+    if handler:
+        return handler
+    try:
+        command = json.loads(cmd)
+    except (TypeError, ValueError):
+        command = None
+    if not isinstance(command, list) or not command or not isinstance(command[0], str) or not command[0]:
+        raise HTTPException(status_code=400, detail=f"Cannot tell the handler from dockerfile_cmd {cmd!r}; set handler for zip packages")
+    return command[0]
+
+# Function to deploy a zip package, built without Docker, to every requested region
+async def deploy_zip_package(job, request, workspace, regions, req_hash, base_image, cmd):
+    """
+    Package the script and its wheels as a deterministic zip and deploy it.
+
+    The requirements are downloaded as wheels for the Lambda platform (once
+    per requirements set) and unpacked into the package next to app.py,
+    or, for dependency sets shared by several deploys, published once per
+    region as a Lambda layer that the function attaches. Packages are
+    cached by input hash, so an unchanged agent is not repackaged.
+    Packages up to ZIP_DIRECT_UPLOAD_MAX_MB are sent inline; larger ones
+    are uploaded to S3 first.
+
+    Returns:
+        dict: The deployment result.
+    """
+    region, multi_region = regions[0], len(regions) > 1
+    python_version = request.runtime[len("python"):] if request.runtime else python_version_for_image(base_image)
+    if python_version is None:
+        raise HTTPException(status_code=400, detail=f"Cannot tell the Python version of {base_image}; set runtime for zip packages")
+    runtime = request.runtime or f"python{python_version}"
+    handler = zip_package_handler(request.handler, cmd)
+    job.set_metric("package_type", "Zip")
+
+    # Step 1: Download the requirements as wheels for the Lambda platform
+    wheel_paths = []
+    if req_hash != requirements_hash([]):
+        async with job.stage("zip_dependencies") as stage:
+            stage["bytes"] = 0
+            async with wheelhouse.download_lock(python_version):
+                wheel_paths = await run_blocking(wheelhouse.set_wheels, python_version, req_hash)
+                if wheel_paths is None:
+                    requirements_path = workspace.write_text("requirements.txt", request.requirements)
+                    await run_job_command(job, wheelhouse.download_command(
+                        requirements_path, python_version, dest=wheelhouse.set_path(python_version, req_hash)
+                    ))
+                    await run_blocking(wheelhouse.mark_set_complete, python_version, req_hash)
+                    wheel_paths = await run_blocking(wheelhouse.set_wheels, python_version, req_hash)
+                    stage["bytes"] = sum(os.path.getsize(path) for path in wheel_paths)
+                else:
+                    job.log("Requirements already downloaded for zip packaging")
+
+    # Step 2: Decide whether the dependencies go in a shared layer or in the package
+    use_layer = False
+    if wheel_paths and request.dependency_layer != "never":
+        function_count = await run_blocking(
+            layer_manager.record_deploy, req_hash, python_version, request.function_name
+        )
+        use_layer = request.dependency_layer == "always" or layer_manager.is_shared(function_count)
+        job.log(f"Requirements set deployed by {function_count} function(s); "
+                f"{'using a shared layer' if use_layer else 'bundling dependencies'}")
+
+    # Step 3: Build the zip packages, or reuse the cached ones for the same inputs
+    async with job.stage("zip_package") as stage:
+        sources = {"app.py": request.python_script.encode("utf-8"), AGENT_MODULE_NAME: agent_module_source()}
+        package = await run_blocking(zip_packages.build, sources, [] if use_layer else wheel_paths)
+        job.log(f"Zip package {package['input_hash'][:12]}: {package['size']} bytes ({'cached' if package['cached'] else 'built'})")
+        layer_package = await run_blocking(zip_packages.build, {}, wheel_paths, "python/") if use_layer else None
+        stage["bytes"] = package["size"] + (layer_package["size"] if layer_package else 0)
+    bucket = request.s3_bucket or ZIP_S3_BUCKET
+    for zip_package in filter(None, (package, layer_package)):
+        zip_package["inline"] = zip_package["size"] <= ZIP_DIRECT_UPLOAD_MAX_MB * 1024 * 1024
+        if not zip_package["inline"] and not bucket:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Zip package exceeds {ZIP_DIRECT_UPLOAD_MAX_MB} MB; set s3_bucket or ZIP_S3_BUCKET to upload it through S3"
+            )
+        if zip_package["inline"]:
+            with open(zip_package["path"], "rb") as f:
+                zip_package["zip_file"] = f.read()
+    job.set_metric("zip_package", {
+        "input_hash": package["input_hash"],
+        "size": package["size"],
+        "code_sha256": package["code_sha256"],
+        "cached": package["cached"],
+        "upload": "inline" if package["inline"] else "s3",
+        "dependency_layer": use_layer,
+    })
+
+    # Step 4: Create or update the Lambda function in every region, in parallel
+    async with job.stage("ensure_iam_role"):
+        account_id = await run_blocking(get_account_id)
+        role_arn = await run_blocking(ensure_iam_role, "lambda-execution-role", account_id)
+
+    results = {r: {"region": r} for r in regions}
+
+    async def zip_content(zip_package, deploy_region, stage_name, key):
+        if zip_package["inline"]:
+            return {"ZipFile": zip_package["zip_file"]}
+        async with job.stage(region_stage(stage_name, deploy_region, multi_region)) as stage:
+            stage["bytes"] = zip_package["size"]
+            return await run_blocking(
+                upload_lambda_package, zip_package["path"], bucket.format(region=deploy_region), key, deploy_region
+            )
 
-        # Step 8: Create ECR repository if it doesn't exist
-        ecr_client = boto3.client('ecr', region_name=region)
+    async def deploy_to_region(deploy_region):
+        layers = []
+        if use_layer:
+            # Layers are regional: publish once per region, then reuse
+            async with layer_manager.publish_lock(req_hash, python_version, deploy_region):
+                layer = await run_blocking(layer_manager.lookup, req_hash, python_version, deploy_region)
+                results[deploy_region]["dependency_layer"] = "reused" if layer else "published"
+                if layer is None:
+                    content = await zip_content(
+                        layer_package, deploy_region, "layer_s3_upload",
+                        f"lambda-layers/{layer_package['input_hash']}.zip"
+                    )
+                    async with job.stage(region_stage("publish_layer", deploy_region, multi_region)) as stage:
+                        stage["bytes"] = layer_package["size"] if layer_package["inline"] else 0
+                        layer = await run_blocking(
+                            layer_manager.publish, req_hash, python_version, deploy_region,
+                            content, layer_package["size"], runtime
+                        )
+            layers = [layer["layer_version_arn"]]
+        content = await zip_content(
+            package, deploy_region, "s3_upload", f"lambda-packages/{request.function_name}/{package['input_hash']}.zip"
+        )
+        async with job.stage(region_stage("create_or_update_function", deploy_region, multi_region)) as stage:
+            stage["bytes"] = package["size"] if package["inline"] else 0
+            response = await deploy_lambda_function(request, deploy_region, None, role_arn, package={
+                "runtime": runtime,
+                "handler": handler,
+                "layers": layers,
+                "zip_file": content.get("ZipFile"),
+                "s3_bucket": content.get("S3Bucket"),
+                "s3_key": content.get("S3Key"),
+            })
+        await wait_for_ready(job, request, deploy_region, multi_region, results[deploy_region])
+        results[deploy_region]["lambda_arn"] = response['FunctionArn']
+
+    await asyncio.gather(*(
+        timed_region_step(results[r], "lambda_s", deploy_to_region(r)) for r in regions
+    ), return_exceptions=True)
+
+    return region_response(job, results, region, {
+        "package_type": "Zip",
+        "code_sha256": package["code_sha256"],
+        "package_size": package["size"],
+        "package_cache": "hit" if package["cached"] else "miss",
+        "dependency_layer": results[region].get("dependency_layer"),
+        "time_to_ready_s": results[region].get("time_to_ready_s"),
+    })
+
+# Function to summarize per-region deploy results into the job result
+def region_response(job, results, region, fields):
+    """
+    Mark each region's status and build the deploy response.
+
+    A single-region deploy re-raises its error; a multi-region deploy fails
+    only when every region failed and otherwise lists each region.
+
+    Returns:
+        dict: The message, the primary region's Lambda ARN and the given fields.
+    """
+    regions = list(results)
+    for result in results.values():
+        result["status"] = "success" if result.get("lambda_arn") else "error"
+    failed = [result for result in results.values() if result["status"] == "error"]
+    if len(regions) == 1 and failed:
+        raise failed[0]["exception"]
+    for result in results.values():
+        result.pop("exception", None)
+    job.set_metric("regions", results)
+    if len(failed) == len(regions):
+        raise Exception("Deployment failed in every region: " + "; ".join(f"{r['region']}: {r['error']}" for r in failed))
+
+    response = {
+        "message": "Deployment successful" if not failed else f"Deployment succeeded in {len(regions) - len(failed)} of {len(regions)} regions",
+        "lambda_arn": results[region].get("lambda_arn"),
+        **fields,
+    }
+    if len(regions) > 1:
+        response["regions"] = results
+        response["summary"] = {"total": len(regions), "succeeded": len(regions) - len(failed), "failed": len(failed)}
+    return response
+
+# Function to wait until a created or updated function can be invoked
+async def wait_for_ready(job, request, region, multi_region, result):
+    """
+    Wait until the function is Active with a successful last update and
+    record the time it took, unless the request opted out with wait_for_ready.
+    """
+    if not request.wait_for_ready:
+        return
+    async with job.stage(region_stage("wait_for_ready", region, multi_region)):
+        ready = await readiness.wait(request.function_name, region)
+    result["time_to_ready_s"] = ready["time_to_ready_s"]
+    job.log(f"{request.function_name} in {region} ready after {ready['time_to_ready_s']}s ({ready['polls']} polls)")
+
+# Function to name a stage after its region in multi-region deploys
+def region_stage(name, region, multi_region):
+    return f"{name}[{region}]" if multi_region else name
+
+# Function to time one region's step and record its failure instead of raising
+async def timed_region_step(result, timing_key, step):
+    start = time.perf_counter()
+    try:
+        return await step
+    except Exception as e:
+        result.setdefault("error", getattr(e, "detail", None) or str(e))
+        result.setdefault("exception", e)
+        raise
+    finally:
+        result[timing_key] = round(time.perf_counter() - start, 3)
+
+# Function to get a built image into one region's ECR repository
+async def distribute_image(job, request, region, local_image, multi_region=False):
+    """
+    Push the local image to one region, or tag it remotely if ECR already holds it.
+
+    Returns:
+        tuple: The image URI and the push outcome (push_skipped, push_bytes_avoided).
+    """
+    image_name = f"{request.repository_name}:{request.image_tag}"
+    # Create ECR repository if it doesn't exist
+    async with job.stage(region_stage("ensure_repository", region, multi_region)):
+        ecr_client = get_aws_client('ecr', region_name=region)
         try:
-            ecr_client.create_repository(repositoryName=request.repository_name)
+            await run_blocking(ecr_client.create_repository, repositoryName=request.repository_name)
         except ecr_client.exceptions.RepositoryAlreadyExistsException:
             pass
 
-        # Step 9: Tag and push the Docker image to ECR
-        subprocess.run(["docker", "tag", image_name, f"{ecr_uri}/{image_name}"], check=True)
-        subprocess.run(["docker", "push", f"{ecr_uri}/{image_name}"], check=True)
-
-        # Step 10: Create or update the Lambda function
-        role_name = "lambda-execution-role"
-        role_arn = ensure_iam_role(role_name, account_id)
-
-        lambda_client = boto3.client('lambda', region_name=region)
-        function_name = request.function_name
-        try:
-            response = lambda_client.create_function(
+    # Look for an identical image already in the repository
+    async with job.stage(region_stage("ecr_image_check", region, multi_region)):
+        local_image_id = (await run_job_command(
+            job, ["docker", "image", "inspect", "--format", "{{.Id}}", local_image], log_output=False
+        )).stdout.strip()
+        existing = await run_blocking(find_ecr_image_by_config, request.repository_name, local_image_id, region)
+
+    # Tag the existing image remotely, or authenticate and push the Docker image to ECR
+    if existing is not None:
+        async with job.stage(region_stage("ecr_retag", region, multi_region)) as stage:
+            stage["bytes"] = 0
+            await run_blocking(tag_ecr_image, request.repository_name, existing, request.image_tag, region)
+            account_id = await run_blocking(get_account_id)
+            image_uri = f"{account_id}.dkr.ecr.{region}.amazonaws.com/{image_name}"
+            job.log(f"ECR already holds {existing['image_digest']}; tagged it without pushing")
+    else:
+        async with job.stage(region_stage("ecr_login", region, multi_region)):
+            login = await run_blocking(ecr_credentials.ensure_docker_login, region)
+            ecr_uri = login["registry"]
+            job.log(f"Docker login to {ecr_uri}: {'logged in' if login['logged_in'] else 'reused cached login'}")
+
+        image_uri = f"{ecr_uri}/{image_name}"
+        async with job.stage(region_stage("docker_push", region, multi_region)) as stage:
+            await run_job_command(job, ["docker", "tag", local_image, image_uri])
+            await run_job_command(job, ["docker", "push", image_uri])
+            # ECR's compressed image size: an upper bound, as layers the registry already had are not resent
+            stage["bytes"] = await run_blocking(get_ecr_image_size, request.repository_name, request.image_tag, region)
+    return image_uri, {
+        "push_skipped": existing is not None,
+        "push_bytes_avoided": existing["size"] if existing is not None else 0,
+    }
+
+# Function to create or update the Lambda function of a deploy request in one region
+async def deploy_lambda_function(request, region, image_uri, role_arn, package=None):
+    """
+    Create or update the function from an image, or from a zip package when
+    package (runtime, handler, layers and zip_file or s3_bucket/s3_key) is given.
+    """
+    # Different deploys of the same function would race on create_function/update_function_code
+    async with function_lock(request.function_name, region):
+        return await _deploy_lambda_function(request, region, image_uri, role_arn, package)
+
+async def _deploy_lambda_function(request, region, image_uri, role_arn, package):
+    lambda_client = get_aws_client('lambda', region_name=region)
+    function_name = request.function_name
+    package = package or {}
+    code, update_code = lambda_code_arguments(
+        image_uri, package.get("zip_file"), package.get("s3_bucket"), package.get("s3_key")
+    )
+    package_arguments = {'Runtime': package["runtime"], 'Handler': package["handler"]} if package else {}
+    if package.get("layers"):
+        package_arguments['Layers'] = package["layers"]
+    try:
+        response = await run_blocking(
+            lambda_client.create_function,
+            FunctionName=function_name,
+            Role=role_arn,
+            Code=code,
+            PackageType='Zip' if package else 'Image',
+            Publish=True,
+            MemorySize=request.memory_size,
+            EphemeralStorage={
+                'Size': request.storage_size
+            },
+            Environment={
+                'Variables': request.environment_variables or {}
+            },
+            VpcConfig={
+                'SubnetIds': request.subnet_ids or [],
+                'SecurityGroupIds': request.security_group_ids or []
+            } if request.vpc_id else {},
+            **package_arguments
+        )
+    except lambda_client.exceptions.ResourceConflictException:
+        # A previous deploy's update may still be in progress
+        await readiness.wait(function_name, region)
+        if package.get("layers"):
+            # Attach the layers first so the version published with the new code includes them
+            await run_blocking(
+                lambda_client.update_function_configuration,
+                FunctionName=function_name,
+                Layers=package["layers"]
+            )
+            await readiness.wait(function_name, region)
+        response = await run_blocking(
+            lambda_client.update_function_code,
+            FunctionName=function_name,
+            Publish=True,
+            **update_code
+        )
+        if request.vpc_id:
+            # Lambda rejects a configuration update while the code update is still in progress
+            await readiness.wait(function_name, region)
+            await run_blocking(
+                lambda_client.update_function_configuration,
                 FunctionName=function_name,
-                Role=role_arn,
-                Code={
-                    'ImageUri': f"{ecr_uri}/{image_name}"
-                },
-                PackageType='Image',
-                Publish=True,
                 MemorySize=request.memory_size,
                 EphemeralStorage={
                     'Size': request.storage_size
@@ -181,227 +631,378 @@ async def deploy(request: DeployRequest):
                 VpcConfig={
                     'SubnetIds': request.subnet_ids or [],
                     'SecurityGroupIds': request.security_group_ids or []
-                } if request.vpc_id else {}
+                }
             )
-        except lambda_client.exceptions.ResourceConflictException:
-            response = lambda_client.update_function_code(
-                FunctionName=function_name,
-                ImageUri=f"{ecr_uri}/{image_name}",
-                Publish=True
-            )
-            if request.vpc_id:
-                lambda_client.update_function_configuration(
-                    FunctionName=function_name,
-                    MemorySize=request.memory_size,
-                    EphemeralStorage={
-                        'Size': request.storage_size
-                    },
-                    Environment={
-                        'Variables': request.environment_variables or {}
-                    },
-                    VpcConfig={
-                        'SubnetIds': request.subnet_ids or [],
-                        'SecurityGroupIds': request.security_group_ids or []
-                    }
-                )
-
-        return {"message": "Deployment successful", "image_uri": f"{ecr_uri}/{image_name}", "lambda_arn": response['FunctionArn']}
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
+    # Provisioned environments serve the warm pool's alias, so move it to the code just deployed
+    await warm_pool.advance_alias(function_name, region)
+    return response
+
+# Function to prepare the dependencies for the image build and record the time saved
+async def prepare_dependencies(job, workspace, dependency_mode, requirements_path, req_hash, python_version):
+    """
+    Prepare the requirements for the Docker build according to the dependency mode.
+
+    "image" installs only inside the image. "wheelhouse" first downloads
+    wheels for the image's platform into the shared wheelhouse (once per
+    requirements set) and mounts it into the build. "host_venv" also
+    installs into a host virtualenv, as deploys used to; its duration is
+    recorded as the baseline the other modes are compared against.
+
+    Returns:
+        list: Extra `docker build` options.
+    """
+    start = time.perf_counter()
+    build_options = []
+    if dependency_mode == "host_venv":
+        venv_dir = workspace.scratch_path("venv")
+        async with job.stage("create_venv"):
+            await run_job_command(job, ["python3", "-m", "venv", venv_dir])
+        async with job.stage("install_dependencies"):
+            await run_job_command(job, [os.path.join(venv_dir, "bin", "pip"), "install", "-r", requirements_path])
+            workspace.check_quota()
+        await run_blocking(wheelhouse.record_baseline, req_hash, time.perf_counter() - start)
+    elif dependency_mode == "wheelhouse":
+        async with job.stage("wheelhouse"):
+            async with wheelhouse.download_lock(python_version):
+                if wheelhouse.is_resolved(python_version, req_hash):
+                    job.log("Requirements already resolved in the wheelhouse")
+                else:
+                    await run_job_command(job, wheelhouse.download_command(requirements_path, python_version))
+                    await run_blocking(wheelhouse.mark_resolved, python_version, req_hash)
+                    if await run_blocking(wheelhouse.get_baseline, req_hash) is None:
+                        # Downloading is most of what a host install does
+                        await run_blocking(wheelhouse.record_baseline, req_hash, time.perf_counter() - start)
+        build_options = ["--build-context", f"wheelhouse={wheelhouse.path(python_version)}"]
+
+    spent = time.perf_counter() - start
+    baseline = await run_blocking(wheelhouse.get_baseline, req_hash)
+    job.set_metric("dependency_time_s", round(spent, 3))
+    job.set_metric("host_install_baseline_s", baseline)
+    job.set_metric(
+        "dependency_time_saved_s",
+        round(max(0.0, baseline - spent), 3) if baseline is not None and dependency_mode != "host_venv" else None
+    )
+    return build_options
+
+# Function to look up an already-pushed image for the current build context
+async def lookup_cached_image(job, workspace, repository_name, region, use_build_cache=True):
+    """
+    Hash the build context and look for an identical image already in ECR.
+
+    Returns:
+        tuple: The build hash and the cached image URI (pinned by digest), or None on a miss.
+    """
+    build_hash, image_uris = await lookup_cached_images(job, workspace, repository_name, [region], use_build_cache)
+    return build_hash, image_uris[region]
+
+# Function to look up already-pushed images for the current build context in several regions
+async def lookup_cached_images(job, workspace, repository_name, regions, use_build_cache=True):
+    """
+    Hash the build context once and look for an identical image in each region's ECR.
+
+    The job's build_cache metric is "hit" only when every region hits;
+    build_cache_regions holds the outcome per region.
+
+    Returns:
+        tuple: The build hash and a dict of region to cached image URI (pinned by digest) or None.
+    """
+    async with job.stage("build_cache_lookup"):
+        build_hash = await run_blocking(compute_context_hash, workspace.context_dir)
+        job.set_metric("build_hash", build_hash)
+        if not use_build_cache:
+            job.set_metric("build_cache_regions", {region: "disabled" for region in regions})
+            job.set_metric("build_cache", "disabled")
+            return build_hash, {region: None for region in regions}
+        entries = await asyncio.gather(*(
+            run_blocking(build_cache.lookup, build_hash, repository_name, region) for region in regions
+        ))
+        image_uris = {}
+        for region, entry in zip(regions, entries):
+            if entry is None:
+                image_uris[region] = None
+                continue
+            image_uris[region] = f"{entry['image_uri'].rsplit(':', 1)[0]}@{entry['image_digest']}"
+            job.log(f"Build cache hit: reusing {image_uris[region]}")
+        job.set_metric("build_cache_regions", {region: "miss" if uri is None else "hit" for region, uri in image_uris.items()})
+        job.set_metric("build_cache", "miss" if None in image_uris.values() else "hit")
+        return build_hash, image_uris
+
+# Function to record a freshly pushed image in the build cache
+async def store_cached_image(job, build_hash, repository_name, image_tag, region, image_uri, stage_name="build_cache_store"):
+    async with job.stage(stage_name):
+        ecr_client = get_aws_client('ecr', region_name=region)
+        response = await run_blocking(
+            ecr_client.describe_images,
+            repositoryName=repository_name,
+            imageIds=[{'imageTag': image_tag}]
+        )
+        image_digest = response['imageDetails'][0]['imageDigest']
+        await run_blocking(build_cache.store, build_hash, repository_name, region, image_uri, image_digest)
+
+# Function to run the advanced deploy pipeline as named stages
+async def run_advanced_deploy_pipeline(job, request):
+    """
+    Build an image from uploaded files and custom build commands, push it
+    and create or update the Lambda function.
+
+    Args:
+        job (DeployJob): The job recording stages and logs.
+        request (dict): The AdvancedDeployRequest fields.
+
+    Returns:
+        dict: The deployment result.
+    """
+    workspace = BuildWorkspace(request.pop("workspace_id", None) or job.job_id).create()
+    job.set_metric("uploads", request.pop("uploads", []))
+    request = AdvancedDeployRequest(**request)
+    with workspace:
+        return await _advanced_deploy_in_workspace(job, request, workspace)
+
+async def _advanced_deploy_in_workspace(job, request, workspace):
+    region = request.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+
+    # Create Dockerfile with advanced options
+    async with job.stage("write_dockerfile"):
+        # Install uploaded requirements in their own layer, before the code is copied
+        has_requirements = os.path.isfile(workspace.context_path("requirements.txt"))
+        dockerfile_content = generate_dockerfile(
+            request.base_image, '["app.lambda_handler"]',
+            requirements_file="requirements.txt" if has_requirements else None,
+            build_commands=request.build_commands
+        )
+        workspace.write_text("Dockerfile", dockerfile_content)
 
-# Deployment endpoint
-@deploy_router.post("/deploy")
-async def deploy(request: DeployRequest):
-    try:
+    # Reuse an identical image already pushed to ECR
+    build_hash, image_uri = await lookup_cached_image(job, workspace, request.repository_name, region, request.use_build_cache)
+
+    if image_uri is None:
         # Ensure Docker is running
-        docker_running = subprocess.run(["docker", "info"], capture_output=True, text=True)
-        if docker_running.returncode != 0:
-            raise HTTPException(status_code=500, detail="Docker daemon is not running. Please start Docker daemon.")
-
-        # Ensure AWS CLI is installed
-        aws_cli_installed = subprocess.run(["aws", "--version"], capture_output=True, text=True)
-        if aws_cli_installed.returncode != 0:
-            await install_aws_cli()
-
-        # Step 1: Create a virtual environment
-        subprocess.run(["python3", "-m", "venv", "venv"], check=True)
-
-        # Step 2: Write the Python script to a temporary file
-        temp_dir = "/tmp/deployment"
-        os.makedirs(temp_dir, exist_ok=True)
-        python_script_path = os.path.join(temp_dir, "app.py")
-        with open(python_script_path, "w") as f:
-            f.write(request.python_script)
-
-        # Step 3: Write the requirements to a file
-        requirements_path = os.path.join(temp_dir, "requirements.txt")
-        with open(requirements_path, "w") as f:
-            f.write(request.requirements)
-
-        # Step 4: Install dependencies
-        subprocess.run(["venv/bin/pip", "install", "-r", requirements_path], check=True)
-
-        # Step 5: Create a Dockerfile
-        dockerfile_content = f"""
-        FROM public.ecr.aws/lambda/python:3.9
-        COPY requirements.txt .
-        RUN pip install -r requirements.txt
-        COPY app.py .
-        CMD ["app.lambda_handler"]
-        """
-        dockerfile_path = os.path.join(temp_dir, "Dockerfile")
-        with open(dockerfile_path, "w") as f:
-            f.write(dockerfile_content)
-
-        # Step 6: Build the Docker image
-        image_name = f"{request.repository_name}:{request.image_tag}"
-        build_result = subprocess.run(["docker", "build", "-t", image_name, temp_dir], capture_output=True, text=True)
-
-        if build_result.returncode != 0:
-            raise HTTPException(status_code=500, detail=f"Docker build failed: {build_result.stderr}")
-
-        # Step 7: Authenticate Docker to AWS ECR
-        region = request.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
-        account_id = boto3.client('sts').get_caller_identity().get('Account')
-        ecr_uri = f"{account_id}.dkr.ecr.{region}.amazonaws.com"
-        
-        login_password = subprocess.run(
-            ["aws", "ecr", "get-login-password", "--region", region], 
-            capture_output=True, text=True, check=True
-        ).stdout.strip()
-        
-        login_result = subprocess.run(
-            ["docker", "login", "--username", "AWS", "--password-stdin", ecr_uri],
-            input=login_password, text=True, capture_output=True
+        async with job.stage("docker_info"):
+            await run_job_command(job, ["docker", "info"], log_output=False, timeout=30)
+
+        # Build the Docker image under a tag unique to this build
+        local_image = f"{request.repository_name}:{request.image_tag}-build-{workspace.workspace_id[:12]}"
+        async with job.stage("docker_build") as stage:
+            stage["bytes"] = workspace.bytes_written
+            await run_job_command(job, ["docker", "build", "-t", local_image, workspace.context_dir])
+
+        # Push the Docker image to ECR, unless ECR already holds an identical image
+        image_uri, push = await distribute_image(job, request, region, local_image)
+        await run_job_command(job, ["docker", "rmi", local_image], check=False)
+        job.set_metric("push_skipped", push["push_skipped"])
+        job.set_metric("push_bytes_avoided", push["push_bytes_avoided"])
+
+        await store_cached_image(job, build_hash, request.repository_name, request.image_tag, region, image_uri)
+
+    # Ensure IAM role exists
+    async with job.stage("ensure_iam_role"):
+        account_id = await run_blocking(get_account_id)
+        role_arn = await run_blocking(ensure_iam_role, "lambda-execution-role", account_id)
+
+    # Create or update the Lambda function
+    async with job.stage("create_or_update_function"):
+        response = await deploy_lambda_function(request, region, image_uri, role_arn)
+    ready = {}
+    await wait_for_ready(job, request, region, False, ready)
+
+    return {
+        "message": "Advanced deployment successful",
+        "image_uri": image_uri,
+        "lambda_arn": response['FunctionArn'],
+        "time_to_ready_s": ready.get("time_to_ready_s"),
+        "build_cache": job.metrics.get("build_cache"),
+        "push_skipped": job.metrics.get("push_skipped"),
+        "push_bytes_avoided": job.metrics.get("push_bytes_avoided"),
+    }
+
+deploy_jobs.register("deploy", functools.partial(run_deploy_pipeline, use_request_dockerfile=False))
+deploy_jobs.register("dockerdeploy", run_deploy_pipeline)
+deploy_jobs.register("advanced-deploy", run_advanced_deploy_pipeline)
+
+# Function to run a deploy job inline, or return its ID at once when running in the background
+async def run_or_submit_job(kind, request, background, idempotency_key=None):
+    """
+    Submit a deploy job, or attach to an identical one already in flight,
+    and return its result or, for background requests, its job ID.
+
+    Requests with an Idempotency-Key seen before return the job that key
+    started. A reused job is reported in the response as "deduplicated".
+    """
+    try:
+        job_id, reused = deploy_jobs.submit_once(
+            kind, request,
+            single_flight_key=request.get("function_name"),
+            idempotency_key=idempotency_key,
+            ignore_fields=("workspace_id",)
         )
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if reused and request.get("workspace_id"):
+        # The uploads of a duplicate request are not needed
+        BuildWorkspace(request["workspace_id"]).cleanup()
+    extra = {"deduplicated": reused} if reused else {}
+    if background:
+        status = deploy_jobs.get(job_id)["status"] if reused else QUEUED
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": status, **extra})
+    job = await deploy_jobs.wait(job_id)
+    if job["status"] != SUCCEEDED:
+        raise HTTPException(status_code=500, detail=job["error"])
+    stages = [
+        {key: stage.get(key) for key in ("name", "status", "duration_s", "bytes")}
+        for stage in job["stages"] or []
+    ]
+    return {**job["result"], "job_id": job_id, "stages": stages, **extra}
+
+#docker deploy endpoint
+@deploy_router.post("/dockerdeploy")
+async def docker_deploy(request: DeployRequest, background: bool = False,
+                        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    if request.package_type == "Zip":
+        # Reject a handler that cannot be told before a job is queued
+        zip_package_handler(request.handler, request.dockerfile_cmd)
+    return await run_or_submit_job("dockerdeploy", request.model_dump(), background, idempotency_key)
 
-        if login_result.returncode != 0:
-            raise HTTPException(status_code=500, detail=f"Docker login failed: {login_result.stderr}")
 
-        # Step 8: Create ECR repository if it doesn't exist
-        ecr_client = boto3.client('ecr', region_name=region)
-        try:
-            ecr_client.create_repository(repositoryName=request.repository_name)
-        except ecr_client.exceptions.RepositoryAlreadyExistsException:
-            pass
+# Deployment endpoint
+@deploy_router.post("/deploy")
+async def deploy(request: DeployRequest, background: bool = False,
+                 idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    return await run_or_submit_job("deploy", request.model_dump(), background, idempotency_key)
+
 
-        # Step 9: Tag and push the Docker image to ECR
-        subprocess.run(["docker", "tag", image_name, f"{ecr_uri}/{image_name}"], check=True)
-        subprocess.run(["docker", "push", f"{ecr_uri}/{image_name}"], check=True)
+# Advanced deployment endpoint
+@deploy_router.post("/advanced-deploy")
+async def advanced_deploy(
+    request: str = Form(..., description="The AdvancedDeployRequest as JSON"),
+    files: List[UploadFile] = File(...),
+    checksums: Optional[str] = Form(None, description="JSON object mapping file names to SHA-256 digests"),
+    extract_archives: bool = Form(True),
+    background: bool = False,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    # Multipart bodies cannot carry a JSON model, so the settings arrive as a JSON form field
+    try:
+        request = AdvancedDeployRequest.model_validate_json(request)
+        checksums = json.loads(checksums) if checksums else {}
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid checksums: {e}")
+
+    workspace = BuildWorkspace().create()
+    uploads = []
+    try:
+        # Stream uploaded files into the build's own workspace, chunk by chunk
+        for file in files:
+            expected = checksums.get(file.filename) or checksums.get(os.path.basename(file.filename))
+            uploads.append(await run_blocking(
+                save_upload, workspace, file.filename, file.file, expected, extract_archives
+            ))
+    except (WorkspaceQuotaExceeded, UploadTooLarge) as e:
+        workspace.cleanup()
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        workspace.cleanup()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        workspace.cleanup()
+        raise HTTPException(status_code=500, detail=str(e))
+    return await run_or_submit_job(
+        "advanced-deploy",
+        {**request.model_dump(), "workspace_id": workspace.workspace_id, "uploads": uploads},
+        background,
+        idempotency_key
+    )
 
-        # Step 10: Create or update the Lambda function
-        role_name = "lambda-execution-role"
-        role_arn = ensure_iam_role(role_name, account_id)
 
-        lambda_client = boto3.client('lambda', region_name=region)
-        function_name = request.function_name
-        try:
-            response = lambda_client.create_function(
-                FunctionName=function_name,
-                Role=role_arn,
-                Code={
-                    'ImageUri': f"{ecr_uri}/{image_name}"
-                },
-                PackageType='Image',
-                Publish=True,
-                MemorySize=request.memory_size,
-                EphemeralStorage={
-                    'Size': request.storage_size
-                },
-                Environment={
-                    'Variables': request.environment_variables or {}
-                },
-                VpcConfig={
-                    'SubnetIds': request.subnet_ids or [],
-                    'SecurityGroupIds': request.security_group_ids or []
-                } if request.vpc_id else {}
-            )
-        except lambda_client.exceptions.ResourceConflictException:
-            response = lambda_client.update_function_code(
-                FunctionName=function_name,
-                ImageUri=f"{ecr_uri}/{image_name}",
-                Publish=True
-            )
-            if request.vpc_id:
-                lambda_client.update_function_configuration(
-                    FunctionName=function_name,
-                    MemorySize=request.memory_size,
-                    EphemeralStorage={
-                        'Size': request.storage_size
-                    },
-                    Environment={
-                        'Variables': request.environment_variables or {}
-                    },
-                    VpcConfig={
-                        'SubnetIds': request.subnet_ids or [],
-                        'SecurityGroupIds': request.security_group_ids or []
-                    }
-                )
-
-        return {"message": "Deployment successful", "image_uri": f"{ecr_uri}/{image_name}", "lambda_arn": response['FunctionArn']}
-    except subprocess.CalledProcessError as e:
+# Build cache endpoints
+@deploy_router.get("/build-cache")
+async def get_build_cache_stats():
+    try:
+        return await run_blocking(build_cache.stats)
+    except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@deploy_router.delete("/build-cache")
+async def purge_build_cache(repository_name: Optional[str] = None, region: Optional[str] = None, input_hash: Optional[str] = None):
+    try:
+        removed = await run_blocking(build_cache.purge, input_hash=input_hash, repository_name=repository_name, region=region)
+        return {"message": f"Purged {removed} build cache entries", "removed": removed}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
- 
 
-# Advanced deployment endpoint
-@deploy_router.post("/advanced-deploy")
-async def advanced_deploy(request: AdvancedDeployRequest, files: List[UploadFile] = File(...)):
+# Shared dependency layer endpoints
+@deploy_router.get("/layers")
+async def get_dependency_layers(region: Optional[str] = None):
     try:
-        # Ensure Docker is running
-        docker_running = await run_subprocess("docker info")
-        
-        # Ensure AWS CLI is installed
-        try:
-            await run_subprocess("aws --version")
-        except subprocess.CalledProcessError:
-            await install_aws_cli()
+        layers = await run_blocking(layer_manager.inventory, region)
+        stats = await run_blocking(layer_manager.stats)
+        return {"layers": layers, "stats": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@deploy_router.delete("/layers")
+async def purge_dependency_layers(requirements_hash: Optional[str] = None, region: Optional[str] = None,
+                                  python_version: Optional[str] = None):
+    try:
+        removed = await run_blocking(layer_manager.purge, requirements_hash=requirements_hash, region=region,
+                                     python_version=python_version)
+        return {"message": f"Forgot {removed} dependency layers", "removed": removed}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Save uploaded files
-        for file in files:
-            file_location = f"./{file.filename}"
-            with open(file_location, "wb+") as file_object:
-                file_object.write(file.file.read())
-
-        # Create Dockerfile with advanced options
-        dockerfile_content = f"""
-        FROM {request.base_image}
-        """
-        for command in request.build_commands:
-            dockerfile_content += f"\nRUN {command}"
-        dockerfile_content += "\nCOPY . ."
-        dockerfile_content += '\nCMD ["app.lambda_handler"]'
-
-        with open("Dockerfile", "w") as f:
-            f.write(dockerfile_content)
-
-        # Build the Docker image
-        image_name = f"{request.repository_name}:{request.image_tag}"
-        build_result = await run_subprocess(f"docker build -t {image_name} .")
-
-        # Push the Docker image to ECR
-        region = request.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
-        image_uri = push_docker_image_to_ecr(request.repository_name, request.image_tag, region_name=region)
-
-        # Ensure IAM role exists
-        account_id = boto3.client('sts').get_caller_identity().get('Account')
-        role_arn = ensure_iam_role("lambda-execution-role", account_id)
-
-        # Create or update the Lambda function
-        vpc_config = {
-            'SubnetIds': request.subnet_ids or [],
-            'SecurityGroupIds': request.security_group_ids or []
-        } if request.vpc_id else None
-        response = create_or_update_lambda_function(
-            request.function_name, image_uri, role_arn, region_name=region,
-            memory_size=128, storage_size=512, vpc_config=vpc_config
-        )
 
-        return {"message": "Advanced deployment successful", "image_uri": image_uri, "lambda_arn": response['FunctionArn']}
+# Deploy pipeline metrics endpoints
+@deploy_router.get("/metrics")
+async def get_deploy_metrics(kind: Optional[str] = None, limit: int = DEPLOY_METRICS_WINDOW):
+    try:
+        jobs = [job for job in deploy_jobs.list(kind=kind, limit=limit) if job["status"] in FINISHED_STATUSES]
+        return summarize_stages(jobs)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@deploy_router.get("/metrics/prometheus")
+async def get_deploy_metrics_prometheus():
+    exposition = prometheus_exposition()
+    if exposition is None:
+        raise HTTPException(status_code=501, detail="prometheus_client is not installed")
+    return Response(content=exposition, media_type=CONTENT_TYPE_LATEST)
+
+# Deploy job endpoints
+@deploy_router.get("/jobs")
+async def list_deploy_jobs(status: Optional[str] = None, kind: Optional[str] = None, limit: int = 50):
+    jobs = deploy_jobs.list(status=status, kind=kind, limit=limit)
+    # Logs can be long; fetch a single job to read them
+    return {"jobs": [{key: value for key, value in job.items() if key != "logs"} for job in jobs]}
+
+@deploy_router.get("/jobs/{job_id}")
+async def get_deploy_job(job_id: str):
+    try:
+        return deploy_jobs.get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Deploy job {job_id} not found")
+
+@deploy_router.get("/jobs/{job_id}/logs/stream")
+async def stream_deploy_job_logs(job_id: str, from_line: int = 0, stream_format: Literal["sse", "ndjson"] = "sse"):
+    """
+    Follow a deploy job's build and push output live.
+
+    Emits a 'log' event per output line, 'heartbeat' events while the job
+    is quiet, and a final 'status' event when the job finishes. Pass
+    from_line to resume after the last line_no received.
+    """
+    try:
+        deploy_jobs.get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Deploy job {job_id} not found")
+    records = deploy_jobs.follow_logs(job_id, from_line=from_line)
+    return StreamingResponse(encode_stream(records, stream_format), media_type=stream_media_type(stream_format))
+
+@deploy_router.post("/jobs/{job_id}/cancel")
+async def cancel_deploy_job(job_id: str):
+    try:
+        return await deploy_jobs.cancel(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Deploy job {job_id} not found")
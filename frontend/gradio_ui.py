@@ -147,11 +147,12 @@ def invoke_lambda(function_name, region):
 
 
 def invoke_multiple_functions(function_name_prefix, number_of_functions, payload, region):
-    url = f"{BASE_URL}/management/invoke-multiple-functions"
+    url = f"{BASE_URL}/management/invoke-multiple-functions/stream"
     try:
         payload_dict = json.loads(payload)  # Convert JSON string to dictionary
     except json.JSONDecodeError:
-        return {"error": "Invalid JSON format for payload"}
+        yield {"error": "Invalid JSON format for payload"}
+        return
     
     payload_data = {
         "function_name_prefix": function_name_prefix,
@@ -159,8 +160,25 @@ def invoke_multiple_functions(function_name_prefix, number_of_functions, payload
         "payload": payload_dict,
         "region": region
     }
-    response = requests.post(url, json=payload_data)
-    return response.json()
+    # Show each result as soon as the API streams it
+    results = []
+    with requests.post(url, json=payload_data, stream=True) as response:
+        if response.status_code != 200:
+            # Errors such as an oversized payload are answered with a plain JSON body before streaming starts
+            try:
+                yield {"error": response.json().get("detail", response.text)}
+            except ValueError:
+                yield {"error": response.text}
+            return
+        for line in response.iter_lines():
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.pop("type", None) == "summary":
+                yield {"results": results, "summary": record}
+            else:
+                results.append(record)
+                yield {"results": results}
 
 def list_lambda_functions(region):
     url = f"{BASE_URL}/management/list-lambda-functions"
@@ -1,6 +1,6 @@
 # base_models.py
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Optional, List, Dict, Literal
 
 
 class DeployRequest(BaseModel):
@@ -14,10 +14,43 @@ class DeployRequest(BaseModel):
     function_name: str
     memory_size: int = 128
     storage_size: int = 512
-    environment_variables: dict = None
-    vpc_id: str = None
-    subnet_ids: list = None
-    security_group_ids: list = None
+    environment_variables: Optional[dict] = None
+    vpc_id: Optional[str] = None
+    subnet_ids: Optional[list] = None
+    security_group_ids: Optional[list] = None
+    use_build_cache: bool = True
+    regions: Optional[List[str]] = Field(
+        None, description="Additional regions to deploy the same image to, alongside region"
+    )
+    use_ecr_replication: bool = Field(
+        True, description="Let ECR replication copy the image to regions it is configured for instead of pushing there"
+    )
+    dependency_mode: Literal["image", "wheelhouse", "host_venv"] = Field(
+        "image",
+        description="Where requirements are installed: only in the image, in the image from the shared "
+                    "wheelhouse, or also in a host virtualenv (legacy behaviour)"
+    )
+    package_type: Literal["Image", "Zip"] = Field(
+        "Image", description="Deploy a container image, or a zip package built without Docker (small pure-Python agents)"
+    )
+    runtime: Optional[str] = Field(
+        None, description="Lambda runtime of a zip package; defaults to the Python version of dockerfile_base_image"
+    )
+    handler: Optional[str] = Field(
+        None, description="Handler of a zip package; defaults to the first entry of dockerfile_cmd"
+    )
+    dependency_layer: Literal["auto", "always", "never"] = Field(
+        "auto",
+        description="For zip packages: attach the requirements as a shared Lambda layer once the same set has been "
+                    "deployed LAMBDA_LAYER_SHARE_THRESHOLD times (auto), always, or always bundle them (never)"
+    )
+    s3_bucket: Optional[str] = Field(
+        None, description="Bucket for zip packages too large to upload inline ({region} is replaced per region); "
+                          "defaults to ZIP_S3_BUCKET"
+    )
+    wait_for_ready: bool = Field(
+        True, description="Return only once the function is Active and its last update Successful"
+    )
      
 class AdvancedDeployRequest(BaseModel):
     repository_name: str
@@ -26,9 +59,16 @@ class AdvancedDeployRequest(BaseModel):
     build_commands: List[str]
     function_name: str
     region: Optional[str] = None
+    memory_size: int = 128
+    storage_size: int = 512
+    environment_variables: Optional[dict] = None
     vpc_id: Optional[str] = None
     subnet_ids: Optional[List[str]] = None
     security_group_ids: Optional[List[str]] = None
+    use_build_cache: bool = True
+    wait_for_ready: bool = Field(
+        True, description="Return only once the function is Active and its last update Successful"
+    )
 
 
 class VpcConfig(BaseModel):
@@ -46,25 +86,45 @@ class FunctionConfig(BaseModel):
     security_group_ids: List[str]
     region: Optional[str] = None
     log_retention_days: Optional[int] = 7
+    memory_size: int = 128
+    storage_size: int = 512
+    max_workers: int = Field(10, ge=1, description="Number of functions deployed in parallel")
+    max_retries: int = Field(8, ge=0, description="Retries per AWS call when Lambda throttles")
+    wait_for_ready: bool = Field(
+        True, description="Wait until every function is Active and its last update Successful"
+    )
 
 class SingleInvokeConfig(BaseModel):
     function_name: str
-    payload: Dict[str, str] = Field(..., example={
+    payload: Dict[str, Any] = Field(..., example={
         "OPENAI_API_KEY": "your-openai-api-key",
         "OTHER_ENV_VAR": "value",
         "name": "World"
     })
     region: Optional[str] = None
+    qualifier: Optional[str] = Field(None, description="Alias or version to invoke, e.g. the warm pool alias")
+
+class AsyncInvokeConfig(BaseModel):
+    function_name: str
+    payload: dict = Field(..., example={"name": "World"})
+    region: Optional[str] = None
+    qualifier: Optional[str] = Field(None, description="Alias or version to invoke")
+    correlation_id: Optional[str] = Field(None, description="Caller-chosen ID to collect the result under; generated if omitted")
 
 class MultipleInvokeConfig(BaseModel):
     function_name_prefix: str
-    payload: Dict[str, str] = Field(..., example={
+    payload: Dict[str, Any] = Field(..., example={
         "OPENAI_API_KEY": "your-openai-api-key",
         "OTHER_ENV_VAR": "value",
         "name": "World"
     })
     number_of_functions: int = Field(..., example=2)
     region: Optional[str] = None
+    max_concurrency: int = Field(10, ge=1, description="Maximum number of invocations in flight")
+    timeout_seconds: Optional[float] = Field(None, gt=0, description="Per-invocation timeout")
+    failure_policy: Literal["continue", "abort"] = Field(
+        "continue", description="'continue' reports failures per call; 'abort' skips calls not yet started after the first failure"
+    )
     
 class InvokeConfig(BaseModel):
     function_name_prefix: str
@@ -107,6 +167,39 @@ class BudgetRequest(BaseModel):
     AccountId: str
     BudgetName: str
 
+class ProvisionedConcurrencyRequest(BaseModel):
+    concurrency: int = Field(..., ge=0, description="Execution environments to keep initialized; 0 removes the configuration")
+    alias: Optional[str] = Field(None, description="Alias to configure; defaults to WARM_POOL_ALIAS")
+    region: Optional[str] = None
+
+class KeepWarmRequest(BaseModel):
+    concurrency: int = Field(1, ge=1, le=100, description="Simultaneous pings per round, i.e. environments kept warm")
+    interval_s: Optional[int] = Field(
+        None, ge=60, description="Seconds between ping rounds; defaults to WARM_POOL_PING_INTERVAL_S"
+    )
+    alias: Optional[str] = Field(None, description="Alias or version to ping")
+    region: Optional[str] = None
+
+class PowerTuningRequest(BaseModel):
+    payload: dict = Field(default_factory=dict, description="Sample event the function is invoked with")
+    memory_sizes: Optional[List[int]] = Field(
+        None, description="Memory sizes in MB to measure; defaults to POWER_TUNING_MEMORY_SIZES"
+    )
+    invocations: int = Field(10, ge=1, le=100, description="Measured invocations per memory size")
+    strategy: Literal["cost", "speed", "balanced"] = Field(
+        "balanced", description="Pick the cheapest, the fastest, or a weighted balance of both"
+    )
+    balanced_weight: float = Field(0.5, ge=0, le=1, description="Weight of cost against duration for 'balanced'")
+    apply: bool = Field(False, description="Set the recommended memory size on the function instead of restoring it")
+    region: Optional[str] = None
+
+    @field_validator("memory_sizes")
+    @classmethod
+    def check_memory_sizes(cls, memory_sizes):
+        if memory_sizes is not None and any(size < 128 or size > 10240 for size in memory_sizes):
+            raise ValueError("Lambda memory sizes range from 128 to 10240 MB")
+        return memory_sizes
+
 class UpdateFunctionConfig(BaseModel):
     function_name: str
     memory_size: Optional[int] = None
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-import boto3
 import json
+import os
+
+from services.aws_services import call_aws, run_blocking
 
 router = APIRouter()
 
@@ -16,8 +18,7 @@ class BedrockModelRequest(BaseModel):
 async def list_foundation_models(region: Optional[str] = None):
     try:
         region = region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
-        bedrock_client = boto3.client('bedrock', region_name=region)
-        response = bedrock_client.list_foundation_models()
+        response = await call_aws('bedrock', 'list_foundation_models', region_name=region)
         models = response['modelSummaries']
         return {"models": models}
     except Exception as e:
@@ -27,20 +28,22 @@ async def list_foundation_models(region: Optional[str] = None):
 async def invoke_model(model_request: BedrockModelRequest, model_id: str, region: Optional[str] = None):
     try:
         region = region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
-        bedrock_runtime_client = boto3.client('bedrock-runtime', region_name=region)
         body = json.dumps({
             "prompt": model_request.prompt,
             "max_tokens_to_sample": model_request.max_tokens_to_sample,
             "temperature": model_request.temperature,
             "top_p": model_request.top_p
         })
-        response = bedrock_runtime_client.invoke_model(
+        response = await call_aws(
+            'bedrock-runtime',
+            'invoke_model',
+            region_name=region,
             body=body,
             modelId=model_id,
             accept='application/json',
             contentType='application/json'
         )
-        response_body = json.loads(response.get('body').read())
+        response_body = json.loads(await run_blocking(response.get('body').read))
         return response_body
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
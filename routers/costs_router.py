@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List
-import boto3
+
+from services.aws_services import call_aws
 
 router = APIRouter()
 
@@ -16,8 +17,9 @@ class BudgetRequest(BaseModel):
 @router.post("/get-cost-and-usage")
 async def get_cost_and_usage(time_period: TimePeriod, metrics: List[str] = ["UnblendedCost"], granularity: str = "MONTHLY"):
     try:
-        client = boto3.client('ce')
-        response = client.get_cost_and_usage(
+        response = await call_aws(
+            'ce',
+            'get_cost_and_usage',
             TimePeriod={
                 'Start': time_period.Start,
                 'End': time_period.End
@@ -32,8 +34,9 @@ async def get_cost_and_usage(time_period: TimePeriod, metrics: List[str] = ["Unb
 @router.post("/describe-budget")
 async def describe_budget(budget_request: BudgetRequest):
     try:
-        client = boto3.client('budgets')
-        response = client.describe_budget(
+        response = await call_aws(
+            'budgets',
+            'describe_budget',
             AccountId=budget_request.AccountId,
             BudgetName=budget_request.BudgetName
         )
@@ -44,8 +47,7 @@ async def describe_budget(budget_request: BudgetRequest):
 @router.get("/describe-report-definitions")
 async def describe_report_definitions():
     try:
-        client = boto3.client('cur')
-        response = client.describe_report_definitions()
+        response = await call_aws('cur', 'describe_report_definitions')
         return response['ReportDefinitions']
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -53,8 +55,9 @@ async def describe_report_definitions():
 @router.post("/get-products")
 async def get_products(service_code: str, filters: List[dict]):
     try:
-        client = boto3.client('pricing')
-        response = client.get_products(
+        response = await call_aws(
+            'pricing',
+            'get_products',
             ServiceCode=service_code,
             Filters=filters
         )
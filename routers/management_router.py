@@ -1,33 +1,49 @@
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict
-import boto3
+from typing import Optional, List, Dict, Literal
 from botocore.exceptions import ClientError
+import asyncio
 import json
 import os
-
-from models.base_models import SingleInvokeConfig, MultipleInvokeConfig
+import time
+
+from models.base_models import (
+    FunctionConfig,
+    SingleInvokeConfig,
+    AsyncInvokeConfig,
+    MultipleInvokeConfig,
+    ProvisionedConcurrencyRequest,
+    KeepWarmRequest,
+    PowerTuningRequest,
+)
 from services.aws_services import (
+    get_aws_client,
+    get_account_id,
+    call_aws,
+    paginate_aws,
+    run_blocking,
     list_s3_buckets,
     upload_file_to_s3,
     create_ec2_instance,
     describe_ec2_instances
 )
+from services.batch_deployer import deploy_functions
+from services.lambda_invoker import (
+    invoke_lambda_function, invoke_many, iter_invocations, summarize_invocations, encode_invocation_payload
+)
+from services.warm_pool import warm_pool
+from services.latency_store import latency_store
+from services.invocation_history import SOURCE_CLIENT
+from services.deploy_jobs import QUEUED, SUCCEEDED
+from services.power_tuner import power_tuner, power_tuning_store, PowerTuningInProgress, FunctionDeployInProgress
+from services.async_invoker import async_invoker, DuplicateCorrelationId, PENDING
 from utils.auth import get_current_user  # Ensure this is correctly imported
+from utils.streaming_utils import encode_stream, stream_media_type
+from utils.payload_codec import PayloadTooLarge
 
 management_router = APIRouter()
 
-class FunctionConfig(BaseModel):
-    repository_name: str
-    image_tag: str
-    function_name_prefix: str
-    number_of_functions: int
-    vpc_id: str
-    subnet_ids: List[str]
-    security_group_ids: List[str]
-    region: Optional[str] = None 
-    log_retention_days: Optional[int] = 7
-
 class UpdateFunctionConfig(BaseModel):
     function_name: str
     memory_size: Optional[int] = None
@@ -38,122 +54,47 @@ class UpdateFunctionConfig(BaseModel):
 @management_router.post("/deploy-multiple-functions")
 async def deploy_multiple_functions(config: FunctionConfig):
     try:
-        # Initialize AWS clients
-        account_id = boto3.client('sts').get_caller_identity().get('Account')
         region = config.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
-        ecr_client = boto3.client('ecr', region_name=region)
-        lambda_client = boto3.client('lambda', region_name=region)
-        logs_client = boto3.client('logs', region_name=region)
-        sns_client = boto3.client('sns', region_name=region)
-
-        # Ensure the IAM role exists
-        role_name = "lambda-execution-role"
-        role_arn = await ensure_iam_role(role_name, account_id)
-
-        # Authenticate Docker to AWS ECR
-        ecr_uri = f"{account_id}.dkr.ecr.{region}.amazonaws.com"
-        login_password = subprocess.run(
-            ["aws", "ecr", "get-login-password", "--region", region],
-            capture_output=True, text=True, check=True
-        ).stdout.strip()
-        
-        subprocess.run(
-            ["docker", "login", "--username", "AWS", "--password-stdin", ecr_uri],
-            input=login_password, text=True, capture_output=True
-        )
-
-        # Ensure ECR repository exists
-        try:
-            ecr_client.create_repository(repositoryName=config.repository_name)
-        except ecr_client.exceptions.RepositoryAlreadyExistsException:
-            pass
-
-        # Deploy multiple Lambda functions
-        for i in range(config.number_of_functions):
-            function_name = f"{config.function_name_prefix}-{i}"
-            image_name = f"{config.repository_name}:{config.image_tag}"
-
-            try:
-                response = lambda_client.create_function(
-                    FunctionName=function_name,
-                    Role=role_arn,
-                    Code={'ImageUri': f"{ecr_uri}/{image_name}"},
-                    PackageType='Image',
-                    Publish=True,
-                    MemorySize=config.memory_size,
-                    EphemeralStorage={'Size': config.storage_size},
-                    VpcConfig={
-                        'SubnetIds': config.subnet_ids,
-                        'SecurityGroupIds': config.security_group_ids
-                    }
-                )
-
-                # Set up CloudWatch Logs retention
-                log_group_name = f"/aws/lambda/{function_name}"
-                try:
-                    logs_client.create_log_group(logGroupName=log_group_name)
-                except logs_client.exceptions.ResourceAlreadyExistsException:
-                    pass
-
-                logs_client.put_retention_policy(
-                    logGroupName=log_group_name,
-                    retentionInDays=config.log_retention_days
-                )
-
-            except lambda_client.exceptions.ResourceConflictException:
-                lambda_client.update_function_code(
-                    FunctionName=function_name,
-                    ImageUri=f"{ecr_uri}/{image_name}",
-                    Publish=True
-                )
-                lambda_client.update_function_configuration(
-                    FunctionName=function_name,
-                    MemorySize=config.memory_size,
-                    EphemeralStorage={'Size': config.storage_size},
-                    VpcConfig={
-                        'SubnetIds': config.subnet_ids,
-                        'SecurityGroupIds': config.security_group_ids
-                    }
-                )
-
-        return {"message": f"Deployed {config.number_of_functions} functions successfully"}
-    except ClientError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        function_names = [f"{config.function_name_prefix}-{i}" for i in range(config.number_of_functions)]
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional
-import boto3
-import json
-import os
+        # Deploy multiple Lambda functions in parallel
+        outcome = await deploy_functions(function_names, config, region)
+        summary = outcome["summary"]
 
-management_router = APIRouter()
+        return {
+            "message": f"Deployed {summary['succeeded']} of {config.number_of_functions} functions successfully",
+            "results": outcome["results"],
+            "summary": summary
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 class SingleInvokeConfig(BaseModel):
     function_name: str
     payload: dict
     region: Optional[str] = None
+    qualifier: Optional[str] = None
 
 @management_router.post("/invoke-lambda")
 async def invoke_lambda(config: SingleInvokeConfig):
     try:
-        # Initialize boto3 Lambda client
         region = config.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
-        lambda_client = boto3.client('lambda', region_name=region)
         
-        # Invoke the Lambda function
-        response = lambda_client.invoke(
-            FunctionName=config.function_name,
-            InvocationType='RequestResponse',
-            Payload=json.dumps(config.payload)  # Ensure the payload is a JSON string
+        # Invoke the Lambda function; the call is recorded in the invocation history
+        response = await run_blocking(
+            invoke_lambda_function, config.function_name, config.payload, region, config.qualifier
         )
-        
-        # Parse the response
-        response_payload = response['Payload'].read().decode('utf-8')
-        response_data = json.loads(response_payload)
-        
+
         # Return the raw response for debugging
-        return {"raw_response": response_data}
+        return {
+            "raw_response": response["payload"],
+            "cold_start": response["cold_start"],
+            "report": response["report"],
+            "client_rtt_ms": response["client_rtt_ms"],
+            "payload_encoding": response["payload_encoding"],
+        }
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -161,50 +102,325 @@ async def invoke_lambda(config: SingleInvokeConfig):
 @management_router.post("/invoke-multiple-functions")
 async def invoke_multiple_functions(config: MultipleInvokeConfig):
     try:
-        # Initialize AWS Lambda client
         region = config.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
-        lambda_client = boto3.client('lambda', region_name=region)
-
-        responses = []
-
-        for _ in range(config.number_of_functions):
-            function_name = config.function_name_prefix  # Use the provided function name without appending
-            try:
-                response = lambda_client.invoke(
-                    FunctionName=function_name,
-                    InvocationType='RequestResponse',
-                    Payload=json.dumps(config.payload)
-                )
-
-                # Parse the response
-                response_payload = response['Payload'].read().decode('utf-8')
-                response_data = json.loads(response_payload)
-                responses.append(response_data)
-
-            except lambda_client.exceptions.ResourceNotFoundException:
-                raise HTTPException(status_code=500, detail=f"Function {function_name} not found.")
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
-
-        return {"message": f"Invoked {config.number_of_functions} functions successfully", "responses": responses}
+        function_name = config.function_name_prefix  # Use the provided function name without appending
+
+        outcome = await invoke_many(
+            [function_name] * config.number_of_functions,
+            config.payload,
+            region_name=region,
+            max_concurrency=config.max_concurrency,
+            timeout_seconds=config.timeout_seconds,
+            failure_policy=config.failure_policy
+        )
+        summary = outcome["summary"]
+        responses = [r["response"] for r in outcome["results"] if r["status"] == "success"]
+
+        return {
+            "message": f"Invoked {summary['succeeded']} of {config.number_of_functions} functions successfully",
+            "responses": responses,
+            "results": outcome["results"],
+            "summary": summary
+        }
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@management_router.post("/invoke-multiple-functions/stream")
+async def invoke_multiple_functions_stream(config: MultipleInvokeConfig, stream_format: Literal["ndjson", "sse"] = "ndjson"):
+    """
+    Invoke multiple functions and stream each result as soon as it completes.
+
+    Each result is emitted as an NDJSON line (or an SSE 'result' event) in
+    completion order, followed by a final 'summary' record.
+    """
+    region = config.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+    function_names = [config.function_name_prefix] * config.number_of_functions
+    # Encode before the response starts, so an oversized payload still gets a 413
+    try:
+        encoded_payload = await run_blocking(encode_invocation_payload, config.payload, region)
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def records():
+        start = time.perf_counter()
+        results = []
+        async for result in iter_invocations(
+            function_names,
+            config.payload,
+            region_name=region,
+            max_concurrency=config.max_concurrency,
+            timeout_seconds=config.timeout_seconds,
+            failure_policy=config.failure_policy,
+            encoded_payload=encoded_payload
+        ):
+            # Keep only what the summary needs so memory stays flat for large fan-outs
+            results.append({
+                "status": result["status"], "latency_ms": result.get("latency_ms"), "cold_start": result.get("cold_start"),
+                "report": {"billed_duration_ms": result["report"]["billed_duration_ms"]} if result.get("report") else None
+            })
+            yield "result", result
+        yield "summary", summarize_invocations(results, (time.perf_counter() - start) * 1000)
+
+    return StreamingResponse(encode_stream(records(), stream_format), media_type=stream_media_type(stream_format))
+
+@management_router.post("/invoke-lambda/async")
+async def invoke_lambda_async(config: AsyncInvokeConfig):
+    """
+    Invoke a function with InvocationType='Event' and return at once.
+
+    The result is collected from the function's destination queue; poll
+    /async-invocations/{correlation_id} or stream /async-invocations/stream.
+    """
+    region = config.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+    try:
+        invocation = await run_blocking(
+            async_invoker.invoke, config.function_name, config.payload, region, config.qualifier, config.correlation_id
+        )
+    except DuplicateCorrelationId as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    async_invoker.ensure_started(region)
+    return JSONResponse(status_code=202, content=invocation)
+
+@management_router.post("/invoke-multiple-functions/async")
+async def invoke_multiple_functions_async(config: MultipleInvokeConfig):
+    """
+    Fire number_of_functions asynchronous invocations and return their correlation IDs.
+
+    Only submitting the events is bounded by max_concurrency; the functions
+    then run without holding any connection of this API.
+    """
+    region = config.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+    semaphore = asyncio.Semaphore(config.max_concurrency)
+
+    async def submit():
+        async with semaphore:
+            return await run_blocking(async_invoker.invoke, config.function_name_prefix, config.payload, region)
+
+    try:
+        invocations = await asyncio.gather(*(submit() for _ in range(config.number_of_functions)))
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    async_invoker.ensure_started(region)
+    return JSONResponse(status_code=202, content={
+        "correlation_ids": [invocation["correlation_id"] for invocation in invocations],
+        "status": PENDING,
+    })
+
+@management_router.get("/async-invocations/stream")
+async def stream_async_invocations(correlation_ids: str, timeout_s: float = 300,
+                                   stream_format: Literal["ndjson", "sse"] = "ndjson"):
+    """
+    Stream the results of asynchronous invocations as they arrive.
+
+    correlation_ids is comma-separated. Each completed invocation is emitted
+    as a 'result' record; those still pending after timeout_s are emitted
+    as pending, followed by a final 'summary' record.
+    """
+    ids = [correlation_id for correlation_id in correlation_ids.split(",") if correlation_id]
+
+    async def records():
+        statuses = {}
+        async for invocation in async_invoker.stream(ids, timeout_s):
+            statuses[invocation["status"]] = statuses.get(invocation["status"], 0) + 1
+            yield "result", invocation
+        yield "summary", {"total": len(ids), "statuses": statuses, "unknown": len(ids) - sum(statuses.values())}
+
+    return StreamingResponse(encode_stream(records(), stream_format), media_type=stream_media_type(stream_format))
+
+@management_router.post("/async-invocations/results")
+async def ingest_async_results(records: List[dict]):
+    """
+    Accept asynchronous invocation records directly, e.g. from a local
+    emulator or a forwarder standing in for the destination queue.
+    """
+    try:
+        matched = [await run_blocking(async_invoker.record_result, record) for record in records]
+        return {"received": len(records), "matched": [correlation_id for correlation_id in matched if correlation_id]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@management_router.get("/async-invocations/{correlation_id}")
+async def get_async_invocation(correlation_id: str, wait_s: float = 0):
+    """
+    An asynchronous invocation and, once it arrived, its result.
+    With wait_s, long-poll for up to that many seconds while it is pending.
+    """
+    invocation = await async_invoker.wait(correlation_id, wait_s)
+    if invocation is None:
+        raise HTTPException(status_code=404, detail=f"Asynchronous invocation {correlation_id} not found")
+    return invocation
+
+@management_router.put("/functions/{function_name}/async-destination")
+async def configure_async_destination(function_name: str, region: Optional[str] = None, qualifier: Optional[str] = None):
+    """
+    Point the function's on-success and on-failure destinations at the result queue.
+    Done automatically on the first asynchronous invocation through this API.
+    """
+    try:
+        region = region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+        destination = await run_blocking(async_invoker.configure_destination, function_name, region, qualifier)
+        return {"function_name": function_name, "region": region, "destination": destination,
+                "collector": async_invoker.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@management_router.get("/functions/{function_name}/latency")
+async def get_function_latency(function_name: str, region: Optional[str] = None, window_s: Optional[float] = None,
+                               include_keep_warm: bool = False):
+    """
+    Latency histograms and cold-start counters of a function's recent invocations.
+
+    Covers the invocations made through this API that are still in the
+    in-memory ring (LATENCY_RING_SIZE per function and region): client
+    round-trip time and the REPORT line's Duration, Billed Duration and Init
+    Duration, with p50/p90/p99 and histogram buckets in milliseconds.
+    Keep-warm pings are left out unless include_keep_warm is set.
+    """
+    try:
+        since = time.time() - window_s if window_s else None
+        return latency_store.summary(function_name, region, since, None if include_keep_warm else SOURCE_CLIENT)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@management_router.post("/functions/{function_name}/power-tuning")
+async def power_tune_function(function_name: str, request: PowerTuningRequest, background: bool = False):
+    """
+    Measure duration and cost of a function across memory sizes and recommend
+    (or, with apply, set) the best one for the chosen strategy.
+
+    Runs in the background: with background=true the run ID is returned at
+    once and progress can be followed under /power-tuning/{run_id}.
+    """
+    region = request.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+    try:
+        run_id = power_tuner.submit({**request.model_dump(), "function_name": function_name, "region": region})
+    except (PowerTuningInProgress, FunctionDeployInProgress) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if background:
+        return JSONResponse(status_code=202, content={"run_id": run_id, "status": QUEUED})
+    run = await power_tuner.wait(run_id)
+    if run["status"] != SUCCEEDED:
+        raise HTTPException(status_code=500, detail=run["error"])
+    return run
+
+@management_router.get("/power-tuning")
+async def list_power_tuning_runs(function_name: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+    try:
+        return {"runs": await run_blocking(power_tuning_store.list, function_name, status, limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@management_router.get("/power-tuning/{run_id}")
+async def get_power_tuning_run(run_id: str):
+    """
+    A power-tuning run: its status and stages while it runs, then its results.
+    """
+    run = await run_blocking(power_tuning_store.get, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Power-tuning run {run_id} not found")
+    return run
+
+@management_router.get("/warm-pool")
+async def get_warm_pool(region: Optional[str] = None):
+    try:
+        targets = await run_blocking(warm_pool.targets, None, None, region)
+        return {"targets": targets, "pinger": warm_pool.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@management_router.put("/warm-pool/{function_name}/provisioned-concurrency")
+async def set_provisioned_concurrency(function_name: str, request: ProvisionedConcurrencyRequest):
+    """
+    Configure provisioned concurrency on an alias of a function (0 removes it).
+    Invoke the alias (qualifier) for requests to use the provisioned environments.
+    """
+    try:
+        region = request.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+        target = await warm_pool.set_provisioned_concurrency(function_name, region, request.concurrency, request.alias)
+        return {"target": target}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@management_router.put("/warm-pool/{function_name}/keep-warm")
+async def set_keep_warm(function_name: str, request: KeepWarmRequest):
+    """
+    Ping a function on a schedule to keep request.concurrency environments warm.
+    """
+    try:
+        region = request.region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+        target = await run_blocking(
+            warm_pool.set_keep_warm, function_name, region, request.concurrency, request.interval_s, request.alias
+        )
+        warm_pool.ensure_started()
+        return {"target": target}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@management_router.delete("/warm-pool/{function_name}")
+async def remove_warm_pool_target(function_name: str, region: Optional[str] = None,
+                                  mode: Optional[Literal["provisioned", "keep_warm"]] = None):
+    try:
+        region = region or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+        removed = await run_blocking(warm_pool.remove, function_name, region, mode)
+        return {"removed": removed}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@management_router.get("/warm-pool/recommendations")
+async def get_warm_pool_recommendations(window_s: Optional[int] = None):
+    """
+    Recommend provisioned concurrency or keep-warm pings per function from the invocation history.
+    """
+    try:
+        return {"recommendations": await run_blocking(warm_pool.recommend, window_s)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@management_router.post("/warm-pool/recommendations/apply")
+async def apply_warm_pool_recommendations(window_s: Optional[int] = None, include_provisioned: bool = False):
+    """
+    Enable the recommended warming for functions not warmed yet. Provisioned
+    concurrency is billed while configured and is only applied with include_provisioned.
+    """
+    try:
+        applied = await warm_pool.apply_recommendations(window_s, include_provisioned)
+        return {"applied": applied}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@management_router.get("/cold-starts")
+async def get_cold_start_report(function_name: Optional[str] = None, region: Optional[str] = None,
+                                window_s: Optional[int] = None):
+    """
+    Cold-start rate per function, before and after warming was enabled.
+    """
+    try:
+        report = await run_blocking(warm_pool.cold_start_report, function_name, region, window_s)
+        return {"functions": report}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @management_router.get("/list-lambda-functions")
 async def list_lambda_functions(region: Optional[str] = None):
     try:
         if region:
-            lambda_client = boto3.client('lambda', region_name=region)
-            response = lambda_client.list_functions()
+            response = await call_aws('lambda', 'list_functions', region_name=region)
             functions = response['Functions']
         else:
-            lambda_client = boto3.client('lambda')
-            paginator = lambda_client.get_paginator('list_functions')
-            response_iterator = paginator.paginate()
-            functions = []
-            for response in response_iterator:
-                functions.extend(response['Functions'])
+            functions = await paginate_aws('lambda', 'list_functions', 'Functions')
 
         function_names = [func['FunctionName'] for func in functions]
 
@@ -215,12 +431,10 @@ async def list_lambda_functions(region: Optional[str] = None):
 @management_router.delete("/delete-lambda-function")
 async def delete_lambda_function(function_name: str):
     try:
-        # Initialize boto3 Lambda client
         region = "us-west-2"  # Change to your desired region
-        lambda_client = boto3.client('lambda', region_name=region)
         
         # Delete the Lambda function
-        lambda_client.delete_function(FunctionName=function_name)
+        await call_aws('lambda', 'delete_function', region_name=region, FunctionName=function_name)
 
         return {"message": f"Lambda function {function_name} deleted successfully."}
     except ClientError as e:
@@ -229,12 +443,10 @@ async def delete_lambda_function(function_name: str):
 @management_router.get("/list-ecr-repositories")
 async def list_ecr_repositories(current_user: dict = Depends(get_current_user)):
     try:
-        # Initialize boto3 ECR client
         region = "us-west-2"  # Change to your desired region
-        ecr_client = boto3.client('ecr', region_name=region)
         
         # List ECR repositories
-        response = ecr_client.describe_repositories()
+        response = await call_aws('ecr', 'describe_repositories', region_name=region)
         repositories = response['repositories']
 
         return {"repositories": repositories}
@@ -244,12 +456,10 @@ async def list_ecr_repositories(current_user: dict = Depends(get_current_user)):
 @management_router.delete("/delete-ecr-repository")
 async def delete_ecr_repository(repository_name: str):
     try:
-        # Initialize boto3 ECR client
         region = "us-west-2"  # Change to your desired region
-        ecr_client = boto3.client('ecr', region_name=region)
         
         # Delete the ECR repository
-        ecr_client.delete_repository(repositoryName=repository_name, force=True)
+        await call_aws('ecr', 'delete_repository', region_name=region, repositoryName=repository_name, force=True)
 
         return {"message": f"ECR repository {repository_name} deleted successfully."}
     except ClientError as e:
@@ -261,7 +471,7 @@ async def get_s3_buckets(current_user: dict = Depends(get_current_user)):
     List all S3 buckets in the AWS account.
     """
     try:
-        buckets = list_s3_buckets()
+        buckets = await run_blocking(list_s3_buckets)
         return {"buckets": buckets}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -280,7 +490,7 @@ async def upload_to_s3(file_name: str, bucket_name: str, object_name: Optional[s
         dict: Upload status.
     """
     try:
-        success = upload_file_to_s3(file_name, bucket_name, object_name)
+        success = await run_blocking(upload_file_to_s3, file_name, bucket_name, object_name)
         if success:
             return {"message": "File uploaded successfully"}
         else:
@@ -304,7 +514,7 @@ async def create_ec2_instance_endpoint(image_id: str, instance_type: str, key_na
         dict: Information about the created instance.
     """
     try:
-        instance = create_ec2_instance(image_id, instance_type, key_name, security_group, region_name)
+        instance = await run_blocking(create_ec2_instance, image_id, instance_type, key_name, security_group, region_name)
         return {"instance": instance}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -322,7 +532,7 @@ async def get_ec2_instances(instance_ids: Optional[List[str]] = None, region_nam
         dict: Information about the instances.
     """
     try:
-        instances = describe_ec2_instances(instance_ids, region_name)
+        instances = await run_blocking(describe_ec2_instances, instance_ids, region_name)
         return {"instances": instances}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,13 +1,13 @@
 from fastapi import APIRouter, HTTPException
-import boto3
+
+from services.aws_services import call_aws
 
 router = APIRouter()
 
 @router.get("/regions")
 async def list_regions():
     try:
-        ec2_client = boto3.client('ec2')
-        response = ec2_client.describe_regions()
+        response = await call_aws('ec2', 'describe_regions')
         regions = response['Regions']
         region_names = [region['RegionName'] for region in regions]
         return {"regions": region_names}
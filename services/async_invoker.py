@@ -0,0 +1,482 @@
+# async_invoker.py
+
+import asyncio
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from services.aws_services import get_aws_client, run_blocking
+from services.lambda_invoker import encode_invocation_payload, decode_response_payload
+from utils.payload_codec import LAMBDA_ASYNC_PAYLOAD_LIMIT_BYTES
+from utils.state_utils import get_state_path
+
+ASYNC_INVOCATIONS_DB = os.getenv("ASYNC_INVOCATIONS_DB")
+# Where invocation results are collected: "sqs" (a Lambda destination queue) or "local" (an in-process stand-in)
+ASYNC_RESULTS_BACKEND = os.getenv("ASYNC_RESULTS_BACKEND", "sqs")
+# Destination queue created in each region, unless ASYNC_RESULTS_QUEUE_URL names an existing one
+ASYNC_RESULTS_QUEUE_NAME = os.getenv("ASYNC_RESULTS_QUEUE_NAME", "agileagents-async-results")
+ASYNC_RESULTS_QUEUE_URL = os.getenv("ASYNC_RESULTS_QUEUE_URL")
+# SQS long-poll wait per receive call
+ASYNC_RESULTS_WAIT_S = int(os.getenv("ASYNC_RESULTS_WAIT_S", "20"))
+# Invocations older than this are pruned, whether or not their result arrived
+ASYNC_INVOCATION_RETENTION_S = int(os.getenv("ASYNC_INVOCATION_RETENTION_S", str(86400)))
+
+PENDING = "pending"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class DuplicateCorrelationId(Exception):
+    """Raised when an invocation is submitted with a correlation ID already in use."""
+
+class SQSResultQueue:
+    """
+    The SQS queue Lambda delivers asynchronous invocation records to.
+    """
+
+    def __init__(self, region, queue_url=None):
+        self.region = region
+        self.queue_url = queue_url
+        self.arn = None
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        """
+        Create the queue if needed and return its ARN for the destination configuration.
+        """
+        with self._lock:
+            if self.arn is None:
+                sqs_client = get_aws_client('sqs', region_name=self.region)
+                if self.queue_url is None:
+                    self.queue_url = sqs_client.create_queue(QueueName=ASYNC_RESULTS_QUEUE_NAME)['QueueUrl']
+                self.arn = sqs_client.get_queue_attributes(
+                    QueueUrl=self.queue_url, AttributeNames=['QueueArn']
+                )['Attributes']['QueueArn']
+            return self.arn
+
+    def receive(self, wait_s=None):
+        self.ensure()
+        sqs_client = get_aws_client('sqs', region_name=self.region)
+        response = sqs_client.receive_message(
+            QueueUrl=self.queue_url, MaxNumberOfMessages=10,
+            WaitTimeSeconds=ASYNC_RESULTS_WAIT_S if wait_s is None else wait_s
+        )
+        return [(json.loads(message['Body']), message['ReceiptHandle']) for message in response.get('Messages', [])]
+
+    def delete(self, receipts):
+        sqs_client = get_aws_client('sqs', region_name=self.region)
+        for i in range(0, len(receipts), 10):
+            sqs_client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{'Id': str(n), 'ReceiptHandle': receipt} for n, receipt in enumerate(receipts[i:i + 10])]
+            )
+
+class LocalResultQueue:
+    """
+    In-process stand-in for the destination queue, for local runs and tests.
+
+    Lambda cannot deliver to it; records are put here by whatever emulates
+    the function, or posted to /management/async-invocations/results.
+    """
+
+    def __init__(self, region=None):
+        self.region = region
+        self.arn = None
+        self._records = collections.deque()
+        self._ready = threading.Condition()
+
+    def ensure(self):
+        return None
+
+    def put(self, record):
+        with self._ready:
+            self._records.append(record)
+            self._ready.notify_all()
+
+    def receive(self, wait_s=None):
+        with self._ready:
+            self._ready.wait_for(lambda: self._records, timeout=ASYNC_RESULTS_WAIT_S if wait_s is None else wait_s)
+            records = list(self._records)
+            self._records.clear()
+        return [(record, None) for record in records]
+
+    def delete(self, receipts):
+        pass
+
+# Function to turn a Lambda destination record into the fields of an invocation result
+def parse_destination_record(record):
+    """
+    Parse an asynchronous invocation record as delivered to a destination.
+
+    Args:
+        record (dict): The record, with requestContext (requestId, condition,
+            approximateInvokeCount), responseContext and responsePayload.
+
+    Returns:
+        dict: request_id, status, condition, function_error, attempts and response.
+    """
+    request_context = record.get("requestContext") or {}
+    response_context = record.get("responseContext") or {}
+    condition = request_context.get("condition")
+    function_error = response_context.get("functionError")
+    return {
+        "request_id": request_context.get("requestId"),
+        "status": SUCCEEDED if condition == "Success" and not function_error else FAILED,
+        "condition": condition,
+        "function_error": function_error,
+        "attempts": request_context.get("approximateInvokeCount"),
+        "response": record.get("responsePayload"),
+    }
+
+class AsyncInvoker:
+    """
+    Fire-and-forget invocations whose results are collected from a queue.
+
+    Functions are invoked with InvocationType='Event', so the call returns
+    as soon as Lambda has queued the event, and each invocation is tracked
+    under a correlation ID together with the request ID Lambda assigned.
+    The function's on-success and on-failure destinations point at a
+    result queue per region; a collector task drains it while invocations
+    are pending and matches each record to its invocation by request ID.
+    Callers poll or wait for a correlation ID, or stream a set of them.
+    """
+
+    def __init__(self, path=None, queue_factory=None):
+        self._path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._queue_factory = queue_factory or (
+            LocalResultQueue if ASYNC_RESULTS_BACKEND == "local"
+            else lambda region: SQSResultQueue(region, ASYNC_RESULTS_QUEUE_URL)
+        )
+        self._queues = {}
+        self._destinations = set()
+        self._collectors = {}
+        self._starts = collections.Counter()
+        self._waiters = {}
+        self.records_received = 0
+        self.records_unmatched = 0
+
+    @property
+    def conn(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(
+                    self._path or ASYNC_INVOCATIONS_DB or get_state_path("async_invocations.sqlite3"),
+                    check_same_thread=False
+                )
+                self._conn.row_factory = sqlite3.Row
+                with self._conn:
+                    self._conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS async_invocations (
+                            correlation_id TEXT PRIMARY KEY,
+                            request_id TEXT,
+                            function_name TEXT NOT NULL,
+                            region TEXT NOT NULL,
+                            qualifier TEXT,
+                            status TEXT NOT NULL,
+                            condition TEXT,
+                            function_error TEXT,
+                            attempts INTEGER,
+                            response TEXT,
+                            submitted_at REAL NOT NULL,
+                            completed_at REAL
+                        )
+                        """
+                    )
+                    self._conn.execute(
+                        "CREATE INDEX IF NOT EXISTS async_invocations_by_request ON async_invocations (request_id)"
+                    )
+                    # Records that arrived before their invocation was stored, or that belong to other callers
+                    self._conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS async_results (
+                            request_id TEXT PRIMARY KEY,
+                            record TEXT NOT NULL,
+                            received_at REAL NOT NULL
+                        )
+                        """
+                    )
+            return self._conn
+
+    def queue(self, region):
+        with self._lock:
+            if region not in self._queues:
+                self._queues[region] = self._queue_factory(region)
+            return self._queues[region]
+
+    def configure_destination(self, function_name, region, qualifier=None):
+        """
+        Point a function's on-success and on-failure destinations at the region's result queue.
+
+        Args:
+            function_name (str): The name of the Lambda function.
+            region (str): The AWS region.
+            qualifier (str, optional): The alias or version to configure.
+
+        Returns:
+            str: The destination ARN, or None with the local stand-in.
+        """
+        arn = self.queue(region).ensure()
+        if arn:
+            lambda_client = get_aws_client('lambda', region_name=region)
+            lambda_client.put_function_event_invoke_config(
+                FunctionName=function_name,
+                DestinationConfig={'OnSuccess': {'Destination': arn}, 'OnFailure': {'Destination': arn}},
+                **({'Qualifier': qualifier} if qualifier else {})
+            )
+        with self._lock:
+            self._destinations.add((function_name, region, qualifier))
+        return arn
+
+    def invoke(self, function_name, payload, region_name=None, qualifier=None, correlation_id=None):
+        """
+        Invoke a function asynchronously and track the invocation.
+
+        The result destination is configured on the first invocation of each
+        function, region and qualifier. Payloads above the asynchronous
+        inline limit are gzipped or offloaded to S3; offloaded objects are
+        left for the bucket's lifecycle rules, as Lambda may retry the event.
+
+        Args:
+            function_name (str): The name of the Lambda function.
+            payload (dict): The event payload.
+            region_name (str, optional): The AWS region. If not provided, uses the default region.
+            qualifier (str, optional): The alias or version to invoke.
+            correlation_id (str, optional): The caller's ID for the invocation. Generated if not provided.
+
+        Returns:
+            dict: The pending invocation with its correlation and request IDs.
+        """
+        region_name = region_name or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+        correlation_id = correlation_id or uuid.uuid4().hex
+        if self.get(correlation_id) is not None:
+            raise DuplicateCorrelationId(f"Correlation ID {correlation_id} is already in use")
+        if (function_name, region_name, qualifier) not in self._destinations:
+            self.configure_destination(function_name, region_name, qualifier)
+
+        body, _ = encode_invocation_payload(payload, region_name, LAMBDA_ASYNC_PAYLOAD_LIMIT_BYTES)
+        lambda_client = get_aws_client('lambda', region_name=region_name)
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=body,
+            **({'Qualifier': qualifier} if qualifier else {})
+        )
+        request_id = response['ResponseMetadata']['RequestId']
+        now = time.time()
+
+        conn = self.conn
+        with self._lock, conn:
+            if now - self._last_prune > 3600:
+                self._last_prune = now
+                conn.execute("DELETE FROM async_invocations WHERE submitted_at < ?", (now - ASYNC_INVOCATION_RETENTION_S,))
+                conn.execute("DELETE FROM async_results WHERE received_at < ?", (now - ASYNC_INVOCATION_RETENTION_S,))
+            conn.execute(
+                "INSERT INTO async_invocations "
+                "(correlation_id, request_id, function_name, region, qualifier, status, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (correlation_id, request_id, function_name, region_name, qualifier, PENDING, now)
+            )
+            early = conn.execute("SELECT record FROM async_results WHERE request_id = ?", (request_id,)).fetchone()
+        if early is not None:
+            self.record_result(json.loads(early["record"]))
+        return self.get(correlation_id)
+
+    def record_result(self, record):
+        """
+        Store a destination record as the result of its invocation and wake its waiters.
+
+        Responses the agent gzipped or offloaded to S3 are restored first.
+
+        Args:
+            record (dict): The asynchronous invocation record.
+
+        Returns:
+            str: The correlation ID, or None when no tracked invocation matches (yet).
+        """
+        result = parse_destination_record(record)
+        function_arn = (record.get("requestContext") or {}).get("functionArn") or ""
+        region = function_arn.split(":")[3] if function_arn.count(":") >= 3 else None
+        result["response"], _ = decode_response_payload(result["response"], region)
+        now = time.time()
+        conn = self.conn
+        with self._lock, conn:
+            self.records_received += 1
+            row = conn.execute(
+                "SELECT correlation_id FROM async_invocations WHERE request_id = ?", (result["request_id"],)
+            ).fetchone()
+            if row is None:
+                self.records_unmatched += 1
+                if result["request_id"]:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO async_results (request_id, record, received_at) VALUES (?, ?, ?)",
+                        (result["request_id"], json.dumps({**record, "responsePayload": result["response"]}), now)
+                    )
+                return None
+            conn.execute(
+                "UPDATE async_invocations SET status = ?, condition = ?, function_error = ?, attempts = ?, "
+                "response = ?, completed_at = ? WHERE correlation_id = ?",
+                (result["status"], result["condition"], result["function_error"], result["attempts"],
+                 json.dumps(result["response"]), now, row["correlation_id"])
+            )
+            conn.execute("DELETE FROM async_results WHERE request_id = ?", (result["request_id"],))
+            waiters = self._waiters.pop(row["correlation_id"], [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+        return row["correlation_id"]
+
+    def _row_to_invocation(self, row):
+        invocation = dict(row)
+        invocation["response"] = json.loads(invocation["response"]) if invocation["response"] else None
+        invocation["turnaround_s"] = (
+            round(invocation["completed_at"] - invocation["submitted_at"], 3) if invocation["completed_at"] else None
+        )
+        return invocation
+
+    def get(self, correlation_id):
+        conn = self.conn
+        with self._lock:
+            row = conn.execute("SELECT * FROM async_invocations WHERE correlation_id = ?", (correlation_id,)).fetchone()
+        return self._row_to_invocation(row) if row else None
+
+    def pending_regions(self):
+        conn = self.conn
+        with self._lock:
+            rows = conn.execute("SELECT DISTINCT region FROM async_invocations WHERE status = ?", (PENDING,)).fetchall()
+        return [row["region"] for row in rows]
+
+    def _register(self, correlation_id):
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._waiters.setdefault(correlation_id, []).append((asyncio.get_running_loop(), future))
+        return future
+
+    async def wait(self, correlation_id, timeout=None):
+        """
+        Wait for the result of an invocation.
+
+        Args:
+            correlation_id (str): The correlation ID.
+            timeout (float, optional): Seconds to wait; the invocation is returned still pending after that.
+
+        Returns:
+            dict: The invocation, or None if the correlation ID is unknown.
+        """
+        invocations = self.stream([correlation_id], timeout)
+        try:
+            async for invocation in invocations:
+                return invocation
+            return None
+        finally:
+            await invocations.aclose()
+
+    async def stream(self, correlation_ids, timeout=None):
+        """
+        Yield invocations as their results arrive.
+
+        Invocations that have already completed are yielded first; those
+        still pending when the timeout expires are yielded last, as pending.
+        Unknown correlation IDs are skipped.
+
+        Args:
+            correlation_ids (list): The correlation IDs to follow.
+            timeout (float, optional): Seconds to wait for results.
+
+        Yields:
+            dict: One invocation per known correlation ID.
+        """
+        futures = {}
+        for correlation_id in dict.fromkeys(correlation_ids):
+            # Register before reading so a result stored in between still wakes us
+            future = self._register(correlation_id)
+            invocation = await run_blocking(self.get, correlation_id)
+            if invocation is None or invocation["status"] != PENDING:
+                self._unregister(correlation_id, future)
+                if invocation is not None:
+                    yield invocation
+                continue
+            futures[future] = correlation_id
+            self.ensure_started(invocation["region"])
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while futures:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait(futures, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    yield await run_blocking(self.get, futures.pop(future))
+            for correlation_id in futures.values():
+                yield await run_blocking(self.get, correlation_id)
+        finally:
+            for future, correlation_id in futures.items():
+                self._unregister(correlation_id, future)
+
+    def _unregister(self, correlation_id, future):
+        with self._lock:
+            waiters = [w for w in self._waiters.get(correlation_id, []) if w[1] is not future]
+            if waiters:
+                self._waiters[correlation_id] = waiters
+            else:
+                self._waiters.pop(correlation_id, None)
+
+    def ensure_started(self, region):
+        """
+        Start the result collector for a region on the running event loop if it is not running.
+        """
+        self._starts[region] += 1
+        collector = self._collectors.get(region)
+        if collector is None or collector.done() or collector.get_loop() is not asyncio.get_running_loop():
+            self._collectors[region] = asyncio.get_running_loop().create_task(self._collect(region))
+
+    async def resume(self):
+        """
+        Start collectors for every region with pending invocations, e.g. after a restart.
+        """
+        for region in await run_blocking(self.pending_regions):
+            self.ensure_started(region)
+
+    async def stop(self):
+        collectors, self._collectors = list(self._collectors.values()), {}
+        for collector in collectors:
+            if not collector.done():
+                collector.cancel()
+                try:
+                    await collector
+                except asyncio.CancelledError:
+                    pass
+
+    async def _collect(self, region):
+        result_queue = self.queue(region)
+        while True:
+            # Keep going if an invocation was submitted while pending invocations were being looked up
+            starts = self._starts[region]
+            if region not in await run_blocking(self.pending_regions) and starts == self._starts[region]:
+                return
+            try:
+                messages = await run_blocking(result_queue.receive)
+            except Exception:
+                await asyncio.sleep(1)
+                continue
+            for record, _ in messages:
+                await run_blocking(self.record_result, record)
+            receipts = [receipt for _, receipt in messages if receipt is not None]
+            if receipts:
+                await run_blocking(result_queue.delete, receipts)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": ASYNC_RESULTS_BACKEND,
+                "collectors": sorted(region for region, task in self._collectors.items() if not task.done()),
+                "records_received": self.records_received,
+                "records_unmatched": self.records_unmatched,
+            }
+
+async_invoker = AsyncInvoker()
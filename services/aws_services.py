@@ -1,24 +1,251 @@
 # aws_services.py
 
+import asyncio
 import boto3
+import functools
 import json
+import logging
+import os
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import base64
 
+# Connection-pool and retry settings shared by every pooled client. They can be
+# tuned through the environment or at runtime with configure_aws_clients().
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "5"))
+AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "standard")
+
+# Size of the thread pool that runs blocking AWS and subprocess calls on behalf
+# of async handlers, so they never block the event loop.
+AWS_EXECUTOR_MAX_WORKERS = int(os.getenv("AWS_EXECUTOR_MAX_WORKERS", "32"))
+
+# ECR authorization tokens last 12 hours; refresh them this long before they expire.
+ECR_TOKEN_REFRESH_MARGIN_S = int(os.getenv("ECR_TOKEN_REFRESH_MARGIN_S", "1800"))
+
+# How long to wait for ECR replication to copy a pushed image to another region.
+ECR_REPLICATION_TIMEOUT_S = int(os.getenv("ECR_REPLICATION_TIMEOUT_S", "600"))
+
+# Error codes AWS returns when a caller is throttled
+THROTTLING_ERROR_CODES = {
+    "TooManyRequestsException",
+    "ThrottlingException",
+    "Throttling",
+    "RequestLimitExceeded",
+}
+
+_registry_lock = threading.RLock()
+_sessions = {}
+_clients = {}
+_executor = None
+
+# Function to build the botocore config applied to pooled clients
+def _client_config():
+    return Config(
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        retries={"total_max_attempts": AWS_MAX_ATTEMPTS, "mode": AWS_RETRY_MODE},
+    )
+
+# Function to get (or create) the shared boto3 session for a profile
+def get_aws_session(profile_name=None):
+    """
+    Return the process-wide boto3 session for a profile.
+
+    boto3 sessions are not thread-safe, so they are only created and used to
+    build clients while holding the registry lock.
+
+    Args:
+        profile_name (str, optional): The AWS profile. If not provided, uses the default credential chain.
+
+    Returns:
+        boto3.session.Session: The shared session.
+    """
+    with _registry_lock:
+        session = _sessions.get(profile_name)
+        if session is None:
+            session = boto3.session.Session(profile_name=profile_name)
+            _sessions[profile_name] = session
+        return session
+
 # Function to initialize an AWS client
-def get_aws_client(service_name, region_name=None):
+def get_aws_client(service_name, region_name=None, profile_name=None):
     """
-    Initialize an AWS client for a given service.
+    Return a pooled AWS client for a given service.
+
+    Clients are cached per (service, region, profile) so repeated calls
+    reuse endpoint resolution, the credential chain and the urllib3
+    connection pool. boto3 clients are thread-safe once created.
+    Temporary and assumed-role credentials refresh inside the session's
+    credential provider, so rotation never adds clients; after replacing
+    static credentials, call invalidate_aws_clients().
 
     Args:
         service_name (str): The name of the AWS service (e.g., 's3', 'ec2').
         region_name (str, optional): The AWS region. If not provided, uses the default region.
+        profile_name (str, optional): The AWS profile. If not provided, uses the default credential chain.
 
     Returns:
         boto3.client: The Boto3 client for the specified service.
     """
-    return boto3.client(service_name, region_name=region_name)
+    with _registry_lock:
+        session = get_aws_session(profile_name)
+        region = region_name or session.region_name
+        key = (service_name, region, profile_name)
+        client = _clients.get(key)
+        if client is None:
+            client = session.client(service_name, region_name=region, config=_client_config())
+            _clients[key] = client
+        return client
+
+# Function to drop cached clients so they are rebuilt on next use
+def invalidate_aws_clients(service_name=None, region_name=None):
+    """
+    Invalidate pooled AWS clients.
+
+    Call this after credentials rotate or when a client should pick up new
+    settings. With no arguments every client and session is discarded.
+
+    Args:
+        service_name (str, optional): Only invalidate clients for this service.
+        region_name (str, optional): Only invalidate clients for this region.
+
+    Returns:
+        int: The number of clients removed.
+    """
+    with _registry_lock:
+        if service_name is None and region_name is None:
+            removed = len(_clients)
+            _clients.clear()
+            _sessions.clear()
+            return removed
+        stale = [
+            key for key in _clients
+            if (service_name is None or key[0] == service_name)
+            and (region_name is None or key[1] == region_name)
+        ]
+        for key in stale:
+            del _clients[key]
+        return len(stale)
+
+# Function to tune the connection pool and retry settings of pooled clients
+def configure_aws_clients(max_pool_connections=None, max_attempts=None, retry_mode=None):
+    """
+    Update the pool size and retry configuration used for pooled clients.
+
+    Existing clients are invalidated so the new settings take effect.
+
+    Args:
+        max_pool_connections (int, optional): The urllib3 pool size per client.
+        max_attempts (int, optional): The total number of attempts per AWS call.
+        retry_mode (str, optional): The botocore retry mode ('legacy', 'standard' or 'adaptive').
+    """
+    global AWS_MAX_POOL_CONNECTIONS, AWS_MAX_ATTEMPTS, AWS_RETRY_MODE
+    with _registry_lock:
+        if max_pool_connections is not None:
+            AWS_MAX_POOL_CONNECTIONS = max_pool_connections
+        if max_attempts is not None:
+            AWS_MAX_ATTEMPTS = max_attempts
+        if retry_mode is not None:
+            AWS_RETRY_MODE = retry_mode
+        invalidate_aws_clients()
+
+# Function to look up the account ID of the current credentials
+def get_account_id():
+    """
+    Return the AWS account ID of the current credentials.
+
+    Returns:
+        str: The AWS account ID.
+    """
+    return get_aws_client('sts').get_caller_identity().get('Account')
+
+# Function to get the bounded executor used for blocking calls
+def get_aws_executor():
+    """
+    Return the process-wide executor that runs blocking AWS calls.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: The shared executor.
+    """
+    global _executor
+    with _registry_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AWS_EXECUTOR_MAX_WORKERS, thread_name_prefix="aws-call")
+        return _executor
+
+# Function to shut the executor down (e.g., on application shutdown)
+def shutdown_aws_executor(wait=True):
+    """
+    Shut down the shared executor. A new one is created on next use.
+
+    Args:
+        wait (bool): Whether to wait for running calls to finish.
+    """
+    global _executor
+    with _registry_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+# Function to run a blocking callable without blocking the event loop
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking callable (boto3 call, subprocess.run, ...) on the shared executor.
+
+    Args:
+        func (callable): The blocking callable.
+        *args: Positional arguments for the callable.
+        **kwargs: Keyword arguments for the callable.
+
+    Returns:
+        Any: The callable's return value.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_aws_executor(), functools.partial(func, *args, **kwargs))
+
+# Function to await a single AWS API call
+async def call_aws(service_name, operation_name, region_name=None, **kwargs):
+    """
+    Await an AWS API operation on a pooled client.
+
+    Args:
+        service_name (str): The name of the AWS service (e.g., 'lambda').
+        operation_name (str): The client method to call (e.g., 'list_functions').
+        region_name (str, optional): The AWS region. If not provided, uses the default region.
+        **kwargs: Parameters for the operation.
+
+    Returns:
+        dict: The operation response.
+    """
+    client = await run_blocking(get_aws_client, service_name, region_name=region_name)
+    return await run_blocking(getattr(client, operation_name), **kwargs)
+
+# Function to await a fully paginated AWS API call
+async def paginate_aws(service_name, operation_name, result_key, region_name=None, **kwargs):
+    """
+    Await every page of a paginated AWS operation and collect one result key.
+
+    Args:
+        service_name (str): The name of the AWS service (e.g., 'iam').
+        operation_name (str): The paginated operation (e.g., 'list_users').
+        result_key (str): The key to collect from each page (e.g., 'Users').
+        region_name (str, optional): The AWS region. If not provided, uses the default region.
+        **kwargs: Parameters for the operation.
+
+    Returns:
+        list: The items from every page.
+    """
+    def collect():
+        paginator = get_aws_client(service_name, region_name=region_name).get_paginator(operation_name)
+        items = []
+        for page in paginator.paginate(**kwargs):
+            items.extend(page.get(result_key, []))
+        return items
+    return await run_blocking(collect)
 
 # Function to ensure IAM role exists, creating it if it does not
 def ensure_iam_role(role_name, account_id, service='lambda.amazonaws.com'):
@@ -76,75 +303,419 @@ def create_ecr_repository(repository_name, region_name=None):
         response = ecr_client.describe_repositories(repositoryNames=[repository_name])
     return response
 
+class ECRCredentialManager:
+    """
+    Caches ECR authorization tokens and Docker logins per registry and region.
+
+    A token is fetched with get_authorization_token only when none is cached
+    or the cached one is within ECR_TOKEN_REFRESH_MARGIN_S of expiring, and
+    `docker login` runs only when the token changed since the last login.
+    Concurrent deploys to the same registry share a single fetch and login.
+    """
+
+    def __init__(self, refresh_margin=None):
+        self.refresh_margin = ECR_TOKEN_REFRESH_MARGIN_S if refresh_margin is None else refresh_margin
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._tokens = {}
+        self._logins = {}
+        self.token_fetches = 0
+        self.docker_logins = 0
+        self.reused = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_credentials(self, region_name=None, registry_id=None):
+        """
+        Return cached ECR credentials, fetching a new token when needed.
+
+        Args:
+            region_name (str, optional): The AWS region. If not provided, uses the default region.
+            registry_id (str, optional): The registry (account) ID. Defaults to the caller's account.
+
+        Returns:
+            dict: The registry host, username, password and expiry (epoch seconds).
+        """
+        region_name = region_name or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+        key = (region_name, registry_id)
+        with self._key_lock(key):
+            credentials = self._tokens.get(key)
+            if credentials is None or credentials["expires_at"] - time.time() <= self.refresh_margin:
+                kwargs = {'registryIds': [registry_id]} if registry_id else {}
+                data = get_aws_client('ecr', region_name=region_name).get_authorization_token(**kwargs)['authorizationData'][0]
+                username, password = base64.b64decode(data['authorizationToken']).decode().split(':', 1)
+                credentials = {
+                    "registry": data['proxyEndpoint'].replace("https://", ""),
+                    "username": username,
+                    "password": password,
+                    "expires_at": data['expiresAt'].timestamp(),
+                }
+                self._tokens[key] = credentials
+                self.token_fetches += 1
+            return credentials
+
+    def ensure_docker_login(self, region_name=None, registry_id=None, force=False):
+        """
+        Log Docker in to an ECR registry unless it is already logged in with a valid token.
+
+        Args:
+            region_name (str, optional): The AWS region. If not provided, uses the default region.
+            registry_id (str, optional): The registry (account) ID. Defaults to the caller's account.
+            force (bool): Log in again even if the cached login looks valid.
+
+        Returns:
+            dict: The registry host and whether a `docker login` was run.
+        """
+        credentials = self.get_credentials(region_name, registry_id)
+        registry = credentials["registry"]
+        with self._key_lock(("login", registry)):
+            if not force and self._logins.get(registry) == credentials["password"]:
+                self.reused += 1
+                return {"registry": registry, "logged_in": False}
+            # Pass the password on stdin so it never shows up in the process list
+            result = subprocess.run(
+                ["docker", "login", "--username", credentials["username"], "--password-stdin", registry],
+                input=credentials["password"], capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                self._logins.pop(registry, None)
+                raise Exception(f"Docker login failed: {result.stderr}")
+            self._logins[registry] = credentials["password"]
+            self.docker_logins += 1
+            return {"registry": registry, "logged_in": True}
+
+    def invalidate(self, region_name=None):
+        """
+        Forget cached tokens and logins, for one region or all of them.
+        """
+        with self._lock:
+            for key in [key for key in self._tokens if region_name is None or key[0] == region_name]:
+                self._logins.pop(self._tokens.pop(key)["registry"], None)
+
+    def stats(self):
+        return {
+            "cached_tokens": len(self._tokens),
+            "token_fetches": self.token_fetches,
+            "docker_logins": self.docker_logins,
+            "reused_logins": self.reused,
+        }
+
+ecr_credentials = ECRCredentialManager()
+
+# Manifest media types whose config digest equals the local image ID
+_IMAGE_MANIFEST_MEDIA_TYPES = [
+    'application/vnd.docker.distribution.manifest.v2+json',
+    'application/vnd.oci.image.manifest.v1+json',
+]
+
+# Function to get the ID (config digest) of a local Docker image
+def get_local_image_id(local_image):
+    result = subprocess.run(
+        ["docker", "image", "inspect", "--format", "{{.Id}}", local_image],
+        capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+# Function to find an image in ECR built from the same config as a local image
+def find_ecr_image_by_config(repository_name, config_digest, region_name=None, max_candidates=100):
+    """
+    Look for an image in an ECR repository whose config digest matches a local image ID.
+
+    Identical builds produce the same config digest, so a match means ECR
+    already holds every layer of the local image. Only the max_candidates
+    most recently pushed images are compared.
+
+    Args:
+        repository_name (str): The name of the ECR repository.
+        config_digest (str): The local image ID (sha256:...).
+        region_name (str, optional): The AWS region. If not provided, uses the default region.
+        max_candidates (int): The number of recent images to compare.
+
+    Returns:
+        dict: The image digest, manifest, manifest media type and size in bytes, or None.
+    """
+    ecr_client = get_aws_client('ecr', region_name=region_name)
+    images = []
+    kwargs = {'repositoryName': repository_name, 'maxResults': 1000}
+    try:
+        while True:
+            response = ecr_client.describe_images(**kwargs)
+            images.extend(response.get('imageDetails', []))
+            if not response.get('nextToken'):
+                break
+            kwargs['nextToken'] = response['nextToken']
+    except ecr_client.exceptions.RepositoryNotFoundException:
+        return None
+
+    images.sort(key=lambda image: image.get('imagePushedAt') or 0, reverse=True)
+    digests = [image['imageDigest'] for image in images[:max_candidates]]
+    for i in range(0, len(digests), 100):
+        response = ecr_client.batch_get_image(
+            repositoryName=repository_name,
+            imageIds=[{'imageDigest': digest} for digest in digests[i:i + 100]],
+            acceptedMediaTypes=_IMAGE_MANIFEST_MEDIA_TYPES
+        )
+        for image in response.get('images', []):
+            manifest = json.loads(image['imageManifest'])
+            config = manifest.get('config') or {}
+            if config.get('digest') == config_digest:
+                return {
+                    "image_digest": image['imageId']['imageDigest'],
+                    "manifest": image['imageManifest'],
+                    "media_type": image.get('imageManifestMediaType') or manifest.get('mediaType'),
+                    "size": config.get('size', 0) + sum(layer.get('size', 0) for layer in manifest.get('layers', [])),
+                }
+    return None
+
+# Function to tag an image already in ECR without pushing it again
+def tag_ecr_image(repository_name, image, image_tag, region_name=None):
+    """
+    Point a tag at an image already in ECR using put_image, uploading no layers.
+
+    Args:
+        repository_name (str): The name of the ECR repository.
+        image (dict): The image returned by find_ecr_image_by_config.
+        image_tag (str): The tag to set.
+        region_name (str, optional): The AWS region. If not provided, uses the default region.
+    """
+    ecr_client = get_aws_client('ecr', region_name=region_name)
+    kwargs = {'imageManifestMediaType': image['media_type']} if image.get('media_type') else {}
+    try:
+        ecr_client.put_image(
+            repositoryName=repository_name,
+            imageManifest=image['manifest'],
+            imageTag=image_tag,
+            **kwargs
+        )
+    except ecr_client.exceptions.ImageAlreadyExistsException:
+        # The tag already points at this image
+        pass
+
+# Function to get the compressed size of an image in ECR
+def get_ecr_image_size(repository_name, image_tag, region_name=None):
+    """
+    Return the size ECR reports for a tagged image in bytes, or None if it is unknown.
+    """
+    ecr_client = get_aws_client('ecr', region_name=region_name)
+    try:
+        response = ecr_client.describe_images(repositoryName=repository_name, imageIds=[{'imageTag': image_tag}])
+    except (ecr_client.exceptions.ImageNotFoundException, ecr_client.exceptions.RepositoryNotFoundException):
+        return None
+    details = response.get('imageDetails') or [{}]
+    return details[0].get('imageSizeInBytes')
+
+# Function to push a Docker image to ECR, skipping the upload when ECR already has it
+def push_docker_image_to_ecr_with_report(repository_name, image_tag, region_name=None, local_image=None):
+    """
+    Push a Docker image to ECR unless an identical image is already there.
+
+    When the repository already holds an image with the same config digest
+    as the local image, the tag is set remotely with put_image and nothing
+    is uploaded.
+
+    Args:
+        repository_name (str): The name of the ECR repository.
+        image_tag (str): The tag of the Docker image.
+        region_name (str, optional): The AWS region. If not provided, uses the default region.
+        local_image (str, optional): The local image to push. Defaults to repository_name:image_tag.
+
+    Returns:
+        dict: The image URI, whether the push was skipped, the bytes not uploaded
+            and the image digest when it is known.
+    """
+    region_name = region_name or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+    local_image = local_image or f"{repository_name}:{image_tag}"
+
+    existing = find_ecr_image_by_config(repository_name, get_local_image_id(local_image), region_name)
+    if existing is not None:
+        tag_ecr_image(repository_name, existing, image_tag, region_name)
+        registry = f"{get_account_id()}.dkr.ecr.{region_name}.amazonaws.com"
+        return {
+            "image_uri": f"{registry}/{repository_name}:{image_tag}",
+            "push_skipped": True,
+            "bytes_avoided": existing["size"],
+            "image_digest": existing["image_digest"],
+        }
+
+    # Authenticate Docker to ECR, reusing a cached token and login when still valid
+    registry = ecr_credentials.ensure_docker_login(region_name)["registry"]
+
+    image_uri = f"{registry}/{repository_name}:{image_tag}"
+    subprocess.run(["docker", "tag", local_image, image_uri], check=True)
+    push_result = subprocess.run(["docker", "push", image_uri], capture_output=True, text=True)
+    if push_result.returncode != 0:
+        # The login may have been replaced outside this process; log in again once
+        logging.warning(f"docker push failed, retrying after a fresh login: {push_result.stderr.strip()}")
+        ecr_credentials.ensure_docker_login(region_name, force=True)
+        subprocess.run(["docker", "push", image_uri], check=True)
+
+    return {"image_uri": image_uri, "push_skipped": False, "bytes_avoided": 0, "image_digest": None}
+
 # Function to push a Docker image to ECR
 
-def push_docker_image_to_ecr(repository_name, image_tag, region_name=None):
+def push_docker_image_to_ecr(repository_name, image_tag, region_name=None, local_image=None):
     """
     Push a Docker image to an ECR repository.
 
+    The upload is skipped when ECR already holds the same image; see
+    push_docker_image_to_ecr_with_report.
+
     Args:
         repository_name (str): The name of the ECR repository.
         image_tag (str): The tag of the Docker image.
         region_name (str, optional): The AWS region. If not provided, uses the default region.
+        local_image (str, optional): The local image to push. Defaults to repository_name:image_tag.
 
     Returns:
         str: The URI of the pushed Docker image.
     """
+    return push_docker_image_to_ecr_with_report(repository_name, image_tag, region_name, local_image)["image_uri"]
+
+# Function to list the regions a repository is replicated to by ECR replication
+def get_ecr_replication_regions(repository_name, region_name=None):
+    """
+    Return the regions that ECR replication copies a repository's images to.
+
+    Only destinations in the caller's own account are returned, and rules
+    with repository filters only count when a prefix matches.
+
+    Args:
+        repository_name (str): The name of the ECR repository.
+        region_name (str, optional): The source region. If not provided, uses the default region.
+
+    Returns:
+        list: The destination regions.
+    """
+    account_id = get_account_id()
+    registry = get_aws_client('ecr', region_name=region_name).describe_registry()
+    regions = []
+    for rule in registry.get('replicationConfiguration', {}).get('rules', []):
+        filters = rule.get('repositoryFilters') or []
+        if filters and not any(repository_name.startswith(f['filter']) for f in filters if f.get('filterType') == 'PREFIX_MATCH'):
+            continue
+        for destination in rule.get('destinations', []):
+            if destination.get('registryId') == account_id and destination['region'] not in regions:
+                regions.append(destination['region'])
+    return regions
+
+# Function to wait until an image tag shows up in a region's repository
+def wait_for_ecr_image(repository_name, image_tag, region_name=None, timeout=None, interval=5):
+    """
+    Poll ECR until an image tag exists, e.g. after replication from another region.
+
+    Args:
+        repository_name (str): The name of the ECR repository.
+        image_tag (str): The image tag to wait for.
+        region_name (str, optional): The AWS region. If not provided, uses the default region.
+        timeout (float, optional): Seconds to wait. Defaults to ECR_REPLICATION_TIMEOUT_S.
+        interval (float): Seconds between polls.
+
+    Returns:
+        str: The image digest.
+    """
     ecr_client = get_aws_client('ecr', region_name=region_name)
-    account_id = boto3.client('sts').get_caller_identity().get('Account')
-    ecr_uri = f"{account_id}.dkr.ecr.{region_name}.amazonaws.com"
-    
-    # Get ECR login token and authenticate Docker
-    auth_token = ecr_client.get_authorization_token()['authorizationData'][0]['authorizationToken']
-    username, password = base64.b64decode(auth_token).decode().split(':')
-    
-    login_command = f"docker login -u {username} -p {password} {ecr_uri}"
-    login_result = subprocess.run(login_command, shell=True, capture_output=True, text=True)
-    if login_result.returncode != 0:
-        raise Exception(f"Docker login failed: {login_result.stderr}")
-    
-    image_uri = f"{ecr_uri}/{repository_name}:{image_tag}"
-    subprocess.run(["docker", "tag", f"{repository_name}:{image_tag}", image_uri], check=True)
-    subprocess.run(["docker", "push", image_uri], check=True)
-    
-    return image_uri
-
-# Function to create or update a Lambda function with a Docker image
-def create_or_update_lambda_function(function_name, image_uri, role_arn, region_name=None, memory_size=128, storage_size=512, vpc_config=None):
-    """
-    Create or update a Lambda function with a Docker image.
+    deadline = time.monotonic() + (ECR_REPLICATION_TIMEOUT_S if timeout is None else timeout)
+    while True:
+        try:
+            response = ecr_client.describe_images(repositoryName=repository_name, imageIds=[{'imageTag': image_tag}])
+            return response['imageDetails'][0]['imageDigest']
+        except (ecr_client.exceptions.ImageNotFoundException, ecr_client.exceptions.RepositoryNotFoundException):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{repository_name}:{image_tag} did not replicate to {region_name} in time")
+            time.sleep(interval)
+
+# Function to build the Code arguments of a Lambda create or update call
+def lambda_code_arguments(image_uri=None, zip_file=None, s3_bucket=None, s3_key=None):
+    """
+    Build the code arguments for an image, inline zip or S3 zip package.
+
+    Args:
+        image_uri (str, optional): The URI of the Docker image.
+        zip_file (bytes, optional): The zip package, sent inline.
+        s3_bucket (str, optional): The bucket holding the zip package.
+        s3_key (str, optional): The key of the zip package.
+
+    Returns:
+        tuple: The Code dict for create_function and the keyword arguments for update_function_code.
+    """
+    if image_uri is not None:
+        return {'ImageUri': image_uri}, {'ImageUri': image_uri}
+    if zip_file is not None:
+        return {'ZipFile': zip_file}, {'ZipFile': zip_file}
+    if s3_bucket and s3_key:
+        return {'S3Bucket': s3_bucket, 'S3Key': s3_key}, {'S3Bucket': s3_bucket, 'S3Key': s3_key}
+    raise ValueError("An image URI, a zip file or an S3 location is required")
+
+# Function to upload a Lambda zip package to S3
+def upload_lambda_package(path, bucket_name, key, region_name=None):
+    """
+    Upload a zip package to S3 for packages too large to send inline.
+
+    The bucket must be in the same region as the function. Large files are
+    uploaded in parts by the S3 transfer manager.
+
+    Returns:
+        dict: The S3Bucket and S3Key to pass as the function code.
+    """
+    s3_client = get_aws_client('s3', region_name=region_name)
+    s3_client.upload_file(path, bucket_name, key)
+    return {'S3Bucket': bucket_name, 'S3Key': key}
+
+# Function to create or update a Lambda function with a Docker image or a zip package
+def create_or_update_lambda_function(function_name, image_uri, role_arn, region_name=None, memory_size=128, storage_size=512,
+                                     vpc_config=None, package_type='Image', zip_file=None, s3_bucket=None, s3_key=None,
+                                     runtime=None, handler=None):
+    """
+    Create or update a Lambda function with a Docker image or a zip package.
 
     Args:
         function_name (str): The name of the Lambda function.
-        image_uri (str): The URI of the Docker image.
+        image_uri (str): The URI of the Docker image (None for zip packages).
         role_arn (str): The ARN of the IAM role.
         region_name (str, optional): The AWS region. If not provided, uses the default region.
         memory_size (int, optional): The memory size for the Lambda function (default is 128 MB).
         storage_size (int, optional): The ephemeral storage size for the Lambda function (default is 512 MB).
         vpc_config (dict, optional): The VPC configuration for the Lambda function (default is None).
+        package_type (str, optional): 'Image' (default) or 'Zip'.
+        zip_file (bytes, optional): The zip package, sent inline.
+        s3_bucket (str, optional): The bucket holding the zip package.
+        s3_key (str, optional): The key of the zip package.
+        runtime (str, optional): The runtime of a zip package, e.g. python3.11.
+        handler (str, optional): The handler of a zip package, e.g. app.lambda_handler.
 
     Returns:
         dict: The response from the create_function or update_function_code call.
     """
     lambda_client = get_aws_client('lambda', region_name=region_name)
+    code, update_code = lambda_code_arguments(
+        image_uri if package_type == 'Image' else None, zip_file, s3_bucket, s3_key
+    )
+    package_arguments = {'Runtime': runtime, 'Handler': handler} if package_type == 'Zip' else {}
     try:
         response = lambda_client.create_function(
             FunctionName=function_name,
             Role=role_arn,
-            Code={'ImageUri': image_uri},
-            PackageType='Image',
+            Code=code,
+            PackageType=package_type,
             Publish=True,
             MemorySize=memory_size,
             EphemeralStorage={'Size': storage_size},
-            VpcConfig=vpc_config if vpc_config else {}
+            VpcConfig=vpc_config if vpc_config else {},
+            **package_arguments
         )
     except lambda_client.exceptions.ResourceConflictException:
+        # Lambda rejects an update while a previous one is still in progress
+        waiter = lambda_client.get_waiter('function_updated')
+        waiter.wait(FunctionName=function_name)
         response = lambda_client.update_function_code(
             FunctionName=function_name,
-            ImageUri=image_uri,
-            Publish=True
+            Publish=True,
+            **update_code
         )
         if vpc_config:
+            waiter.wait(FunctionName=function_name)
             lambda_client.update_function_configuration(
                 FunctionName=function_name,
                 MemorySize=memory_size,
@@ -0,0 +1,289 @@
+# batch_deployer.py
+
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from services.aws_services import (
+    get_aws_client,
+    get_account_id,
+    ensure_iam_role,
+    run_blocking,
+    THROTTLING_ERROR_CODES,
+)
+from services.lambda_readiness import readiness, function_lock
+from services.warm_pool import warm_pool
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveBackoff:
+    """
+    Backoff shared by every worker of a batch.
+
+    A throttling error doubles the shared delay, so all workers slow down
+    together instead of each hammering the API on its own schedule. Every
+    successful call halves it again until it drops back to zero.
+    """
+
+    def __init__(self, base_delay=0.25, max_delay=20.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.throttle_count = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            delay = self.delay
+        if delay:
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttle_count += 1
+            self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+
+    def on_success(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.base_delay else 0.0
+
+# Function to call an AWS operation, backing off and retrying when throttled
+def call_with_backoff(backoff, operation, max_retries=8, **kwargs):
+    """
+    Call an AWS operation, retrying throttling errors with the shared backoff.
+
+    Args:
+        backoff (AdaptiveBackoff): The backoff shared by the batch.
+        operation (callable): The bound client method to call.
+        max_retries (int): The maximum number of retries after throttling.
+        **kwargs: Parameters for the operation.
+
+    Returns:
+        tuple: The operation response and the number of attempts made.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        backoff.wait()
+        try:
+            response = operation(**kwargs)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES and attempt <= max_retries:
+                backoff.on_throttle()
+                continue
+            raise
+        backoff.on_success()
+        return response, attempt
+
+# Function to run the steps every function in a batch shares, exactly once
+def prepare_batch(repository_name, image_tag, region, role_name="lambda-execution-role"):
+    """
+    Resolve the account, IAM role and repository once for a batch.
+
+    The image is already in ECR, so no Docker login is needed here.
+
+    Args:
+        repository_name (str): The ECR repository holding the image.
+        image_tag (str): The image tag to deploy.
+        region (str): The AWS region.
+        role_name (str): The Lambda execution role.
+
+    Returns:
+        dict: The account ID, role ARN, region and image URI shared by the batch.
+    """
+    account_id = get_account_id()
+    role_arn = ensure_iam_role(role_name, account_id)
+
+    # Ensure ECR repository exists
+    ecr_client = get_aws_client('ecr', region_name=region)
+    try:
+        ecr_client.create_repository(repositoryName=repository_name)
+    except ecr_client.exceptions.RepositoryAlreadyExistsException:
+        pass
+
+    return {
+        "account_id": account_id,
+        "role_arn": role_arn,
+        "region": region,
+        "image_uri": f"{account_id}.dkr.ecr.{region}.amazonaws.com/{repository_name}:{image_tag}",
+    }
+
+# Function to create or update one function of a batch
+def deploy_function(function_name, batch, config, backoff):
+    """
+    Create (or update) one Lambda function and its log retention.
+
+    Args:
+        function_name (str): The name of the Lambda function.
+        batch (dict): The shared context returned by prepare_batch.
+        config (FunctionConfig): The batch deployment configuration.
+        backoff (AdaptiveBackoff): The backoff shared by the batch.
+
+    Returns:
+        dict: The function name, status, action taken, attempts and duration.
+    """
+    lambda_client = get_aws_client('lambda', region_name=batch["region"])
+    logs_client = get_aws_client('logs', region_name=batch["region"])
+    vpc_config = {
+        'SubnetIds': config.subnet_ids,
+        'SecurityGroupIds': config.security_group_ids
+    }
+    start = time.perf_counter()
+    attempts = 0
+    result = {"function_name": function_name}
+    try:
+        try:
+            _, tries = call_with_backoff(
+                backoff,
+                lambda_client.create_function,
+                max_retries=config.max_retries,
+                FunctionName=function_name,
+                Role=batch["role_arn"],
+                Code={'ImageUri': batch["image_uri"]},
+                PackageType='Image',
+                Publish=True,
+                MemorySize=config.memory_size,
+                EphemeralStorage={'Size': config.storage_size},
+                VpcConfig=vpc_config
+            )
+            attempts += tries
+            result["action"] = "created"
+
+            # Set up CloudWatch Logs retention
+            log_group_name = f"/aws/lambda/{function_name}"
+            try:
+                _, tries = call_with_backoff(backoff, logs_client.create_log_group,
+                                             max_retries=config.max_retries, logGroupName=log_group_name)
+                attempts += tries
+            except logs_client.exceptions.ResourceAlreadyExistsException:
+                attempts += 1
+            _, tries = call_with_backoff(
+                backoff,
+                logs_client.put_retention_policy,
+                max_retries=config.max_retries,
+                logGroupName=log_group_name,
+                retentionInDays=config.log_retention_days
+            )
+            attempts += tries
+        except lambda_client.exceptions.ResourceConflictException:
+            attempts += 1
+            _, tries = call_with_backoff(
+                backoff,
+                lambda_client.update_function_code,
+                max_retries=config.max_retries,
+                FunctionName=function_name,
+                ImageUri=batch["image_uri"],
+                Publish=True
+            )
+            attempts += tries
+            # The configuration is updated once the code update has finished, see update_function_settings
+            result["action"] = "updated"
+        result["status"] = "success"
+    except Exception as e:
+        result.update(status="error", error=str(e))
+    result["attempts"] = attempts
+    result["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+# Function to apply the batch's memory, storage and VPC settings to an existing function
+def update_function_settings(function_name, batch, config, backoff):
+    """
+    Update the configuration of a function whose code was just updated.
+
+    Call it only once the code update has finished: Lambda rejects a
+    configuration update while another update is in progress.
+
+    Returns:
+        int: The number of attempts made.
+    """
+    lambda_client = get_aws_client('lambda', region_name=batch["region"])
+    _, tries = call_with_backoff(
+        backoff,
+        lambda_client.update_function_configuration,
+        max_retries=config.max_retries,
+        FunctionName=function_name,
+        MemorySize=config.memory_size,
+        EphemeralStorage={'Size': config.storage_size},
+        VpcConfig={
+            'SubnetIds': config.subnet_ids,
+            'SecurityGroupIds': config.security_group_ids
+        }
+    )
+    return tries
+
+# Function to deploy every function of a batch with a bounded worker count
+async def deploy_functions(function_names, config, region):
+    """
+    Deploy many Lambda functions from one image in parallel.
+
+    The shared setup (IAM role, repository) runs once, then each
+    function is deployed by one of config.max_workers workers. Throttling is
+    absorbed by a backoff shared across the workers. Readiness of every
+    function is tracked by one shared poller, outside the worker slots, and
+    each result reports its time_to_ready_s.
+
+    Args:
+        function_names (list): The functions to create or update.
+        config (FunctionConfig): The batch deployment configuration.
+        region (str): The AWS region.
+
+    Returns:
+        dict: The per-function results and a summary including throughput.
+    """
+    start = time.perf_counter()
+    batch = await run_blocking(prepare_batch, config.repository_name, config.image_tag, region)
+    backoff = AdaptiveBackoff()
+    semaphore = asyncio.Semaphore(config.max_workers)
+    results = []
+
+    async def deploy_one(function_name):
+        # Serialized with deploys and power tuning of the same function; taken before a
+        # worker slot so a function busy elsewhere does not hold one up
+        async with function_lock(function_name, region):
+            async with semaphore:
+                result = await run_blocking(deploy_function, function_name, batch, config, backoff)
+            try:
+                if result["status"] == "success" and result["action"] == "updated":
+                    await readiness.wait(function_name, region)
+                    async with semaphore:
+                        result["attempts"] += await run_blocking(
+                            update_function_settings, function_name, batch, config, backoff
+                        )
+                    # Provisioned environments serve the warm pool's alias, so move it to the new image
+                    await warm_pool.advance_alias(function_name, region)
+            except Exception as e:
+                result.update(status="error", error=str(e))
+        try:
+            if result["status"] == "success" and config.wait_for_ready:
+                ready = await readiness.wait(function_name, region)
+                result["time_to_ready_s"] = ready["time_to_ready_s"]
+        except Exception as e:
+            result.update(status="error", error=str(e))
+        results.append(result)
+        logger.info(
+            f"[{len(results)}/{len(function_names)}] {function_name}: {result['status']} "
+            f"({result.get('action', '-')}, {result['attempts']} attempts, {result['duration_ms']} ms)"
+        )
+        return result
+
+    ordered = await asyncio.gather(*(deploy_one(name) for name in function_names))
+    wall_time = time.perf_counter() - start
+    succeeded = sum(1 for r in ordered if r["status"] == "success")
+    ready_times = [r["time_to_ready_s"] for r in ordered if r.get("time_to_ready_s") is not None]
+    return {
+        "results": ordered,
+        "summary": {
+            "total": len(ordered),
+            "succeeded": succeeded,
+            "failed": len(ordered) - succeeded,
+            "throttled": backoff.throttle_count,
+            "max_workers": config.max_workers,
+            "wall_time_s": round(wall_time, 2),
+            "functions_per_minute": round(succeeded / wall_time * 60, 2) if wall_time else None,
+            "max_time_to_ready_s": max(ready_times) if ready_times else None,
+        },
+    }
@@ -0,0 +1,176 @@
+# build_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from services.aws_services import get_aws_client
+from utils.state_utils import get_state_path
+
+BUILD_CACHE_DB = os.getenv("BUILD_CACHE_DB")
+
+# Function to hash a build context directory
+def compute_context_hash(context_dir):
+    """
+    Compute a content hash over every file in a build context.
+
+    File paths and contents both feed the hash, so any change to the
+    Dockerfile, the sources or the requirements yields a new hash.
+
+    Args:
+        context_dir (str): The build context directory.
+
+    Returns:
+        str: The hex SHA-256 of the context.
+    """
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(context_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(path, context_dir).replace(os.sep, "/").encode("utf-8") + b"\0")
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+class BuildCache:
+    """
+    Maps a build-input hash to an image already pushed to ECR.
+
+    Entries are scoped per region and repository. A hit is only returned
+    once ECR confirms the image digest still exists, so images deleted
+    from ECR are evicted instead of deployed.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def conn(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(
+                    self._path or BUILD_CACHE_DB or get_state_path("build_cache.sqlite3"),
+                    check_same_thread=False
+                )
+                self._conn.row_factory = sqlite3.Row
+                with self._conn:
+                    self._conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS build_cache (
+                            input_hash TEXT NOT NULL,
+                            region TEXT NOT NULL,
+                            repository_name TEXT NOT NULL,
+                            image_uri TEXT NOT NULL,
+                            image_digest TEXT NOT NULL,
+                            created_at REAL,
+                            last_hit_at REAL,
+                            hit_count INTEGER DEFAULT 0,
+                            PRIMARY KEY (input_hash, region, repository_name)
+                        )
+                        """
+                    )
+            return self._conn
+
+    def _image_exists(self, repository_name, image_digest, region):
+        ecr_client = get_aws_client('ecr', region_name=region)
+        try:
+            response = ecr_client.describe_images(
+                repositoryName=repository_name,
+                imageIds=[{'imageDigest': image_digest}]
+            )
+        except (ecr_client.exceptions.ImageNotFoundException, ecr_client.exceptions.RepositoryNotFoundException):
+            return False
+        return bool(response.get('imageDetails'))
+
+    def lookup(self, input_hash, repository_name, region, verify=True):
+        """
+        Return the cached image for a build hash, or None on a miss.
+
+        Args:
+            input_hash (str): The build-input hash.
+            repository_name (str): The ECR repository.
+            region (str): The AWS region.
+            verify (bool): Confirm with ECR that the image digest still exists.
+
+        Returns:
+            dict: The cache entry, or None.
+        """
+        conn = self.conn
+        with self._lock:
+            row = conn.execute(
+                "SELECT * FROM build_cache WHERE input_hash = ? AND region = ? AND repository_name = ?",
+                (input_hash, region, repository_name)
+            ).fetchone()
+        if row is not None and verify and not self._image_exists(repository_name, row["image_digest"], region):
+            self.purge(input_hash=input_hash, repository_name=repository_name, region=region)
+            self.evictions += 1
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with conn:
+                conn.execute(
+                    "UPDATE build_cache SET hit_count = hit_count + 1, last_hit_at = ? "
+                    "WHERE input_hash = ? AND region = ? AND repository_name = ?",
+                    (time.time(), input_hash, region, repository_name)
+                )
+        return dict(row)
+
+    def store(self, input_hash, repository_name, region, image_uri, image_digest):
+        conn = self.conn
+        with self._lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO build_cache "
+                "(input_hash, region, repository_name, image_uri, image_digest, created_at, hit_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (input_hash, region, repository_name, image_uri, image_digest, time.time())
+            )
+
+    def purge(self, input_hash=None, repository_name=None, region=None):
+        """
+        Remove cache entries, optionally filtered by hash, repository and region.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        conditions, params = [], []
+        for column, value in (("input_hash", input_hash), ("repository_name", repository_name), ("region", region)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        query = "DELETE FROM build_cache"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        conn = self.conn
+        with self._lock, conn:
+            return conn.execute(query, params).rowcount
+
+    def stats(self):
+        conn = self.conn
+        with self._lock:
+            row = conn.execute(
+                "SELECT COUNT(*) AS entries, COALESCE(SUM(hit_count), 0) AS total_hits FROM build_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": row["entries"],
+            "total_hits": row["total_hits"],
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+build_cache = BuildCache()
@@ -0,0 +1,137 @@
+# build_workspace.py
+
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+BUILD_WORKSPACE_ROOT = os.getenv("BUILD_WORKSPACE_ROOT", os.path.join(tempfile.gettempdir(), "agileagents-builds"))
+BUILD_WORKSPACE_QUOTA_MB = int(os.getenv("BUILD_WORKSPACE_QUOTA_MB", "2048"))
+# Workspaces untouched for longer than this are left over from a crashed worker; no build runs this long
+BUILD_WORKSPACE_MAX_AGE_S = float(os.getenv("BUILD_WORKSPACE_MAX_AGE_S", str(6 * 3600)))
+
+class WorkspaceQuotaExceeded(Exception):
+    pass
+
+class BuildWorkspace:
+    """
+    An isolated directory for one build, so concurrent deploys never share files.
+
+    The workspace holds the Docker build context in `context/` and scratch
+    space (virtual environments, downloads) next to it, outside the context.
+    Writes made through the workspace are checked against a disk quota, and
+    check_quota() measures what external tools wrote. Use it as a context
+    manager to remove the directory when the build finishes.
+    """
+
+    def __init__(self, workspace_id=None, root=None, quota_bytes=None):
+        self.workspace_id = workspace_id or uuid.uuid4().hex
+        self.root = root or BUILD_WORKSPACE_ROOT
+        self.path = os.path.join(self.root, self.workspace_id)
+        self.context_dir = os.path.join(self.path, "context")
+        self.quota_bytes = quota_bytes if quota_bytes is not None else BUILD_WORKSPACE_QUOTA_MB * 1024 * 1024
+        self.bytes_written = 0
+
+    def create(self):
+        os.makedirs(self.context_dir, exist_ok=True)
+        return self
+
+    def __enter__(self):
+        return self.create()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def scratch_path(self, *parts):
+        """
+        Return a path in the workspace but outside the build context.
+        """
+        return self._safe_join(self.path, *parts)
+
+    def context_path(self, *parts):
+        """
+        Return a path inside the build context, rejecting paths that escape it.
+        """
+        return self._safe_join(self.context_dir, *parts)
+
+    def _safe_join(self, base, *parts):
+        path = os.path.realpath(os.path.join(base, *parts))
+        if path != os.path.realpath(base) and not path.startswith(os.path.realpath(base) + os.sep):
+            raise ValueError(f"Path escapes the build workspace: {os.path.join(*parts)}")
+        return path
+
+    def reserve(self, nbytes):
+        """
+        Account for bytes about to be written, raising if the quota would be exceeded.
+        """
+        if self.bytes_written + nbytes > self.quota_bytes:
+            raise WorkspaceQuotaExceeded(
+                f"Build workspace quota of {self.quota_bytes // (1024 * 1024)} MB exceeded"
+            )
+        self.bytes_written += nbytes
+
+    def write_text(self, name, content):
+        return self.write_bytes(name, content.encode("utf-8"))
+
+    def write_bytes(self, name, data):
+        path = self.context_path(name)
+        self.reserve(len(data))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def disk_usage(self):
+        total = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, filename)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def check_quota(self):
+        """
+        Measure the workspace on disk and raise if it exceeds the quota.
+        """
+        usage = self.disk_usage()
+        self.bytes_written = max(self.bytes_written, usage)
+        if usage > self.quota_bytes:
+            raise WorkspaceQuotaExceeded(
+                f"Build workspace uses {usage // (1024 * 1024)} MB, over the {self.quota_bytes // (1024 * 1024)} MB quota"
+            )
+        return usage
+
+# Function to remove workspaces left behind by a crashed worker
+def cleanup_stale_workspaces(max_age_seconds=None, root=None, keep=()):
+    """
+    Remove build workspaces older than max_age_seconds.
+
+    Called at application startup, since a killed worker never reaches the
+    cleanup of its builds.
+
+    Args:
+        max_age_seconds (float, optional): Defaults to BUILD_WORKSPACE_MAX_AGE_S.
+        root (str, optional): Defaults to BUILD_WORKSPACE_ROOT.
+        keep (iterable): Workspace IDs to leave in place, e.g. those of queued jobs.
+
+    Returns:
+        int: The number of workspaces removed.
+    """
+    root = root or BUILD_WORKSPACE_ROOT
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    cutoff = time.time() - (BUILD_WORKSPACE_MAX_AGE_S if max_age_seconds is None else max_age_seconds)
+    keep = set(keep)
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name not in keep and os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
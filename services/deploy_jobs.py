@@ -0,0 +1,503 @@
+# deploy_jobs.py
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from services.deploy_metrics import observe_stage
+from utils.state_utils import get_state_path
+
+logger = logging.getLogger(__name__)
+
+DEPLOY_JOBS_DB = os.getenv("DEPLOY_JOBS_DB")
+DEPLOY_JOB_WORKERS = int(os.getenv("DEPLOY_JOB_WORKERS", "4"))
+MAX_JOB_LOG_LINES = int(os.getenv("MAX_JOB_LOG_LINES", "500"))
+# Minimum seconds between writes of a running job's log to the database
+JOB_LOG_FLUSH_INTERVAL_S = float(os.getenv("JOB_LOG_FLUSH_INTERVAL_S", "1.0"))
+# Seconds an Idempotency-Key keeps pointing at the job it started
+DEPLOY_IDEMPOTENCY_TTL_S = float(os.getenv("DEPLOY_IDEMPOTENCY_TTL_S", "86400"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+FINISHED_STATUSES = {SUCCEEDED, FAILED, CANCELLED, INTERRUPTED}
+
+_JSON_COLUMNS = ("request", "stages", "logs", "metrics", "result")
+
+class JobNotFound(Exception):
+    pass
+
+class IdempotencyKeyConflict(Exception):
+    pass
+
+# Function to fingerprint a job request for de-duplication
+def request_fingerprint(kind, request, ignore_fields=()):
+    """
+    Hash a job kind and request, ignoring fields that differ between otherwise identical requests.
+    """
+    fields = {key: value for key, value in request.items() if key not in ignore_fields}
+    payload = json.dumps({"kind": kind, "request": fields}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class JobStore:
+    """
+    SQLite persistence for deploy jobs, so job state survives a worker restart.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DEPLOY_JOBS_DB or get_state_path("deploy_jobs.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS deploy_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    request TEXT,
+                    stages TEXT,
+                    logs TEXT,
+                    log_count INTEGER DEFAULT 0,
+                    metrics TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+                """
+            )
+            # Databases created before log_count existed
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(deploy_jobs)")}
+            if "log_count" not in columns:
+                self._conn.execute("ALTER TABLE deploy_jobs ADD COLUMN log_count INTEGER DEFAULT 0")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    idempotency_key TEXT PRIMARY KEY,
+                    job_id TEXT NOT NULL,
+                    request_hash TEXT NOT NULL,
+                    created_at REAL
+                )
+                """
+            )
+
+    def _row_to_job(self, row):
+        job = dict(row)
+        for column in _JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] else None
+        if job["started_at"] and job["finished_at"]:
+            job["duration_s"] = round(job["finished_at"] - job["started_at"], 3)
+        else:
+            job["duration_s"] = None
+        return job
+
+    def create(self, kind, request):
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO deploy_jobs (job_id, kind, status, request, stages, logs, metrics, created_at) "
+                "VALUES (?, ?, ?, ?, '[]', '[]', '{}', ?)",
+                (job_id, kind, QUEUED, json.dumps(request, default=str), time.time())
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        for column in _JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column], default=str)
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE deploy_jobs SET {assignments} WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM deploy_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise JobNotFound(job_id)
+        return self._row_to_job(row)
+
+    def get_idempotency_key(self, idempotency_key, ttl_s=None):
+        """
+        Return the job ID and request hash an unexpired Idempotency-Key points at, or None.
+        """
+        ttl_s = DEPLOY_IDEMPOTENCY_TTL_S if ttl_s is None else ttl_s
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (time.time() - ttl_s,))
+            row = self._conn.execute(
+                "SELECT job_id, request_hash FROM idempotency_keys WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        return (row["job_id"], row["request_hash"]) if row else None
+
+    def put_idempotency_key(self, idempotency_key, job_id, request_hash):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO idempotency_keys (idempotency_key, job_id, request_hash, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (idempotency_key, job_id, request_hash, time.time())
+            )
+
+    def list(self, status=None, kind=None, limit=50):
+        query = "SELECT * FROM deploy_jobs"
+        conditions, params = [], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if kind:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+class DeployJob:
+    """
+    Handle passed to a running pipeline to record stages, logs and metrics.
+    """
+
+    def __init__(self, job_id, kind, request, store):
+        self.job_id = job_id
+        self.kind = kind
+        self.request = request
+        self.store = store
+        self.stages = []
+        self.logs = []
+        self.log_count = 0
+        self.metrics = {}
+        self.finished = False
+        self._last_flush = 0.0
+        self._updated = asyncio.Event()
+
+    def log(self, message):
+        """
+        Append lines to the job log.
+
+        The last MAX_JOB_LOG_LINES lines are kept. Followers are woken at
+        once; the database copy is written at most every
+        JOB_LOG_FLUSH_INTERVAL_S seconds and at the end of each stage.
+        """
+        for line in str(message).splitlines() or [""]:
+            self.logs.append(line)
+            self.log_count += 1
+        del self.logs[:-MAX_JOB_LOG_LINES]
+        self._notify()
+        if time.monotonic() - self._last_flush >= JOB_LOG_FLUSH_INTERVAL_S:
+            self.flush_logs()
+
+    def flush_logs(self):
+        self._last_flush = time.monotonic()
+        self.store.update(self.job_id, logs=self.logs, log_count=self.log_count)
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def read_logs(self, from_line=0):
+        """
+        Return the retained log lines numbered from from_line on.
+
+        Returns:
+            tuple: The number of the first returned line and the lines.
+        """
+        first = self.log_count - len(self.logs)
+        start = max(from_line, first)
+        return start, self.logs[start - first:]
+
+    async def wait_for_update(self, timeout=None):
+        """
+        Wait until the job logs a line or finishes. Returns False on timeout.
+        """
+        try:
+            await asyncio.wait_for(asyncio.shield(self._updated.wait()), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def finish(self):
+        self.finished = True
+        self._notify()
+
+    def set_metric(self, name, value):
+        self.metrics[name] = value
+        self.store.update(self.job_id, metrics=self.metrics)
+
+    @contextlib.asynccontextmanager
+    async def stage(self, name):
+        """
+        Record the timing and outcome of one pipeline stage.
+
+        The stage record is yielded so the pipeline can add the bytes the
+        stage wrote, uploaded or pushed as record["bytes"]. Finished stages
+        are also observed in the Prometheus histograms.
+        """
+        record = {"name": name, "status": RUNNING, "started_at": time.time(), "duration_s": None}
+        self.stages.append(record)
+        self.store.update(self.job_id, stage=name, stages=self.stages)
+        start = time.perf_counter()
+        try:
+            yield record
+            record["status"] = SUCCEEDED
+        except asyncio.CancelledError:
+            record["status"] = CANCELLED
+            raise
+        except Exception as e:
+            record["status"] = FAILED
+            record["error"] = str(e)
+            raise
+        finally:
+            record["duration_s"] = round(time.perf_counter() - start, 3)
+            observe_stage(self.kind, record)
+            self._last_flush = time.monotonic()
+            self.store.update(self.job_id, stages=self.stages, logs=self.logs, log_count=self.log_count)
+
+class DeployJobManager:
+    """
+    Runs deploy pipelines as background jobs on a bounded worker pool.
+
+    Pipelines are registered per job kind as coroutine functions taking
+    (job, request). Jobs run as asyncio tasks on the application's event
+    loop; a semaphore bounds how many run at once.
+    """
+
+    def __init__(self, store=None, max_workers=DEPLOY_JOB_WORKERS):
+        self._store = store
+        self.max_workers = max_workers
+        self._runners = {}
+        self._tasks = {}
+        self._live = {}
+        self._in_flight = {}
+        self._semaphore = None
+        self._recovered = False
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = JobStore()
+        return self._store
+
+    def register(self, kind, runner):
+        self._runners[kind] = runner
+
+    def ensure_started(self):
+        """
+        Create the worker semaphore and, once per process, recover the stored jobs.
+
+        Called from the application lifespan so job state is restored at
+        startup, and again lazily by submit and list.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        if not self._recovered:
+            self._recovered = True
+            self.recover()
+
+    def recover(self):
+        """
+        Restore job state after a worker restart.
+
+        Jobs that were running when the previous worker stopped cannot be
+        resumed mid-stage and are marked interrupted; queued jobs are
+        scheduled again.
+        """
+        for job in self.store.list(status=RUNNING, limit=1000):
+            if job["job_id"] not in self._tasks:
+                self.store.update(job["job_id"], status=INTERRUPTED, finished_at=time.time(),
+                                  error="Worker restarted while the job was running")
+        for job in reversed(self.store.list(status=QUEUED, limit=1000)):
+            if job["job_id"] in self._tasks:
+                continue
+            if job["kind"] in self._runners:
+                self._schedule(job["job_id"], job["kind"], job["request"])
+            else:
+                self.store.update(job["job_id"], status=INTERRUPTED, finished_at=time.time(),
+                                  error=f"No pipeline is registered for {job['kind']} jobs")
+
+    def submit(self, kind, request):
+        """
+        Queue a job and return its ID immediately.
+
+        Args:
+            kind (str): The registered pipeline to run.
+            request (dict): The JSON-serializable pipeline input.
+
+        Returns:
+            str: The job ID.
+        """
+        if kind not in self._runners:
+            raise ValueError(f"Unknown deploy job kind: {kind}")
+        self.ensure_started()
+        job_id = self.store.create(kind, request)
+        self._schedule(job_id, kind, request)
+        return job_id
+
+    def submit_once(self, kind, request, single_flight_key=None, idempotency_key=None, ignore_fields=()):
+        """
+        Queue a job unless an identical one is in flight or the idempotency key was already used.
+
+        Identical requests (same kind, single_flight_key and request
+        fingerprint) submitted while the first is queued or running attach
+        to it instead of starting a duplicate build. A request carrying an
+        Idempotency-Key seen within DEPLOY_IDEMPOTENCY_TTL_S returns the job
+        that key started, finished or not.
+
+        Args:
+            kind (str): The registered pipeline to run.
+            request (dict): The JSON-serializable pipeline input.
+            single_flight_key (str, optional): Scopes de-duplication, e.g. the function name.
+            idempotency_key (str, optional): The client's Idempotency-Key.
+            ignore_fields (tuple): Request fields left out of the fingerprint.
+
+        Returns:
+            tuple: The job ID and how it was reused: None for a new job,
+                "in_flight" or "idempotency_key".
+
+        Raises:
+            IdempotencyKeyConflict: If the key was used for a different request.
+        """
+        request_hash = request_fingerprint(kind, request, ignore_fields)
+        if idempotency_key:
+            entry = self.store.get_idempotency_key(idempotency_key)
+            if entry is not None:
+                job_id, stored_hash = entry
+                if stored_hash != request_hash:
+                    raise IdempotencyKeyConflict(
+                        f"Idempotency-Key {idempotency_key} was already used for a different request"
+                    )
+                return job_id, "idempotency_key"
+
+        flight = (kind, single_flight_key, request_hash)
+        job_id = self._in_flight.get(flight)
+        reused = "in_flight" if job_id is not None else None
+        if job_id is None:
+            job_id = self.submit(kind, request)
+            self._in_flight[flight] = job_id
+        if idempotency_key:
+            self.store.put_idempotency_key(idempotency_key, job_id, request_hash)
+        return job_id, reused
+
+    def _schedule(self, job_id, kind, request):
+        job = DeployJob(job_id, kind, request, self.store)
+        self._live[job_id] = job
+        self._tasks[job_id] = asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job):
+        job_id, kind, request = job.job_id, job.kind, job.request
+        try:
+            async with self._semaphore:
+                self.store.update(job_id, status=RUNNING, started_at=time.time())
+                result = await self._runners[kind](job, request)
+            self.store.update(job_id, status=SUCCEEDED, stage=None, result=result, logs=job.logs,
+                              log_count=job.log_count, finished_at=time.time())
+        except asyncio.CancelledError:
+            self.store.update(job_id, status=CANCELLED, logs=job.logs, log_count=job.log_count,
+                              finished_at=time.time(), error="Cancelled")
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            logger.error(f"Deploy job {job_id} failed: {detail}")
+            self.store.update(job_id, status=FAILED, logs=job.logs, log_count=job.log_count,
+                              finished_at=time.time(), error=detail)
+        finally:
+            self._tasks.pop(job_id, None)
+            self._live.pop(job_id, None)
+            for flight in [flight for flight, flight_job_id in self._in_flight.items() if flight_job_id == job_id]:
+                del self._in_flight[flight]
+            job.finish()
+
+    def in_flight(self, single_flight_key):
+        """
+        Return the IDs of queued or running jobs submitted with single_flight_key.
+        """
+        return [job_id for (kind, key, request_hash), job_id in self._in_flight.items() if key == single_flight_key]
+
+    def live_job(self, job_id):
+        """
+        Return the DeployJob of a queued or running job, or None once it has finished.
+        """
+        return self._live.get(job_id)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    async def follow_logs(self, job_id, from_line=0, heartbeat_s=15.0):
+        """
+        Yield a job's log lines as they are written, then its final status.
+
+        Lines already written are replayed first (from from_line on, as far
+        as the retained log allows). While nothing new arrives a heartbeat
+        is yielded every heartbeat_s seconds.
+
+        Yields:
+            tuple: ("log", {"line_no", "line"}), ("heartbeat", {"status"}) or
+                the final ("status", {"status", "stage", "error"}).
+        """
+        next_line = from_line
+        while True:
+            job = self._live.get(job_id)
+            if job is None:
+                record = self.store.get(job_id)
+                logs = record["logs"] or []
+                first = max(record.get("log_count") or 0, len(logs)) - len(logs)
+                start = max(next_line, first)
+                for line_no, line in enumerate(logs[start - first:], start):
+                    yield "log", {"line_no": line_no, "line": line}
+                yield "status", {"status": record["status"], "stage": record["stage"], "error": record["error"]}
+                return
+            start, lines = job.read_logs(next_line)
+            for line_no, line in enumerate(lines, start):
+                yield "log", {"line_no": line_no, "line": line}
+            next_line = start + len(lines)
+            if not job.finished and not await job.wait_for_update(heartbeat_s):
+                yield "heartbeat", {"status": self.store.get(job_id)["status"]}
+
+    def list(self, status=None, kind=None, limit=50):
+        self.ensure_started()
+        return self.store.list(status=status, kind=kind, limit=limit)
+
+    async def cancel(self, job_id):
+        """
+        Cancel a queued or running job.
+
+        A running job stops at its next await; a blocking call already handed
+        to a worker thread finishes in the background but its result is dropped.
+
+        Returns:
+            dict: The job record after cancellation.
+        """
+        job = self.store.get(job_id)
+        task = self._tasks.get(job_id)
+        if job["status"] in FINISHED_STATUSES or task is None:
+            return job
+        task.cancel()
+        await asyncio.wait({task}, timeout=5)
+        return self.store.get(job_id)
+
+    async def wait(self, job_id):
+        """
+        Wait for a job to finish and return its record.
+        """
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return self.store.get(job_id)
+
+deploy_jobs = DeployJobManager()
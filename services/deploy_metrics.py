@@ -0,0 +1,104 @@
+# deploy_metrics.py
+
+import math
+import os
+import re
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+except ImportError:  # prometheus_client is optional; summaries are still served from the job store
+    Histogram = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Jobs the /deployment/metrics summary is computed over
+DEPLOY_METRICS_WINDOW = int(os.getenv("DEPLOY_METRICS_WINDOW", "200"))
+
+_REGION_SUFFIX = re.compile(r"^(?P<stage>[^\[]+)\[(?P<region>[^\]]+)\]$")
+
+if Histogram is not None:
+    STAGE_DURATION = Histogram(
+        "agileagents_deploy_stage_duration_seconds",
+        "Wall time of one deploy pipeline stage",
+        ["kind", "stage", "outcome"],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+    )
+    STAGE_BYTES = Histogram(
+        "agileagents_deploy_stage_bytes",
+        "Bytes written, uploaded or pushed by one deploy pipeline stage",
+        ["kind", "stage"],
+        buckets=(1024, 64 * 1024, 1024 ** 2, 10 * 1024 ** 2, 50 * 1024 ** 2, 250 * 1024 ** 2, 1024 ** 3, 5 * 1024 ** 3)
+    )
+
+# Function to split a stage name such as docker_push[us-east-1] into stage and region
+def stage_family(name):
+    match = _REGION_SUFFIX.match(name)
+    return (match.group("stage"), match.group("region")) if match else (name, None)
+
+# Function to record a finished stage in the Prometheus histograms
+def observe_stage(kind, record):
+    """
+    Observe a finished stage record (name, status, duration_s, bytes).
+    Does nothing when prometheus_client is not installed.
+    """
+    if Histogram is None or record.get("duration_s") is None:
+        return
+    stage, _ = stage_family(record["name"])
+    STAGE_DURATION.labels(kind, stage, record["status"]).observe(record["duration_s"])
+    if record.get("bytes") is not None:
+        STAGE_BYTES.labels(kind, stage).observe(record["bytes"])
+
+# Function to render the Prometheus exposition, or None without prometheus_client
+def prometheus_exposition():
+    return generate_latest() if Histogram is not None else None
+
+def _percentile(values, fraction):
+    # Nearest-rank percentile, so small samples report a duration that actually occurred
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+# Function to summarize stage timings over a set of job records
+def summarize_stages(jobs):
+    """
+    Summarize wall time, bytes and outcomes per stage over finished jobs.
+
+    Region-specific stages of multi-region deploys (docker_push[us-east-1])
+    are grouped under their stage name.
+
+    Args:
+        jobs (list): Job records with their stages, as returned by the job store.
+
+    Returns:
+        dict: The number of jobs, job duration percentiles and, per stage,
+            the sample count, outcomes, p50/p95/max seconds and bytes.
+    """
+    stages, durations = {}, []
+    for job in jobs:
+        if job.get("duration_s") is not None:
+            durations.append(job["duration_s"])
+        for record in job.get("stages") or []:
+            if record.get("duration_s") is None:
+                continue
+            stage, _ = stage_family(record["name"])
+            entry = stages.setdefault(stage, {"durations": [], "bytes": [], "outcomes": {}})
+            entry["durations"].append(record["duration_s"])
+            entry["outcomes"][record["status"]] = entry["outcomes"].get(record["status"], 0) + 1
+            if record.get("bytes") is not None:
+                entry["bytes"].append(record["bytes"])
+
+    summary = {}
+    for stage, entry in stages.items():
+        summary[stage] = {
+            "count": len(entry["durations"]),
+            "outcomes": entry["outcomes"],
+            "p50_s": _percentile(entry["durations"], 0.5),
+            "p95_s": _percentile(entry["durations"], 0.95),
+            "max_s": max(entry["durations"]),
+            "bytes_p50": _percentile(entry["bytes"], 0.5) if entry["bytes"] else None,
+            "bytes_total": sum(entry["bytes"]) if entry["bytes"] else None,
+        }
+    return {
+        "jobs": len(jobs),
+        "job_p50_s": _percentile(durations, 0.5) if durations else None,
+        "job_p95_s": _percentile(durations, 0.95) if durations else None,
+        "stages": dict(sorted(summary.items(), key=lambda item: -item[1]["p95_s"])),
+    }
@@ -0,0 +1,78 @@
+# dockerfile_generator.py
+
+import os
+
+# Use BuildKit cache mounts for pip so a changed requirements layer still reuses downloads
+DOCKERFILE_PIP_CACHE_MOUNT = os.getenv("DOCKERFILE_PIP_CACHE_MOUNT", "false").lower() in ("1", "true", "yes")
+
+PIP_CACHE_DIR = "/root/.cache/pip"
+WHEELHOUSE_MOUNT = "/wheelhouse"
+
+# Function to build the pip install instruction for the dependency layer
+def pip_install_instruction(requirements_file="requirements.txt", wheelhouse=False, pip_cache_mount=None):
+    """
+    Build the RUN instruction that installs the requirements.
+
+    Args:
+        requirements_file (str): The requirements file, relative to the build context.
+        wheelhouse (bool): Install offline from the wheelhouse build context
+            (passed as `docker build --build-context wheelhouse=...`).
+        pip_cache_mount (bool): Keep pip's cache in a BuildKit cache mount.
+            Defaults to DOCKERFILE_PIP_CACHE_MOUNT.
+
+    Returns:
+        str: The RUN instruction.
+    """
+    if pip_cache_mount is None:
+        pip_cache_mount = DOCKERFILE_PIP_CACHE_MOUNT
+    mounts = []
+    if wheelhouse:
+        mounts.append(f"--mount=type=bind,from=wheelhouse,target={WHEELHOUSE_MOUNT}")
+    if pip_cache_mount:
+        mounts.append(f"--mount=type=cache,target={PIP_CACHE_DIR}")
+    command = ["pip", "install"]
+    if wheelhouse:
+        command += ["--no-index", "--find-links", WHEELHOUSE_MOUNT]
+    if not pip_cache_mount:
+        # Without a cache mount the cache would only bloat the layer
+        command.append("--no-cache-dir")
+    command += ["-r", requirements_file]
+    return " ".join(["RUN", *mounts, *command])
+
+# Function to generate a Dockerfile whose layers change as rarely as possible
+def generate_dockerfile(base_image, cmd, source_files=None, requirements_file="requirements.txt",
+                        build_commands=None, wheelhouse=False, pip_cache_mount=None):
+    """
+    Generate a Dockerfile ordered for maximum layer cache reuse.
+
+    Layers go from least to most frequently changed: the base image, the
+    requirements file on its own followed by the pip install (so the
+    dependency layer is only rebuilt when the requirements change), any
+    custom build commands, and finally the application code.
+
+    Args:
+        base_image (str): The FROM image.
+        cmd (str): The CMD, in exec (JSON array) form.
+        source_files (list): The files to copy in the code layer. None copies
+            the whole build context.
+        requirements_file (str): The requirements file in the build context,
+            or None when there are no requirements.
+        build_commands (list): Extra RUN commands that do not need the code.
+        wheelhouse (bool): Install the requirements from the mounted wheelhouse.
+        pip_cache_mount (bool): Use a BuildKit cache mount for pip.
+
+    Returns:
+        str: The Dockerfile content.
+    """
+    lines = [f"FROM {base_image}"]
+    if requirements_file:
+        lines.append(f"COPY {requirements_file} .")
+        lines.append(pip_install_instruction(requirements_file, wheelhouse, pip_cache_mount))
+    for command in build_commands or []:
+        lines.append(f"RUN {command}")
+    if source_files is None:
+        lines.append("COPY . .")
+    else:
+        lines.append(f"COPY {' '.join(source_files)} ./")
+    lines.append(f"CMD {cmd}")
+    return "\n".join(lines) + "\n"
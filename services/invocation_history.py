@@ -0,0 +1,195 @@
+# invocation_history.py
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from utils.state_utils import get_state_path
+
+logger = logging.getLogger(__name__)
+
+INVOCATION_HISTORY_DB = os.getenv("INVOCATION_HISTORY_DB")
+# Invocations older than this are pruned from the history
+INVOCATION_HISTORY_RETENTION_S = int(os.getenv("INVOCATION_HISTORY_RETENTION_S", str(14 * 86400)))
+# Recorded invocations are buffered in memory and written in one transaction per interval or batch
+INVOCATION_HISTORY_FLUSH_INTERVAL_S = float(os.getenv("INVOCATION_HISTORY_FLUSH_INTERVAL_S", "1.0"))
+INVOCATION_HISTORY_BATCH_SIZE = int(os.getenv("INVOCATION_HISTORY_BATCH_SIZE", "500"))
+
+# Sources of recorded invocations: API callers, and the warm pool's keep-warm pings
+SOURCE_CLIENT = "client"
+SOURCE_KEEP_WARM = "keep_warm"
+
+class InvocationHistory:
+    """
+    Records every invocation made through the API with its cold-start data.
+
+    Invocations are requested with LogType='Tail', and the REPORT line of
+    the returned log tail shows an Init Duration only when the call started
+    a new execution environment. The warm pool learns from this history
+    which functions need warming and reports cold-start rates from it.
+
+    record() only appends to an in-memory buffer, so concurrent invocations
+    never wait on the database; a background thread writes the buffer in
+    batches, and every query flushes it first.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+
+    @property
+    def conn(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(
+                    self._path or INVOCATION_HISTORY_DB or get_state_path("invocations.sqlite3"),
+                    check_same_thread=False
+                )
+                self._conn.row_factory = sqlite3.Row
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                with self._conn:
+                    self._conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS invocations (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            function_name TEXT NOT NULL,
+                            region TEXT NOT NULL,
+                            qualifier TEXT,
+                            source TEXT NOT NULL,
+                            invoked_at REAL NOT NULL,
+                            cold INTEGER,
+                            init_duration_ms REAL,
+                            duration_ms REAL
+                        )
+                        """
+                    )
+                    self._conn.execute(
+                        "CREATE INDEX IF NOT EXISTS invocations_by_function "
+                        "ON invocations (function_name, region, invoked_at)"
+                    )
+            return self._conn
+
+    def record(self, function_name, region, report, source=SOURCE_CLIENT, qualifier=None, invoked_at=None):
+        """
+        Record one invocation.
+
+        Args:
+            function_name (str): The name of the Lambda function.
+            region (str): The AWS region.
+            report (dict): The parsed REPORT line, or None when no log tail was returned.
+            source (str): SOURCE_CLIENT or SOURCE_KEEP_WARM.
+            qualifier (str, optional): The alias or version invoked.
+            invoked_at (float, optional): The invocation time. Defaults to now.
+        """
+        report = report or {}
+        cold = None if not report else int(report.get("init_duration_ms") is not None)
+        row = (function_name, region, qualifier, source, invoked_at or time.time(), cold,
+               report.get("init_duration_ms"), report.get("duration_ms"))
+        with self._buffer_lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= INVOCATION_HISTORY_BATCH_SIZE
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="invocation-history", daemon=True)
+                self._flusher.start()
+        if full:
+            self._wake.set()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(INVOCATION_HISTORY_FLUSH_INTERVAL_S)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Could not write the invocation history: {e}")
+
+    def flush(self):
+        """
+        Write buffered invocations to the database in one transaction.
+        """
+        conn = self.conn
+        with self._lock, conn:
+            # Swapped under the database lock, so a query never misses rows that are being written
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            if rows:
+                conn.executemany(
+                    "INSERT INTO invocations (function_name, region, qualifier, source, invoked_at, cold, "
+                    "init_duration_ms, duration_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            now = time.time()
+            if now - self._last_prune > 3600:
+                self._last_prune = now
+                conn.execute("DELETE FROM invocations WHERE invoked_at < ?", (now - INVOCATION_HISTORY_RETENTION_S,))
+
+    def invocations(self, function_name=None, region=None, since=None, until=None, source=SOURCE_CLIENT):
+        """
+        Return recorded invocations in time order, optionally filtered.
+        """
+        conditions, params = ["source = ?"], [source]
+        for clause, value in (("function_name = ?", function_name), ("region = ?", region),
+                              ("invoked_at >= ?", since), ("invoked_at < ?", until)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        self.flush()
+        conn = self.conn
+        with self._lock:
+            rows = conn.execute(
+                "SELECT * FROM invocations WHERE " + " AND ".join(conditions) + " ORDER BY invoked_at", params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def cold_start_stats(self, function_name, region, since=None, until=None, source=SOURCE_CLIENT):
+        """
+        Summarize cold starts of one function over a time range.
+
+        Returns:
+            dict: Invocations, invocations with a log tail, cold starts, the
+                cold-start rate and the mean Init Duration.
+        """
+        conditions, params = ["function_name = ?", "region = ?", "source = ?"], [function_name, region, source]
+        for clause, value in (("invoked_at >= ?", since), ("invoked_at < ?", until)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        self.flush()
+        conn = self.conn
+        with self._lock:
+            row = conn.execute(
+                "SELECT COUNT(*) AS invocations, COUNT(cold) AS observed, COALESCE(SUM(cold), 0) AS cold_starts, "
+                "AVG(init_duration_ms) AS init_duration_ms FROM invocations WHERE " + " AND ".join(conditions),
+                params
+            ).fetchone()
+        return {
+            "invocations": row["invocations"],
+            "cold_starts": row["cold_starts"],
+            "cold_start_rate": round(row["cold_starts"] / row["observed"], 4) if row["observed"] else None,
+            "init_duration_ms": round(row["init_duration_ms"], 2) if row["init_duration_ms"] is not None else None,
+        }
+
+    def functions(self, since=None, source=SOURCE_CLIENT):
+        """
+        Return the (function_name, region) pairs invoked since a time.
+        """
+        self.flush()
+        conn = self.conn
+        with self._lock:
+            rows = conn.execute(
+                "SELECT DISTINCT function_name, region FROM invocations WHERE source = ? AND invoked_at >= ? "
+                "ORDER BY function_name, region",
+                (source, since or 0)
+            ).fetchall()
+        return [(row["function_name"], row["region"]) for row in rows]
+
+invocation_history = InvocationHistory()
@@ -0,0 +1,340 @@
+# lambda_invoker.py
+
+import asyncio
+import base64
+import logging
+import os
+import re
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from services.aws_services import get_aws_client, get_aws_executor, run_blocking
+from services.invocation_history import invocation_history, SOURCE_CLIENT
+from services.latency_store import latency_store
+from utils.payload_codec import (
+    loads, encode_payload, decode_payload, payload_envelope, payload_bucket,
+    ENCODING_S3
+)
+
+logger = logging.getLogger(__name__)
+
+FAILURE_POLICY_CONTINUE = "continue"
+FAILURE_POLICY_ABORT = "abort"
+
+# Fields of the REPORT line Lambda writes at the end of every invocation
+_REPORT_FIELDS = {
+    "Duration": "duration_ms",
+    "Billed Duration": "billed_duration_ms",
+    "Memory Size": "memory_size_mb",
+    "Max Memory Used": "max_memory_used_mb",
+    "Init Duration": "init_duration_ms",
+}
+_REPORT_FIELD = re.compile(r"(Duration|Billed Duration|Memory Size|Max Memory Used|Init Duration): ([\d.]+)")
+
+# Function to parse the REPORT line from an invocation's base64 log tail
+def parse_report(log_result):
+    """
+    Parse the REPORT line of the log tail returned with LogType='Tail'.
+
+    Init Duration is only present when the invocation started a new
+    execution environment, i.e. was a cold start.
+
+    Args:
+        log_result (str): The base64-encoded LogResult of an invoke response.
+
+    Returns:
+        dict: duration_ms, billed_duration_ms, memory_size_mb, max_memory_used_mb
+            and init_duration_ms (None on warm starts), or None without a REPORT line.
+    """
+    if not log_result:
+        return None
+    log_tail = base64.b64decode(log_result).decode("utf-8", errors="replace")
+    report_lines = [line for line in log_tail.splitlines() if line.startswith("REPORT ")]
+    if not report_lines:
+        return None
+    report = dict.fromkeys(_REPORT_FIELDS.values())
+    for name, value in _REPORT_FIELD.findall(report_lines[-1]):
+        report[_REPORT_FIELDS[name]] = float(value)
+    return report
+
+# Function to encode an invocation payload, gzipping or offloading it to S3 when it is large
+def encode_invocation_payload(payload, region_name, max_inline_bytes=None):
+    """
+    Encode a payload for Lambda's inline limit.
+
+    Args:
+        payload (dict): The event payload.
+        region_name (str): The AWS region; offloaded payloads go to its AGILEAGENTS_PAYLOAD_BUCKET.
+        max_inline_bytes (int, optional): The inline limit of the invocation type.
+            Defaults to the synchronous limit.
+
+    Returns:
+        tuple: The body and the envelope info (None for plain JSON); see encode_payload.
+    """
+    bucket = payload_bucket(region_name)
+    s3_client = get_aws_client('s3', region_name=region_name) if bucket else None
+    return encode_payload(payload, max_inline_bytes, bucket, s3_client)
+
+# Function to delete the S3 object of an offloaded payload once it is no longer needed
+def discard_encoded_payload(info, region_name):
+    if info and info["encoding"] == ENCODING_S3:
+        get_aws_client('s3', region_name=region_name).delete_object(Bucket=info["bucket"], Key=info["key"])
+
+# Function to delete an offloaded payload once every call that may read it has returned
+def discard_after_calls(calls, info, region_name):
+    """
+    Delete the S3 object of a payload shared by several calls once none of them can still read it.
+
+    Calls that timed out or lost their client keep running on the executor;
+    the object is deleted from the callback of the last one to return, and
+    calls cancelled before they started are not waited for.
+
+    Args:
+        calls (list): The concurrent.futures.Future of every call handed to the executor.
+        info (dict): The envelope info returned by encode_invocation_payload.
+        region_name (str): The AWS region.
+    """
+    if not info or info["encoding"] != ENCODING_S3:
+        return
+    pending = [call for call in calls if not call.done()]
+    if not pending:
+        discard_encoded_payload(info, region_name)
+        return
+    remaining = [len(pending)]
+    lock = threading.Lock()
+
+    def call_done(call):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            try:
+                discard_encoded_payload(info, region_name)
+            except Exception as e:
+                logger.warning(f"Could not delete offloaded payload s3://{info['bucket']}/{info['key']}: {e}")
+
+    for call in pending:
+        call.add_done_callback(call_done)
+
+# Function to restore a response payload that the agent gzipped or offloaded
+def decode_response_payload(payload, region_name):
+    """
+    Restore a response encoded by the agent-side payload_handler.
+
+    Offloaded responses are read from S3 and their object deleted.
+
+    Returns:
+        tuple: The payload and its encoding (None, "gzip" or "s3").
+    """
+    envelope = payload_envelope(payload)
+    if envelope is None:
+        return payload, None
+    s3_client = get_aws_client('s3', region_name=region_name) if envelope["encoding"] == ENCODING_S3 else None
+    return decode_payload(payload, s3_client, delete=True), envelope["encoding"]
+
+# Function to invoke a Lambda function synchronously and decode its response
+def invoke_lambda_function(function_name, payload, region_name=None, qualifier=None, source=SOURCE_CLIENT,
+                           encoded_payload=None):
+    """
+    Invoke a Lambda function with a JSON payload and decode the JSON response.
+
+    Large payloads are gzipped or offloaded to S3 (see utils.payload_codec),
+    and responses encoded the same way by the agent are restored.
+    The log tail is requested too. The invocation's REPORT line is recorded
+    in the invocation history, and together with the client round-trip
+    time (invoke call plus reading the payload) in the latency store.
+
+    Args:
+        function_name (str): The name of the Lambda function.
+        payload (dict): The event payload.
+        region_name (str, optional): The AWS region. If not provided, uses the default region.
+        qualifier (str, optional): The alias or version to invoke.
+        source (str): Who made the call, recorded in the invocation history.
+        encoded_payload (tuple, optional): The payload already encoded by encode_invocation_payload,
+            e.g. once for a whole fan-out; the caller then discards it.
+
+    Returns:
+        dict: The decoded response payload, the function error, if any, whether
+            the call was a cold start, the parsed REPORT line, the client round-trip
+            time and the request and response payload encodings.
+    """
+    region_name = region_name or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+    lambda_client = get_aws_client('lambda', region_name=region_name)
+    body, info = encoded_payload or encode_invocation_payload(payload, region_name)
+    invoked_at = time.time()
+    start = time.perf_counter()
+    try:
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            LogType='Tail',
+            Payload=body,
+            **({'Qualifier': qualifier} if qualifier else {})
+        )
+        response_payload = response['Payload'].read()
+    except ClientError:
+        # Lambda rejected the call, so the function never reads the payload
+        if encoded_payload is None:
+            discard_encoded_payload(info, region_name)
+        raise
+    # A read timeout or dropped connection leaves the function running and reading the
+    # payload; such objects are left to the bucket's lifecycle rule
+    if encoded_payload is None:
+        discard_encoded_payload(info, region_name)
+    client_rtt_ms = (time.perf_counter() - start) * 1000
+    decoded, response_encoding = decode_response_payload(loads(response_payload), region_name) \
+        if response_payload else (None, None)
+    report = parse_report(response.get('LogResult'))
+    invocation_history.record(function_name, region_name, report, source=source, qualifier=qualifier,
+                              invoked_at=invoked_at)
+    latency_store.record(function_name, region_name, client_rtt_ms, report, source=source,
+                         error=bool(response.get('FunctionError')))
+    return {
+        "payload": decoded,
+        "function_error": response.get('FunctionError'),
+        "cold_start": report["init_duration_ms"] is not None if report else None,
+        "report": report,
+        "client_rtt_ms": round(client_rtt_ms, 2),
+        "payload_encoding": {"request": info["encoding"] if info else None, "response": response_encoding},
+    }
+
+# Function to fan out invocations and yield each result as it completes
+async def iter_invocations(function_names, payload, region_name=None, max_concurrency=10,
+                           timeout_seconds=None, failure_policy=FAILURE_POLICY_CONTINUE, encoded_payload=None):
+    """
+    Invoke many Lambda functions with bounded concurrency.
+
+    Results are yielded in completion order. A failed invocation never aborts
+    the others unless failure_policy is 'abort', in which case invocations
+    that have not started yet are reported as 'skipped'. A timed-out call
+    stops being awaited, but the underlying request may still complete.
+    The payload is encoded once for all calls; an offloaded payload is
+    deleted only once every call that started has returned.
+
+    Args:
+        function_names (list): The function to invoke for each call, in call order.
+        payload (dict): The event payload sent to every function.
+        region_name (str, optional): The AWS region. If not provided, uses the default region.
+        max_concurrency (int): The maximum number of invocations in flight.
+        timeout_seconds (float, optional): The per-invocation timeout.
+        failure_policy (str): 'continue' or 'abort'.
+        encoded_payload (tuple, optional): The payload already encoded by encode_invocation_payload,
+            e.g. so a streaming endpoint can reject an oversized payload before responding;
+            it is discarded here like one encoded by the fan-out.
+
+    Yields:
+        dict: The index, function name, status, latency and response or error of one call.
+    """
+    region_name = region_name or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+    if encoded_payload is None:
+        encoded_payload = await run_blocking(encode_invocation_payload, payload, region_name)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    aborted = asyncio.Event()
+
+    async def invoke_one(index, function_name):
+        async with semaphore:
+            result = {"index": index, "function_name": function_name}
+            if aborted.is_set():
+                result.update(status="skipped", latency_ms=None)
+                return result
+            start = time.perf_counter()
+            try:
+                # Submitted directly so the call can be tracked after a timeout stops awaiting it
+                call = get_aws_executor().submit(invoke_lambda_function, function_name, payload, region_name,
+                                                 encoded_payload=encoded_payload)
+                calls.append(call)
+                response = await asyncio.wait_for(asyncio.wrap_future(call), timeout_seconds)
+                if response["function_error"]:
+                    result.update(status="error", error=response["function_error"], response=response["payload"])
+                else:
+                    result.update(status="success", response=response["payload"])
+                if response.get("cold_start") is not None:
+                    result["cold_start"] = response["cold_start"]
+                if response.get("report"):
+                    result["report"] = response["report"]
+                    result["client_rtt_ms"] = response["client_rtt_ms"]
+            except asyncio.TimeoutError:
+                result.update(status="timeout", error=f"Invocation exceeded {timeout_seconds} seconds")
+            except Exception as e:
+                result.update(status="error", error=str(e))
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            if result["status"] != "success" and failure_policy == FAILURE_POLICY_ABORT:
+                aborted.set()
+            return result
+
+    calls = []
+    tasks = [asyncio.ensure_future(invoke_one(index, name)) for index, name in enumerate(function_names)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Cancelling a task cancels its call only if the call has not started yet
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await run_blocking(discard_after_calls, calls, encoded_payload[1], region_name)
+
+# Function to summarize a set of invocation results
+def summarize_invocations(results, wall_time_ms):
+    """
+    Summarize fan-out results.
+
+    Args:
+        results (list): Results produced by iter_invocations.
+        wall_time_ms (float): The overall wall time of the fan-out.
+
+    Returns:
+        dict: Counts per status, latency statistics and the wall time.
+    """
+    statuses = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    latencies = sorted(r["latency_ms"] for r in results if r.get("latency_ms") is not None)
+    observed = [r["cold_start"] for r in results if r.get("cold_start") is not None]
+    billed = [r["report"]["billed_duration_ms"] for r in results
+              if r.get("report") and r["report"]["billed_duration_ms"] is not None]
+    return {
+        "total": len(results),
+        "succeeded": statuses.get("success", 0),
+        "failed": statuses.get("error", 0) + statuses.get("timeout", 0),
+        "skipped": statuses.get("skipped", 0),
+        "statuses": statuses,
+        "wall_time_ms": round(wall_time_ms, 2),
+        "latency_ms": {
+            "min": latencies[0] if latencies else None,
+            "max": latencies[-1] if latencies else None,
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        },
+        "cold_starts": sum(observed) if observed else None,
+        "billed_duration_ms": sum(billed) if billed else None,
+    }
+
+# Function to fan out invocations and collect all results
+async def invoke_many(function_names, payload, region_name=None, max_concurrency=10,
+                      timeout_seconds=None, failure_policy=FAILURE_POLICY_CONTINUE):
+    """
+    Invoke many Lambda functions with bounded concurrency and collect the results.
+
+    Args:
+        function_names (list): The function to invoke for each call, in call order.
+        payload (dict): The event payload sent to every function.
+        region_name (str, optional): The AWS region. If not provided, uses the default region.
+        max_concurrency (int): The maximum number of invocations in flight.
+        timeout_seconds (float, optional): The per-invocation timeout.
+        failure_policy (str): 'continue' or 'abort'.
+
+    Returns:
+        dict: The per-call results in call order and a summary.
+    """
+    start = time.perf_counter()
+    results = []
+    async for result in iter_invocations(function_names, payload, region_name, max_concurrency,
+                                         timeout_seconds, failure_policy):
+        results.append(result)
+    results.sort(key=lambda r: r["index"])
+    return {
+        "results": results,
+        "summary": summarize_invocations(results, (time.perf_counter() - start) * 1000),
+    }
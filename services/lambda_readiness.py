@@ -0,0 +1,202 @@
+# lambda_readiness.py
+
+import asyncio
+import os
+import time
+import weakref
+
+from botocore.exceptions import ClientError
+
+from services.aws_services import get_aws_client, run_blocking, THROTTLING_ERROR_CODES
+
+# How long to wait for a function to become ready after a create or update
+LAMBDA_READY_TIMEOUT_S = float(os.getenv("LAMBDA_READY_TIMEOUT_S", "300"))
+# First delay between polls of one function; it doubles up to the maximum while the function is pending
+LAMBDA_READY_POLL_INTERVAL_S = float(os.getenv("LAMBDA_READY_POLL_INTERVAL_S", "0.5"))
+LAMBDA_READY_MAX_POLL_INTERVAL_S = float(os.getenv("LAMBDA_READY_MAX_POLL_INTERVAL_S", "5"))
+# get_function_configuration calls in flight at once across every tracked function
+LAMBDA_READY_MAX_CONCURRENCY = int(os.getenv("LAMBDA_READY_MAX_CONCURRENCY", "10"))
+
+# Locks serializing updates per function and region, per event loop
+_function_locks = weakref.WeakKeyDictionary()
+
+class FunctionNotReady(Exception):
+    """Raised when a function's creation or last update failed."""
+
+# Function to get the lock serializing updates of one function in one region
+def function_lock(function_name, region):
+    """
+    Deploys and power tuning hold this lock while they change a function, so
+    their create_function, update and publish calls never interleave.
+    """
+    locks = _function_locks.setdefault(asyncio.get_running_loop(), {})
+    return locks.setdefault((function_name, region), asyncio.Lock())
+
+# Function to read the error code of a botocore error, or the exception class name of a modeled one
+def _error_code(error):
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code")
+    return type(error).__name__
+
+class ReadinessTracker:
+    """
+    Waits until Lambda functions are Active with a successful last update.
+
+    Every function waited on joins one polling loop per event loop instead
+    of getting its own blocking waiter. Each round polls the functions that
+    are due with get_function_configuration, at most max_concurrency calls at
+    a time; a function that is still pending is polled again after a delay
+    that doubles up to max_interval. Throttling pushes back every function
+    in the round. Concurrent waits on the same function share one entry.
+    """
+
+    def __init__(self, interval=None, max_interval=None, timeout=None, max_concurrency=None):
+        self.interval = interval or LAMBDA_READY_POLL_INTERVAL_S
+        self.max_interval = max_interval or LAMBDA_READY_MAX_POLL_INTERVAL_S
+        self.timeout = timeout or LAMBDA_READY_TIMEOUT_S
+        self.max_concurrency = max_concurrency or LAMBDA_READY_MAX_CONCURRENCY
+        self._loop = None
+        self._pending = {}
+        self._wakeup = None
+        self._poller = None
+        self.polls = 0
+        self.rounds = 0
+        self.throttled = 0
+
+    async def wait(self, function_name, region, timeout=None):
+        """
+        Wait until a function is ready to be invoked or updated again.
+
+        Args:
+            function_name (str): The name of the Lambda function.
+            region (str): The AWS region.
+            timeout (float, optional): Seconds to wait. Defaults to LAMBDA_READY_TIMEOUT_S.
+
+        Returns:
+            dict: The function name, region, State, LastUpdateStatus, the seconds
+                it took to become ready and the number of polls.
+
+        Raises:
+            FunctionNotReady: If the function or its last update failed.
+            TimeoutError: If the function is still pending after the timeout.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._pending, self._poller = loop, {}, None
+            self._wakeup = asyncio.Event()
+        start = time.monotonic()
+        key = (function_name, region)
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = {
+                "future": loop.create_future(),
+                "deadline": start + (self.timeout if timeout is None else timeout),
+                "next_poll": start,
+                "delay": self.interval,
+                "polls": 0,
+            }
+        if self._poller is None or self._poller.done():
+            self._poller = loop.create_task(self._poll_loop())
+        else:
+            self._wakeup.set()
+        result = dict(await asyncio.shield(entry["future"]))
+        result["time_to_ready_s"] = round(result.pop("ready_at") - start, 3)
+        return result
+
+    async def wait_many(self, functions, timeout=None):
+        """
+        Wait for many (function_name, region) pairs together.
+
+        Returns:
+            list: One result per function, in order; functions that failed or
+                timed out have a status of "error" and the error message.
+        """
+        async def wait_one(function_name, region):
+            try:
+                return {**await self.wait(function_name, region, timeout), "status": "ready"}
+            except Exception as e:
+                return {"function_name": function_name, "region": region, "status": "error", "error": str(e)}
+
+        return await asyncio.gather(*(wait_one(function_name, region) for function_name, region in functions))
+
+    async def _poll_loop(self):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        while self._pending:
+            now = time.monotonic()
+            due = [key for key, entry in self._pending.items() if entry["next_poll"] <= now]
+            if due:
+                self.rounds += 1
+                await asyncio.gather(*(self._poll(key, semaphore) for key in due))
+                continue
+            self._wakeup.clear()
+            next_poll = min(entry["next_poll"] for entry in self._pending.values())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, next_poll - now))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, key, semaphore):
+        function_name, region = key
+        entry = self._pending[key]
+        lambda_client = get_aws_client('lambda', region_name=region)
+        configuration = None
+        try:
+            async with semaphore:
+                configuration = await run_blocking(lambda_client.get_function_configuration, FunctionName=function_name)
+        except Exception as e:
+            code = _error_code(e)
+            if code in THROTTLING_ERROR_CODES:
+                self.throttled += 1
+                self._back_off_all()
+            elif code != "ResourceNotFoundException":
+                # A function that was just created may not be visible yet; anything else is final
+                return self._resolve(key, error=e)
+        entry["polls"] += 1
+        self.polls += 1
+        now = time.monotonic()
+
+        if configuration is not None:
+            state = configuration.get("State")
+            last_update = configuration.get("LastUpdateStatus")
+            if state == "Failed" or last_update == "Failed":
+                reason = configuration.get("StateReason") or configuration.get("LastUpdateStatusReason")
+                return self._resolve(key, error=FunctionNotReady(
+                    f"{function_name} in {region} is not ready: State={state}, LastUpdateStatus={last_update}"
+                    + (f" ({reason})" if reason else "")
+                ))
+            if state in (None, "Active") and last_update in (None, "Successful"):
+                return self._resolve(key, result={
+                    "function_name": function_name,
+                    "region": region,
+                    "state": state,
+                    "last_update_status": last_update,
+                    "polls": entry["polls"],
+                    "ready_at": now,
+                })
+        if now >= entry["deadline"]:
+            return self._resolve(key, error=TimeoutError(f"{function_name} in {region} did not become ready in time"))
+        entry["next_poll"] = now + entry["delay"]
+        entry["delay"] = min(self.max_interval, entry["delay"] * 2)
+
+    def _back_off_all(self):
+        for entry in self._pending.values():
+            entry["delay"] = self.max_interval
+            entry["next_poll"] = max(entry["next_poll"], time.monotonic() + self.max_interval)
+
+    def _resolve(self, key, result=None, error=None):
+        entry = self._pending.pop(key)
+        if not entry["future"].done():
+            if error is not None:
+                entry["future"].set_exception(error)
+            else:
+                entry["future"].set_result(result)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "polls": self.polls,
+            "rounds": self.rounds,
+            "throttled": self.throttled,
+        }
+
+readiness = ReadinessTracker()
@@ -0,0 +1,164 @@
+# latency_store.py
+
+import collections
+import math
+import os
+import threading
+import time
+
+# Samples kept per function and region; older ones are overwritten
+LATENCY_RING_SIZE = int(os.getenv("LATENCY_RING_SIZE", "1000"))
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000, 900000)
+
+_METRICS = ("client_rtt_ms", "duration_ms", "billed_duration_ms", "init_duration_ms")
+
+def _percentile(values, fraction):
+    # Nearest-rank percentile, so small samples report a latency that actually occurred
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+# Function to count values into the latency histogram buckets
+def histogram(values):
+    """
+    Count values into LATENCY_BUCKETS_MS.
+
+    Returns:
+        dict: Bucket upper bounds ("+Inf" last) mapped to the number of values
+            above the previous bound and at or below this one.
+    """
+    counts = dict.fromkeys([str(bound) for bound in LATENCY_BUCKETS_MS] + ["+Inf"], 0)
+    for value in values:
+        for bound in LATENCY_BUCKETS_MS:
+            if value <= bound:
+                counts[str(bound)] += 1
+                break
+        else:
+            counts["+Inf"] += 1
+    return counts
+
+class LatencyStore:
+    """
+    In-memory ring of recent invocation samples per function and region.
+
+    Each sample pairs the client-side round-trip time with the REPORT line
+    of the invocation (Duration, Billed Duration, Max Memory Used and, on
+    cold starts, Init Duration). Memory stays bounded at LATENCY_RING_SIZE
+    samples per function; cold-start and invocation counters are kept for
+    the lifetime of the process.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or LATENCY_RING_SIZE
+        self._samples = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, function_name, region, client_rtt_ms, report=None, source=None, error=False):
+        """
+        Record one invocation.
+
+        Args:
+            function_name (str): The name of the Lambda function.
+            region (str): The AWS region.
+            client_rtt_ms (float): The round-trip time measured by the caller.
+            report (dict, optional): The parsed REPORT line.
+            source (str, optional): Who made the call, e.g. the warm pool's pings.
+            error (bool): Whether the invocation returned a function error.
+        """
+        report = report or {}
+        sample = {
+            "at": time.time(),
+            "source": source,
+            "client_rtt_ms": round(client_rtt_ms, 2),
+            "duration_ms": report.get("duration_ms"),
+            "billed_duration_ms": report.get("billed_duration_ms"),
+            "init_duration_ms": report.get("init_duration_ms"),
+            "max_memory_used_mb": report.get("max_memory_used_mb"),
+            "memory_size_mb": report.get("memory_size_mb"),
+            "cold": report.get("init_duration_ms") is not None if report else None,
+            "error": error,
+        }
+        key = (function_name, region)
+        with self._lock:
+            ring = self._samples.get(key)
+            if ring is None:
+                ring = self._samples[key] = collections.deque(maxlen=self.size)
+                self._counters[key] = {"invocations": 0, "cold_starts": 0, "errors": 0}
+            ring.append(sample)
+            counters = self._counters[key]
+            counters["invocations"] += 1
+            counters["cold_starts"] += int(bool(sample["cold"]))
+            counters["errors"] += int(error)
+
+    def samples(self, function_name, region=None, since=None, source=None):
+        with self._lock:
+            rings = [list(ring) for (name, ring_region), ring in self._samples.items()
+                     if name == function_name and region in (None, ring_region)]
+        return [
+            sample for ring in rings for sample in ring
+            if (since is None or sample["at"] >= since) and (source is None or sample["source"] == source)
+        ]
+
+    def summary(self, function_name, region=None, since=None, source=None):
+        """
+        Summarize the samples of a function.
+
+        Args:
+            function_name (str): The name of the Lambda function.
+            region (str, optional): Only samples from this region.
+            since (float, optional): Only samples recorded since this time.
+            source (str, optional): Only samples from this source.
+
+        Returns:
+            dict: Sample and cold-start counts, the lifetime counters, and per
+                metric the p50/p90/p99/max and a histogram; cold and warm
+                client round trips are also summarized separately.
+        """
+        samples = self.samples(function_name, region, since, source)
+        with self._lock:
+            counters = [dict(counter) for (name, ring_region), counter in self._counters.items()
+                        if name == function_name and region in (None, ring_region)]
+        summary = {
+            "function_name": function_name,
+            "region": region,
+            "samples": len(samples),
+            "cold_starts": sum(1 for sample in samples if sample["cold"]),
+            "errors": sum(1 for sample in samples if sample["error"]),
+            "lifetime": {
+                key: sum(counter[key] for counter in counters) for key in ("invocations", "cold_starts", "errors")
+            },
+            "max_memory_used_mb": max(
+                (sample["max_memory_used_mb"] for sample in samples if sample["max_memory_used_mb"] is not None),
+                default=None
+            ),
+        }
+        observed = [sample for sample in samples if sample["cold"] is not None]
+        summary["cold_start_rate"] = round(summary["cold_starts"] / len(observed), 4) if observed else None
+        for metric in _METRICS:
+            summary[metric] = self._describe([sample[metric] for sample in samples])
+        for label, cold in (("cold", True), ("warm", False)):
+            summary[f"client_rtt_ms_{label}"] = self._describe(
+                [sample["client_rtt_ms"] for sample in samples if sample["cold"] is cold]
+            )
+        return summary
+
+    @staticmethod
+    def _describe(values):
+        values = [value for value in values if value is not None]
+        if not values:
+            return None
+        return {
+            "count": len(values),
+            "p50": _percentile(values, 0.5),
+            "p90": _percentile(values, 0.9),
+            "p99": _percentile(values, 0.99),
+            "max": max(values),
+            "histogram": histogram(values),
+        }
+
+    def functions(self):
+        with self._lock:
+            return sorted(self._samples)
+
+latency_store = LatencyStore()
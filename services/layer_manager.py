@@ -0,0 +1,265 @@
+# layer_manager.py
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from services.aws_services import get_aws_client
+from utils.state_utils import get_state_path
+
+LAMBDA_LAYER_DB = os.getenv("LAMBDA_LAYER_DB")
+# Distinct functions deploying the same requirements set before it is published as a shared layer
+LAMBDA_LAYER_SHARE_THRESHOLD = int(os.getenv("LAMBDA_LAYER_SHARE_THRESHOLD", "2"))
+LAMBDA_LAYER_PREFIX = os.getenv("LAMBDA_LAYER_PREFIX", "agileagents-deps")
+
+# Function to name the layer of a requirements set
+def layer_name(req_hash, python_version):
+    # Layer names allow letters, digits, hyphens and underscores
+    return f"{LAMBDA_LAYER_PREFIX}-py{python_version.replace('.', '')}-{req_hash[:16]}"
+
+class LayerManager:
+    """
+    Publishes shared dependency sets once as Lambda layers and tracks their reuse.
+
+    Every zip deploy records its requirements hash and function. Once
+    LAMBDA_LAYER_SHARE_THRESHOLD different functions have deployed the same
+    set it is published as a layer (per region and Python version), and
+    later deploys attach that layer instead of bundling the dependencies;
+    redeploys of one function never make a set shared. Layers deleted outside
+    this service are evicted on lookup, like build cache entries.
+    """
+
+    def __init__(self, path=None, share_threshold=None):
+        self._path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._publish_locks = {}
+        self.share_threshold = share_threshold or LAMBDA_LAYER_SHARE_THRESHOLD
+        self.hits = 0
+        self.published = 0
+        self.evictions = 0
+
+    @property
+    def conn(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(
+                    self._path or LAMBDA_LAYER_DB or get_state_path("lambda_layers.sqlite3"),
+                    check_same_thread=False
+                )
+                self._conn.row_factory = sqlite3.Row
+                with self._conn:
+                    self._conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS dependency_set_functions (
+                            requirements_hash TEXT NOT NULL,
+                            python_version TEXT NOT NULL,
+                            function_name TEXT NOT NULL,
+                            deploy_count INTEGER DEFAULT 0,
+                            first_seen_at REAL,
+                            last_seen_at REAL,
+                            PRIMARY KEY (requirements_hash, python_version, function_name)
+                        )
+                        """
+                    )
+                    self._conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS lambda_layers (
+                            requirements_hash TEXT NOT NULL,
+                            python_version TEXT NOT NULL,
+                            region TEXT NOT NULL,
+                            layer_name TEXT NOT NULL,
+                            layer_version_arn TEXT NOT NULL,
+                            size INTEGER,
+                            created_at REAL,
+                            last_used_at REAL,
+                            use_count INTEGER DEFAULT 0,
+                            PRIMARY KEY (requirements_hash, python_version, region)
+                        )
+                        """
+                    )
+            return self._conn
+
+    def publish_lock(self, req_hash, python_version, region):
+        """
+        Return the asyncio lock that makes concurrent deploys publish a layer only once.
+        """
+        with self._lock:
+            return self._publish_locks.setdefault((req_hash, python_version, region), asyncio.Lock())
+
+    def record_deploy(self, req_hash, python_version, function_name):
+        """
+        Count a deploy of a requirements set by a function.
+
+        Returns:
+            int: How many different functions have deployed the set so far.
+        """
+        now = time.time()
+        conn = self.conn
+        with self._lock, conn:
+            conn.execute(
+                "INSERT INTO dependency_set_functions "
+                "(requirements_hash, python_version, function_name, deploy_count, first_seen_at, last_seen_at) "
+                "VALUES (?, ?, ?, 1, ?, ?) ON CONFLICT (requirements_hash, python_version, function_name) "
+                "DO UPDATE SET deploy_count = deploy_count + 1, last_seen_at = excluded.last_seen_at",
+                (req_hash, python_version, function_name, now, now)
+            )
+            return conn.execute(
+                "SELECT COUNT(DISTINCT function_name) AS functions FROM dependency_set_functions "
+                "WHERE requirements_hash = ? AND python_version = ?",
+                (req_hash, python_version)
+            ).fetchone()["functions"]
+
+    def is_shared(self, function_count):
+        return function_count >= self.share_threshold
+
+    def _layer_exists(self, layer_version_arn, region):
+        lambda_client = get_aws_client('lambda', region_name=region)
+        try:
+            lambda_client.get_layer_version_by_arn(Arn=layer_version_arn)
+        except lambda_client.exceptions.ResourceNotFoundException:
+            return False
+        return True
+
+    def lookup(self, req_hash, python_version, region, verify=True):
+        """
+        Return the published layer of a requirements set in a region, or None.
+
+        Args:
+            req_hash (str): The requirements hash.
+            python_version (str): The Python version the wheels were built for.
+            region (str): The AWS region.
+            verify (bool): Confirm with Lambda that the layer version still exists.
+
+        Returns:
+            dict: The layer entry, or None.
+        """
+        conn = self.conn
+        with self._lock:
+            row = conn.execute(
+                "SELECT * FROM lambda_layers WHERE requirements_hash = ? AND python_version = ? AND region = ?",
+                (req_hash, python_version, region)
+            ).fetchone()
+        if row is not None and verify and not self._layer_exists(row["layer_version_arn"], region):
+            self.purge(requirements_hash=req_hash, python_version=python_version, region=region)
+            self.evictions += 1
+            row = None
+        if row is None:
+            return None
+        with self._lock, conn:
+            self.hits += 1
+            conn.execute(
+                "UPDATE lambda_layers SET use_count = use_count + 1, last_used_at = ? "
+                "WHERE requirements_hash = ? AND python_version = ? AND region = ?",
+                (time.time(), req_hash, python_version, region)
+            )
+        return dict(row)
+
+    def publish(self, req_hash, python_version, region, content, size, runtime):
+        """
+        Publish a dependency layer and record it.
+
+        Args:
+            req_hash (str): The requirements hash.
+            python_version (str): The Python version the wheels were built for.
+            region (str): The AWS region.
+            content (dict): The layer Content: ZipFile, or S3Bucket and S3Key.
+            size (int): The layer zip size in bytes.
+            runtime (str): The compatible runtime, e.g. python3.11.
+
+        Returns:
+            dict: The layer entry.
+        """
+        name = layer_name(req_hash, python_version)
+        lambda_client = get_aws_client('lambda', region_name=region)
+        response = lambda_client.publish_layer_version(
+            LayerName=name,
+            Description=f"Shared dependencies, requirements {req_hash[:12]}",
+            Content=content,
+            CompatibleRuntimes=[runtime]
+        )
+        now = time.time()
+        entry = {
+            "requirements_hash": req_hash,
+            "python_version": python_version,
+            "region": region,
+            "layer_name": name,
+            "layer_version_arn": response["LayerVersionArn"],
+            "size": size,
+            "created_at": now,
+            "last_used_at": now,
+            "use_count": 1,
+        }
+        conn = self.conn
+        with self._lock, conn:
+            self.published += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO lambda_layers "
+                "(requirements_hash, python_version, region, layer_name, layer_version_arn, size, created_at, last_used_at, use_count) "
+                "VALUES (:requirements_hash, :python_version, :region, :layer_name, :layer_version_arn, :size, "
+                ":created_at, :last_used_at, :use_count)",
+                entry
+            )
+        return entry
+
+    def inventory(self, region=None):
+        query, params = "SELECT * FROM lambda_layers", []
+        if region:
+            query, params = query + " WHERE region = ?", [region]
+        conn = self.conn
+        with self._lock:
+            rows = conn.execute(query + " ORDER BY use_count DESC, created_at", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def purge(self, requirements_hash=None, region=None, python_version=None):
+        """
+        Forget layer entries, optionally filtered by requirements hash, region and Python version.
+        The layer versions themselves are left in Lambda.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        conditions, params = [], []
+        for column, value in (("requirements_hash", requirements_hash), ("region", region),
+                              ("python_version", python_version)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        query = "DELETE FROM lambda_layers"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        conn = self.conn
+        with self._lock, conn:
+            return conn.execute(query, params).rowcount
+
+    def stats(self):
+        conn = self.conn
+        with self._lock:
+            layers = conn.execute(
+                "SELECT COUNT(*) AS layers, COALESCE(SUM(use_count), 0) AS attachments, "
+                "COALESCE(SUM(size * MAX(use_count - 1, 0)), 0) AS bytes_upload_avoided FROM lambda_layers"
+            ).fetchone()
+            sets = conn.execute(
+                "SELECT COUNT(*) AS dependency_sets, COALESCE(SUM(deploys), 0) AS deploys, "
+                "COALESCE(SUM(functions >= ?), 0) AS shared_sets FROM ("
+                "SELECT SUM(deploy_count) AS deploys, COUNT(DISTINCT function_name) AS functions "
+                "FROM dependency_set_functions GROUP BY requirements_hash, python_version)",
+                (self.share_threshold,)
+            ).fetchone()
+        return {
+            "layers": layers["layers"],
+            "attachments": layers["attachments"],
+            "reuses": layers["attachments"] - layers["layers"],
+            "bytes_upload_avoided": layers["bytes_upload_avoided"],
+            "dependency_sets": sets["dependency_sets"],
+            "shared_sets": sets["shared_sets"],
+            "deploys": sets["deploys"],
+            "share_threshold": self.share_threshold,
+            "hits": self.hits,
+            "published": self.published,
+            "evictions": self.evictions,
+        }
+
+layer_manager = LayerManager()
@@ -0,0 +1,472 @@
+# power_tuner.py
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from services.aws_services import get_aws_client, run_blocking
+from services.deploy_jobs import deploy_jobs, QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED, INTERRUPTED
+from services.lambda_invoker import invoke_lambda_function
+from services.lambda_readiness import readiness, function_lock
+from utils.state_utils import get_state_path
+
+logger = logging.getLogger(__name__)
+
+POWER_TUNING_DB = os.getenv("POWER_TUNING_DB")
+POWER_TUNING_MEMORY_SIZES = [
+    int(size) for size in os.getenv("POWER_TUNING_MEMORY_SIZES", "128,256,512,1024,1536,2048,3008").split(",")
+]
+POWER_TUNING_ALIAS_PREFIX = os.getenv("POWER_TUNING_ALIAS_PREFIX", "power-tuning-")
+# Sweeps run at once; they have their own workers so they never hold up deploys
+POWER_TUNING_WORKERS = int(os.getenv("POWER_TUNING_WORKERS", "2"))
+# On-demand Lambda prices in USD (us-east-1); override for other regions or negotiated rates
+LAMBDA_PRICE_PER_GB_S = {
+    "x86_64": float(os.getenv("LAMBDA_PRICE_PER_GB_S_X86", "0.0000166667")),
+    "arm64": float(os.getenv("LAMBDA_PRICE_PER_GB_S_ARM", "0.0000133334")),
+}
+LAMBDA_PRICE_PER_REQUEST = float(os.getenv("LAMBDA_PRICE_PER_REQUEST", "0.0000002"))
+
+# Source recorded in the invocation history for tuning invocations, so they do not skew client statistics
+SOURCE_POWER_TUNING = "power_tuning"
+
+class PowerTuningInProgress(Exception):
+    """Raised when a function is already being tuned."""
+
+class FunctionDeployInProgress(Exception):
+    """Raised when a function cannot be tuned because it is being deployed."""
+
+_JSON_COLUMNS = ("request", "stages", "results")
+
+class PowerTuningStore:
+    """
+    Keeps power-tuning runs, from queued to their results, keyed by run ID.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(
+                    self._path or POWER_TUNING_DB or get_state_path("power_tuning.sqlite3"),
+                    check_same_thread=False
+                )
+                self._conn.row_factory = sqlite3.Row
+                with self._conn:
+                    self._conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS tuning_runs (
+                            run_id TEXT PRIMARY KEY,
+                            function_name TEXT NOT NULL,
+                            region TEXT NOT NULL,
+                            strategy TEXT,
+                            original_memory INTEGER,
+                            recommended_memory INTEGER,
+                            applied INTEGER,
+                            results TEXT,
+                            created_at REAL
+                        )
+                        """
+                    )
+                    # Databases created before runs were tracked while in progress
+                    columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(tuning_runs)")}
+                    for column, column_type in (("status", f"TEXT DEFAULT '{SUCCEEDED}'"), ("stage", "TEXT"),
+                                                ("stages", "TEXT"), ("request", "TEXT"), ("error", "TEXT"),
+                                                ("finished_at", "REAL")):
+                        if column not in columns:
+                            self._conn.execute(f"ALTER TABLE tuning_runs ADD COLUMN {column} {column_type}")
+            return self._conn
+
+    def create(self, request):
+        run_id = uuid.uuid4().hex
+        conn = self.conn
+        with self._lock, conn:
+            conn.execute(
+                "INSERT INTO tuning_runs (run_id, function_name, region, strategy, status, stages, request, created_at) "
+                "VALUES (?, ?, ?, ?, ?, '[]', ?, ?)",
+                (run_id, request["function_name"], request["region"], request.get("strategy", "balanced"),
+                 QUEUED, json.dumps(request, default=str), time.time())
+            )
+        return run_id
+
+    def update(self, run_id, **fields):
+        for column in _JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column], default=str)
+        if "applied" in fields:
+            fields["applied"] = int(fields["applied"])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        conn = self.conn
+        with self._lock, conn:
+            conn.execute(f"UPDATE tuning_runs SET {assignments} WHERE run_id = ?", (*fields.values(), run_id))
+
+    def save(self, run):
+        self.update(run["run_id"], status=SUCCEEDED, stage=None, original_memory=run["original_memory"],
+                    recommended_memory=run["recommended_memory"], applied=run["applied"],
+                    results=run["results"], finished_at=time.time())
+
+    def _row_to_run(self, row):
+        run = dict(row)
+        for column in _JSON_COLUMNS:
+            run[column] = json.loads(run[column]) if run[column] else None
+        run["applied"] = bool(run["applied"]) if run["applied"] is not None else None
+        if run["results"] is None:
+            run["cost_change"] = run["duration_change"] = None
+            return run
+        return compare_to_baseline(run)
+
+    def get(self, run_id):
+        conn = self.conn
+        with self._lock:
+            row = conn.execute("SELECT * FROM tuning_runs WHERE run_id = ?", (run_id,)).fetchone()
+        return self._row_to_run(row) if row else None
+
+    def list(self, function_name=None, status=None, limit=50):
+        query = "SELECT * FROM tuning_runs"
+        conditions, params = [], []
+        if function_name:
+            conditions.append("function_name = ?")
+            params.append(function_name)
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        conn = self.conn
+        with self._lock:
+            rows = conn.execute(query + " ORDER BY created_at DESC LIMIT ?", params + [limit]).fetchall()
+        return [self._row_to_run(row) for row in rows]
+
+class PowerTuningRun:
+    """
+    Handle passed to a running sweep to record its stages and log.
+    """
+
+    def __init__(self, run_id, store):
+        self.run_id = run_id
+        self.store = store
+        self.stages = []
+
+    def log(self, message):
+        logger.info(f"Power tuning {self.run_id}: {message}")
+
+    @contextlib.asynccontextmanager
+    async def stage(self, name):
+        """
+        Record the timing and outcome of one step of the sweep.
+        """
+        record = {"name": name, "status": RUNNING, "started_at": time.time(), "duration_s": None}
+        self.stages.append(record)
+        self.store.update(self.run_id, stage=name, stages=self.stages)
+        start = time.perf_counter()
+        try:
+            yield record
+            record["status"] = SUCCEEDED
+        except asyncio.CancelledError:
+            record["status"] = CANCELLED
+            raise
+        except Exception as e:
+            record["status"] = FAILED
+            record["error"] = str(e)
+            raise
+        finally:
+            record["duration_s"] = round(time.perf_counter() - start, 3)
+            self.store.update(self.run_id, stages=self.stages)
+
+power_tuning_store = PowerTuningStore()
+
+# Function to compute the cost of one invocation
+def invocation_cost(billed_duration_ms, memory_mb, architecture="x86_64"):
+    price = LAMBDA_PRICE_PER_GB_S.get(architecture, LAMBDA_PRICE_PER_GB_S["x86_64"])
+    return billed_duration_ms / 1000 * memory_mb / 1024 * price + LAMBDA_PRICE_PER_REQUEST
+
+# Function to pick the memory size that best fits the tuning strategy
+def choose_memory(results, strategy="balanced", balanced_weight=0.5):
+    """
+    Pick the optimal memory size from the measured results.
+
+    Args:
+        results (list): One entry per memory size with cost_usd and duration_ms.
+        strategy (str): "cost" for the cheapest, "speed" for the fastest, or
+            "balanced" to minimize balanced_weight * cost + (1 - balanced_weight) * duration,
+            each normalized by its maximum.
+        balanced_weight (float): The weight of cost in the balanced strategy.
+
+    Returns:
+        int: The memory size, or None when no size produced measurements.
+    """
+    measured = [r for r in results if r["cost_usd"] is not None and r["duration_ms"] is not None]
+    if not measured:
+        return None
+    if strategy == "cost":
+        key = lambda r: (r["cost_usd"], r["duration_ms"])
+    elif strategy == "speed":
+        key = lambda r: (r["duration_ms"], r["cost_usd"])
+    else:
+        max_cost = max(r["cost_usd"] for r in measured) or 1
+        max_duration = max(r["duration_ms"] for r in measured) or 1
+        key = lambda r: (balanced_weight * r["cost_usd"] / max_cost
+                         + (1 - balanced_weight) * r["duration_ms"] / max_duration)
+    return min(measured, key=key)["memory_size"]
+
+# Function to add the recommended size's cost and duration change against the original memory size
+def compare_to_baseline(run):
+    results = {r["memory_size"]: r for r in run["results"]}
+    baseline, best = results.get(run["original_memory"]), results.get(run["recommended_memory"])
+    run["cost_change"] = run["duration_change"] = None
+    if baseline and best and baseline["cost_usd"] and baseline["duration_ms"] and best["cost_usd"] is not None:
+        run["cost_change"] = round(best["cost_usd"] / baseline["cost_usd"] - 1, 4)
+        run["duration_change"] = round(best["duration_ms"] / baseline["duration_ms"] - 1, 4)
+    return run
+
+def _list_versions(lambda_client, function_name):
+    versions, kwargs = [], {}
+    while True:
+        page = lambda_client.list_versions_by_function(FunctionName=function_name, **kwargs)
+        versions.extend(v['Version'] for v in page.get('Versions', []))
+        if not page.get('NextMarker'):
+            return versions
+        kwargs['Marker'] = page['NextMarker']
+
+def _put_alias(lambda_client, function_name, alias, version):
+    try:
+        lambda_client.update_alias(FunctionName=function_name, Name=alias, FunctionVersion=version)
+    except lambda_client.exceptions.ResourceNotFoundException:
+        lambda_client.create_alias(FunctionName=function_name, Name=alias, FunctionVersion=version)
+
+def _measure(function_name, region, alias, payload, invocations, memory_size, architecture):
+    # Invocations of one alias run one after another so they reuse the same warm environment
+    samples, errors, cold_starts = [], [], 0
+    try:
+        invoke_lambda_function(function_name, payload, region, alias, SOURCE_POWER_TUNING)
+    except Exception as e:
+        errors.append(str(e))
+    for _ in range(invocations):
+        try:
+            response = invoke_lambda_function(function_name, payload, region, alias, SOURCE_POWER_TUNING)
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        if response["function_error"]:
+            errors.append(response["function_error"])
+        elif response["cold_start"]:
+            cold_starts += 1
+        elif response["report"]:
+            samples.append(response)
+    durations = [r["report"]["duration_ms"] for r in samples]
+    billed = [r["report"]["billed_duration_ms"] for r in samples]
+    mean_billed = sum(billed) / len(billed) if billed else None
+    return {
+        "memory_size": memory_size,
+        "invocations": invocations,
+        "measured": len(samples),
+        "cold_starts_discarded": cold_starts,
+        "errors": len(errors),
+        "error": errors[0] if errors else None,
+        "duration_ms": round(sum(durations) / len(durations), 2) if durations else None,
+        "billed_duration_ms": round(mean_billed, 2) if mean_billed is not None else None,
+        "client_rtt_ms": round(sum(r["client_rtt_ms"] for r in samples) / len(samples), 2) if samples else None,
+        "max_memory_used_mb": max((r["report"]["max_memory_used_mb"] or 0 for r in samples), default=None),
+        "cost_usd": invocation_cost(mean_billed, memory_size, architecture) if mean_billed is not None else None,
+    }
+
+class PowerTuner:
+    """
+    Runs power-tuning sweeps in the background, one per function at a time.
+
+    Sweeps run as asyncio tasks on their own POWER_TUNING_WORKERS slots,
+    apart from the deploy job manager, so they neither hold up deploys nor
+    show up in the deploy jobs and metrics. Their progress and results are
+    kept in the power-tuning store.
+    """
+
+    def __init__(self, max_workers=POWER_TUNING_WORKERS):
+        self.max_workers = max_workers
+        self._semaphore = None
+        self._tasks = {}
+        self._running = {}
+        self._recovered = False
+
+    def _ensure_started(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        if not self._recovered:
+            self.recover()
+
+    def recover(self):
+        """
+        Mark runs a previous worker left queued or running as interrupted.
+
+        Sweeps cut short by a worker restart cannot be resumed. Called at
+        application startup, so stored runs never report a dead sweep as
+        still in progress.
+        """
+        self._recovered = True
+        for status in (QUEUED, RUNNING):
+            for run in power_tuning_store.list(status=status, limit=1000):
+                if run["run_id"] not in self._tasks:
+                    power_tuning_store.update(run["run_id"], status=INTERRUPTED, finished_at=time.time(),
+                                              error="Worker restarted while the run was in progress")
+
+    def is_tuning(self, function_name, region):
+        return (function_name, region) in self._running
+
+    def submit(self, request):
+        """
+        Queue a sweep and return its run ID immediately.
+
+        Args:
+            request (dict): function_name, region, payload, memory_sizes, invocations,
+                strategy, balanced_weight and apply.
+
+        Returns:
+            str: The run ID.
+
+        Raises:
+            PowerTuningInProgress: If the function is already being tuned.
+            FunctionDeployInProgress: If a deploy of the function is queued or running.
+        """
+        key = (request["function_name"], request["region"])
+        if key in self._running:
+            raise PowerTuningInProgress(f"{key[0]} in {key[1]} is already being tuned")
+        # Measurements taken while a deploy replaces the code would describe neither version
+        if function_lock(*key).locked() or deploy_jobs.in_flight(key[0]):
+            raise FunctionDeployInProgress(f"{key[0]} is being deployed; tune it once the deploy has finished")
+        self._ensure_started()
+        run_id = power_tuning_store.create(request)
+        self._running[key] = run_id
+        self._tasks[run_id] = asyncio.get_running_loop().create_task(self._run(run_id, key, request))
+        return run_id
+
+    async def _run(self, run_id, key, request):
+        store = power_tuning_store
+        try:
+            async with self._semaphore:
+                store.update(run_id, status=RUNNING)
+                run = await run_power_tuning(PowerTuningRun(run_id, store), request)
+            store.save(run)
+        except asyncio.CancelledError:
+            store.update(run_id, status=CANCELLED, finished_at=time.time(), error="Cancelled")
+        except Exception as e:
+            logger.error(f"Power tuning {run_id} failed: {e}")
+            store.update(run_id, status=FAILED, finished_at=time.time(), error=str(e))
+        finally:
+            self._tasks.pop(run_id, None)
+            self._running.pop(key, None)
+
+    async def wait(self, run_id):
+        """
+        Wait for a sweep to finish and return its stored run.
+        """
+        task = self._tasks.get(run_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return await run_blocking(power_tuning_store.get, run_id)
+
+# Function to run a power-tuning sweep
+async def run_power_tuning(run, request):
+    """
+    Measure a function at several memory sizes and recommend or apply the best one.
+
+    Each memory size is configured on $LATEST in turn and published as a
+    version behind its own alias. The aliases are then invoked concurrently
+    with the sample payload; a warm-up call per alias and any further cold
+    starts are left out of the measurements. Finally the original memory
+    size is restored, or the recommended one applied, and the tuning
+    aliases and the versions the sweep created are deleted. The function's lock is held
+    throughout, so deploys of it wait until the sweep has cleaned up.
+
+    Args:
+        run (PowerTuningRun): The handle recording stages and logs.
+        request (dict): function_name, region, payload, memory_sizes, invocations,
+            strategy, balanced_weight and apply.
+
+    Returns:
+        dict: The tuning run.
+    """
+    function_name, region = request["function_name"], request["region"]
+    lambda_client = get_aws_client('lambda', region_name=region)
+    memory_sizes = sorted(set(request.get("memory_sizes") or POWER_TUNING_MEMORY_SIZES))
+    # Deploys of the function wait until its original configuration is back
+    async with function_lock(function_name, region):
+        async with run.stage("read_configuration"):
+            await readiness.wait(function_name, region)
+            configuration = await run_blocking(lambda_client.get_function_configuration, FunctionName=function_name)
+        original_memory = configuration['MemorySize']
+        architecture = (configuration.get('Architectures') or ["x86_64"])[0]
+        run.log(f"Tuning {function_name} ({architecture}, {original_memory} MB) over {memory_sizes} MB")
+
+        aliases = {}
+        # publish_version returns the latest version unchanged when $LATEST matches it, e.g. at the
+        # original memory size; only versions the sweep actually created are deleted afterwards
+        existing_versions = set(await run_blocking(_list_versions, lambda_client, function_name))
+        target_memory = original_memory
+        try:
+            for memory_size in memory_sizes:
+                async with run.stage(f"publish_{memory_size}"):
+                    await run_blocking(lambda_client.update_function_configuration,
+                                       FunctionName=function_name, MemorySize=memory_size)
+                    await readiness.wait(function_name, region)
+                    published = await run_blocking(lambda_client.publish_version, FunctionName=function_name)
+                    version = published['Version']
+                    alias = f"{POWER_TUNING_ALIAS_PREFIX}{memory_size}"
+                    await run_blocking(_put_alias, lambda_client, function_name, alias, version)
+                    aliases[memory_size] = (alias, version)
+
+            async with run.stage("invoke"):
+                results = await asyncio.gather(*(
+                    run_blocking(_measure, function_name, region, alias, request.get("payload") or {},
+                                 request.get("invocations", 10), memory_size, architecture)
+                    for memory_size, (alias, version) in aliases.items()
+                ))
+            for result in results:
+                run.log(f"{result['memory_size']} MB: {result['duration_ms']} ms, ${result['cost_usd']} per invocation"
+                        + (f", {result['errors']} errors" if result["errors"] else ""))
+
+            strategy = request.get("strategy", "balanced")
+            recommended = choose_memory(results, strategy, request.get("balanced_weight", 0.5))
+            applied = recommended is not None and bool(request.get("apply"))
+            if applied:
+                target_memory = recommended
+        finally:
+            # Restore the original memory size (or apply the recommendation) and remove the tuning versions
+            async with run.stage("cleanup"):
+                await readiness.wait(function_name, region)
+                await run_blocking(lambda_client.update_function_configuration,
+                                   FunctionName=function_name, MemorySize=target_memory)
+                # One failed delete must not leave the remaining aliases and versions behind
+                for alias, version in aliases.values():
+                    try:
+                        await run_blocking(lambda_client.delete_alias, FunctionName=function_name, Name=alias)
+                    except Exception as e:
+                        run.log(f"Could not delete alias {alias}: {e}")
+                for version in sorted({version for alias, version in aliases.values()} - existing_versions):
+                    try:
+                        await run_blocking(lambda_client.delete_function, FunctionName=function_name,
+                                           Qualifier=version)
+                    except Exception as e:
+                        run.log(f"Could not delete version {version}: {e}")
+                await readiness.wait(function_name, region)
+
+    return {
+        "run_id": run.run_id,
+        "function_name": function_name,
+        "region": region,
+        "strategy": strategy,
+        "original_memory": original_memory,
+        "recommended_memory": recommended,
+        "applied": applied,
+        "results": results,
+    }
+
+power_tuner = PowerTuner()
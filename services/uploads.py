@@ -0,0 +1,144 @@
+# uploads.py
+
+import hashlib
+import os
+import stat
+import tarfile
+import zipfile
+
+from services.build_workspace import WorkspaceQuotaExceeded
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_MAX_FILE_MB = int(os.getenv("UPLOAD_MAX_FILE_MB", "2048"))
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+class UploadTooLarge(WorkspaceQuotaExceeded):
+    pass
+
+class ChecksumMismatch(ValueError):
+    pass
+
+class _HashingReader:
+    """
+    File wrapper that hashes and counts bytes as they are read, enforcing a size limit.
+    """
+
+    def __init__(self, fileobj, max_bytes, name):
+        self._fileobj = fileobj
+        self._max_bytes = max_bytes
+        self._name = name
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self.size += len(data)
+        if self.size > self._max_bytes:
+            raise UploadTooLarge(f"{self._name} exceeds the {self._max_bytes // (1024 * 1024)} MB upload limit")
+        self.sha256.update(data)
+        return data
+
+# Function to tell whether an upload is an archive that should be extracted
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+# Function to copy a stream into the build workspace in fixed-size chunks
+def _copy_to_workspace(workspace, name, source, chunk_size):
+    path = workspace.context_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as target:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            workspace.reserve(len(chunk))
+            target.write(chunk)
+    return path
+
+def _extract_tar(workspace, reader, chunk_size):
+    # "r|*" reads the archive as a forward-only stream, so it is never buffered whole
+    extracted = []
+    with tarfile.open(fileobj=reader, mode="r|*") as archive:
+        for member in archive:
+            if member.isdir():
+                os.makedirs(workspace.context_path(member.name), exist_ok=True)
+                continue
+            if not member.isfile():
+                # Links and device files could point outside the workspace
+                raise ValueError(f"Unsupported archive member type: {member.name}")
+            source = archive.extractfile(member)
+            _copy_to_workspace(workspace, member.name, source, chunk_size)
+            extracted.append(member.name)
+    # Drain trailing padding so the checksum covers the whole upload
+    while reader.read(chunk_size):
+        pass
+    return extracted
+
+def _extract_zip(workspace, fileobj, chunk_size):
+    extracted = []
+    with zipfile.ZipFile(fileobj) as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                os.makedirs(workspace.context_path(member.filename), exist_ok=True)
+                continue
+            if stat.S_ISLNK(member.external_attr >> 16):
+                raise ValueError(f"Unsupported archive member type: {member.filename}")
+            with archive.open(member) as source:
+                _copy_to_workspace(workspace, member.filename, source, chunk_size)
+            extracted.append(member.filename)
+    return extracted
+
+# Function to stream one uploaded file into the build workspace
+def save_upload(workspace, filename, fileobj, expected_sha256=None, extract=True, chunk_size=None, max_bytes=None):
+    """
+    Stream an uploaded file into a build workspace without reading it into memory.
+
+    The file is copied in fixed-size chunks, counted against both the
+    per-file limit and the workspace quota, and hashed on the way through.
+    Zip and tar bundles are extracted into the build context instead of
+    being copied; tar bundles are extracted straight from the stream.
+
+    Args:
+        workspace (BuildWorkspace): The build workspace.
+        filename (str): The uploaded file name; only its base name is used.
+        fileobj (file): The uploaded file, opened for binary reading.
+        expected_sha256 (str, optional): Reject the upload unless its SHA-256 matches.
+        extract (bool): Extract zip and tar bundles into the build context.
+        chunk_size (int, optional): Bytes per read. Defaults to UPLOAD_CHUNK_SIZE.
+        max_bytes (int, optional): Per-file limit. Defaults to UPLOAD_MAX_FILE_MB.
+
+    Returns:
+        dict: The file name, size, SHA-256 and, for bundles, the extracted files.
+
+    Raises:
+        UploadTooLarge: If the file exceeds the per-file limit.
+        WorkspaceQuotaExceeded: If the workspace quota is exceeded.
+        ChecksumMismatch: If the SHA-256 does not match expected_sha256.
+        ValueError: If a bundle is corrupt or contains unsafe paths or member types.
+    """
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    max_bytes = max_bytes if max_bytes is not None else UPLOAD_MAX_FILE_MB * 1024 * 1024
+    name = os.path.basename(filename)
+    reader = _HashingReader(fileobj, max_bytes, name)
+    record = {"filename": name}
+
+    try:
+        if extract and name.lower().endswith(".zip"):
+            # Zip needs random access to its central directory: hash and size-check first, then extract
+            while reader.read(chunk_size):
+                pass
+            fileobj.seek(0)
+            record["extracted"] = _extract_zip(workspace, fileobj, chunk_size)
+        elif extract and is_archive(name):
+            record["extracted"] = _extract_tar(workspace, reader, chunk_size)
+        else:
+            _copy_to_workspace(workspace, name, reader, chunk_size)
+    except (tarfile.TarError, zipfile.BadZipFile) as e:
+        raise ValueError(f"Invalid archive {name}: {e}")
+
+    record["size"] = reader.size
+    record["sha256"] = reader.sha256.hexdigest()
+    if expected_sha256 and expected_sha256.lower() != record["sha256"]:
+        raise ChecksumMismatch(f"Checksum mismatch for {name}: expected {expected_sha256}, got {record['sha256']}")
+    return record
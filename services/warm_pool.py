@@ -0,0 +1,462 @@
+# warm_pool.py
+
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from services.aws_services import get_aws_client, run_blocking
+from services.invocation_history import invocation_history, SOURCE_KEEP_WARM
+from services.lambda_invoker import invoke_lambda_function
+from services.lambda_readiness import readiness, function_lock
+from utils.state_utils import get_state_path
+
+logger = logging.getLogger(__name__)
+
+WARM_POOL_DB = os.getenv("WARM_POOL_DB")
+# Alias provisioned concurrency is configured on when none is given
+WARM_POOL_ALIAS = os.getenv("WARM_POOL_ALIAS", "live")
+# Lambda reclaims idle execution environments after several minutes, so ping more often than that
+WARM_POOL_PING_INTERVAL_S = int(os.getenv("WARM_POOL_PING_INTERVAL_S", "300"))
+# Keep-warm invocations in flight at once across every target
+WARM_POOL_MAX_PINGS_IN_FLIGHT = int(os.getenv("WARM_POOL_MAX_PINGS_IN_FLIGHT", "20"))
+# Recommendations are learned from this much invocation history
+WARM_POOL_LEARNING_WINDOW_S = int(os.getenv("WARM_POOL_LEARNING_WINDOW_S", "86400"))
+WARM_POOL_MIN_INVOCATIONS = int(os.getenv("WARM_POOL_MIN_INVOCATIONS", "20"))
+WARM_POOL_COLD_RATE_THRESHOLD = float(os.getenv("WARM_POOL_COLD_RATE_THRESHOLD", "0.05"))
+# Traffic at or above this many invocations per minute is steady enough for provisioned concurrency
+WARM_POOL_PROVISIONED_MIN_RPM = float(os.getenv("WARM_POOL_PROVISIONED_MIN_RPM", "2"))
+
+# Event sent by keep-warm pings; handlers can return early when they see it
+WARMUP_EVENT = {"agileagents_warmup": True}
+
+MODE_PROVISIONED = "provisioned"
+MODE_KEEP_WARM = "keep_warm"
+
+class WarmPool:
+    """
+    Keeps execution environments of deployed agents warm.
+
+    Two modes are supported per function: provisioned concurrency on an
+    alias, which Lambda keeps initialized, and keep-warm pings, which invoke
+    the function with WARMUP_EVENT on a schedule so idle environments are
+    not reclaimed. Recommendations for which functions need warming, and
+    how much, are learned from the invocation history, and cold-start rates
+    are reported before and after warming was enabled.
+    """
+
+    def __init__(self, path=None, history=None):
+        self._path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.history = history or invocation_history
+        self._loop = None
+        self._pinger = None
+        self._wakeup = None
+        self.rounds = 0
+        self.pings = 0
+        self.ping_errors = 0
+
+    @property
+    def conn(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(
+                    self._path or WARM_POOL_DB or get_state_path("warm_pool.sqlite3"),
+                    check_same_thread=False
+                )
+                self._conn.row_factory = sqlite3.Row
+                with self._conn:
+                    self._conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS warm_targets (
+                            function_name TEXT NOT NULL,
+                            region TEXT NOT NULL,
+                            mode TEXT NOT NULL,
+                            alias TEXT,
+                            concurrency INTEGER NOT NULL,
+                            interval_s INTEGER,
+                            status TEXT,
+                            enabled_at REAL,
+                            updated_at REAL,
+                            last_ping_at REAL,
+                            pings INTEGER DEFAULT 0,
+                            ping_errors INTEGER DEFAULT 0,
+                            PRIMARY KEY (function_name, region, mode)
+                        )
+                        """
+                    )
+            return self._conn
+
+    def _upsert_target(self, function_name, region, mode, alias, concurrency, interval_s=None, status=None):
+        now = time.time()
+        conn = self.conn
+        with self._lock, conn:
+            # enabled_at is kept across changes so the before/after report compares against the first enable
+            conn.execute(
+                "INSERT INTO warm_targets (function_name, region, mode, alias, concurrency, interval_s, status, enabled_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (function_name, region, mode) DO UPDATE SET "
+                "alias = excluded.alias, concurrency = excluded.concurrency, interval_s = excluded.interval_s, "
+                "status = excluded.status, updated_at = excluded.updated_at",
+                (function_name, region, mode, alias, concurrency, interval_s, status, now, now)
+            )
+            row = conn.execute(
+                "SELECT * FROM warm_targets WHERE function_name = ? AND region = ? AND mode = ?",
+                (function_name, region, mode)
+            ).fetchone()
+        return dict(row)
+
+    def targets(self, mode=None, function_name=None, region=None):
+        conditions, params = [], []
+        for column, value in (("mode", mode), ("function_name", function_name), ("region", region)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        query = "SELECT * FROM warm_targets"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        conn = self.conn
+        with self._lock:
+            rows = conn.execute(query + " ORDER BY function_name, region, mode", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def _ensure_alias(self, lambda_client, function_name, alias):
+        # Provisioned concurrency needs a published version behind an alias, not $LATEST
+        version = lambda_client.publish_version(FunctionName=function_name)['Version']
+        try:
+            current = lambda_client.get_alias(FunctionName=function_name, Name=alias)
+            if current['FunctionVersion'] != version:
+                lambda_client.update_alias(FunctionName=function_name, Name=alias, FunctionVersion=version)
+        except lambda_client.exceptions.ResourceNotFoundException:
+            lambda_client.create_alias(FunctionName=function_name, Name=alias, FunctionVersion=version)
+        return version
+
+    async def set_provisioned_concurrency(self, function_name, region, concurrency, alias=None):
+        """
+        Configure provisioned concurrency on an alias of a function.
+
+        The alias is created, or moved, to point at the latest published
+        version. Callers must invoke the alias for the provisioned
+        environments to serve their requests. A concurrency of 0 removes
+        the configuration. The version is published under the function's
+        lock once the function is ready, so it never races a deploy.
+
+        Args:
+            function_name (str): The name of the Lambda function.
+            region (str): The AWS region.
+            concurrency (int): The number of environments to keep initialized.
+            alias (str, optional): The alias. Defaults to WARM_POOL_ALIAS.
+
+        Returns:
+            dict: The warm pool target, with the Lambda allocation status and version.
+        """
+        alias = alias or WARM_POOL_ALIAS
+        lambda_client = get_aws_client('lambda', region_name=region)
+        if not concurrency:
+            await run_blocking(self.remove, function_name, region, MODE_PROVISIONED)
+            return {"function_name": function_name, "region": region, "mode": MODE_PROVISIONED,
+                    "alias": alias, "concurrency": 0, "status": "REMOVED"}
+        async with function_lock(function_name, region):
+            await readiness.wait(function_name, region)
+            version = await run_blocking(self._ensure_alias, lambda_client, function_name, alias)
+            response = await run_blocking(
+                lambda_client.put_provisioned_concurrency_config,
+                FunctionName=function_name,
+                Qualifier=alias,
+                ProvisionedConcurrentExecutions=concurrency
+            )
+        target = await run_blocking(
+            self._upsert_target, function_name, region, MODE_PROVISIONED, alias, concurrency,
+            status=response.get('Status')
+        )
+        return {**target, "version": version}
+
+    async def advance_alias(self, function_name, region):
+        """
+        Move the provisioned-concurrency alias of a function to its latest code.
+
+        Deploys call this after updating a function, so its provisioned
+        environments do not keep serving the previous version. The caller
+        must hold function_lock(function_name, region).
+
+        Returns:
+            str: The version the alias points at, or None when the function
+                has no provisioned concurrency.
+        """
+        targets = await run_blocking(self.targets, MODE_PROVISIONED, function_name, region)
+        if not targets:
+            return None
+        await readiness.wait(function_name, region)
+        lambda_client = get_aws_client('lambda', region_name=region)
+        return await run_blocking(self._ensure_alias, lambda_client, function_name, targets[0]["alias"])
+
+    def set_keep_warm(self, function_name, region, concurrency=1, interval_s=None, alias=None):
+        """
+        Ping a function on a schedule to keep its environments warm.
+
+        Each round sends concurrency simultaneous invocations of WARMUP_EVENT,
+        so up to that many environments stay alive. Call ensure_started
+        from the event loop afterwards to run the pinger.
+
+        Args:
+            function_name (str): The name of the Lambda function.
+            region (str): The AWS region.
+            concurrency (int): Simultaneous pings per round.
+            interval_s (int, optional): Seconds between rounds. Defaults to WARM_POOL_PING_INTERVAL_S.
+            alias (str, optional): The alias or version to ping.
+
+        Returns:
+            dict: The warm pool target.
+        """
+        return self._upsert_target(function_name, region, MODE_KEEP_WARM, alias, concurrency,
+                                   interval_s=interval_s or WARM_POOL_PING_INTERVAL_S, status="ACTIVE")
+
+    def remove(self, function_name, region, mode=None):
+        """
+        Stop warming a function, in one mode or in both.
+        Provisioned concurrency is deleted from the alias as well.
+
+        Returns:
+            int: The number of targets removed.
+        """
+        removed = 0
+        for target in self.targets(mode=mode, function_name=function_name, region=region):
+            if target["mode"] == MODE_PROVISIONED:
+                lambda_client = get_aws_client('lambda', region_name=region)
+                try:
+                    lambda_client.delete_provisioned_concurrency_config(
+                        FunctionName=function_name, Qualifier=target["alias"]
+                    )
+                except lambda_client.exceptions.ResourceNotFoundException:
+                    pass
+            conn = self.conn
+            with self._lock, conn:
+                removed += conn.execute(
+                    "DELETE FROM warm_targets WHERE function_name = ? AND region = ? AND mode = ?",
+                    (function_name, region, target["mode"])
+                ).rowcount
+        return removed
+
+    def ensure_started(self):
+        """
+        Start the keep-warm pinger on the running event loop if it is not running.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._pinger, self._wakeup = loop, None, asyncio.Event()
+        if self._pinger is None or self._pinger.done():
+            self._pinger = loop.create_task(self._ping_loop())
+        else:
+            self._wakeup.set()
+
+    async def stop(self):
+        if self._pinger is not None and not self._pinger.done():
+            self._pinger.cancel()
+            try:
+                await self._pinger
+            except asyncio.CancelledError:
+                pass
+        self._pinger = None
+
+    async def _ping_loop(self):
+        semaphore = asyncio.Semaphore(WARM_POOL_MAX_PINGS_IN_FLIGHT)
+        while True:
+            targets = await run_blocking(self.targets, MODE_KEEP_WARM)
+            if not targets:
+                return
+            now = time.time()
+            due = [t for t in targets if t["last_ping_at"] is None or now - t["last_ping_at"] >= t["interval_s"]]
+            if due:
+                self.rounds += 1
+                await asyncio.gather(*(self.ping(target, semaphore) for target in due))
+                continue
+            self._wakeup.clear()
+            next_ping = min(t["last_ping_at"] + t["interval_s"] for t in targets)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, next_ping - now))
+            except asyncio.TimeoutError:
+                pass
+
+    async def ping(self, target, semaphore=None):
+        """
+        Send one round of keep-warm pings to a target.
+
+        Returns:
+            dict: The number of pings, errors and pings that hit a cold environment.
+        """
+        semaphore = semaphore or asyncio.Semaphore(WARM_POOL_MAX_PINGS_IN_FLIGHT)
+
+        async def ping_once():
+            async with semaphore:
+                return await run_blocking(
+                    invoke_lambda_function, target["function_name"], WARMUP_EVENT, target["region"],
+                    target["alias"], SOURCE_KEEP_WARM
+                )
+
+        responses = await asyncio.gather(*(ping_once() for _ in range(target["concurrency"])), return_exceptions=True)
+        errors = [r for r in responses if isinstance(r, Exception) or r.get("function_error")]
+        for error in errors:
+            logger.warning(f"Keep-warm ping of {target['function_name']} in {target['region']} failed: {error}")
+        outcome = {
+            "pinged": len(responses),
+            "errors": len(errors),
+            "cold_starts": sum(1 for r in responses if isinstance(r, dict) and r.get("cold_start")),
+        }
+        self.pings += outcome["pinged"]
+        self.ping_errors += outcome["errors"]
+        conn = self.conn
+        with self._lock, conn:
+            conn.execute(
+                "UPDATE warm_targets SET last_ping_at = ?, pings = pings + ?, ping_errors = ping_errors + ? "
+                "WHERE function_name = ? AND region = ? AND mode = ?",
+                (time.time(), outcome["pinged"], outcome["errors"], target["function_name"], target["region"], MODE_KEEP_WARM)
+            )
+        return outcome
+
+    def recommend(self, window_s=None, now=None):
+        """
+        Learn from the invocation history which functions need warming.
+
+        A function with at least WARM_POOL_MIN_INVOCATIONS calls in the window
+        and a cold-start rate of WARM_POOL_COLD_RATE_THRESHOLD or more is
+        recommended for provisioned concurrency when its traffic is steady
+        (WARM_POOL_PROVISIONED_MIN_RPM), and for keep-warm pings otherwise.
+        The concurrency is estimated with Little's law over the busiest
+        minute: calls per second times the mean duration.
+
+        Args:
+            window_s (int, optional): Seconds of history to learn from. Defaults to WARM_POOL_LEARNING_WINDOW_S.
+            now (float, optional): The end of the window. Defaults to now.
+
+        Returns:
+            list: One recommendation per function invoked in the window.
+        """
+        now = now or time.time()
+        window_s = window_s or WARM_POOL_LEARNING_WINDOW_S
+        since = now - window_s
+        current = {}
+        for target in self.targets():
+            current.setdefault((target["function_name"], target["region"]), []).append(target["mode"])
+
+        recommendations = []
+        for function_name, region in self.history.functions(since=since):
+            calls = self.history.invocations(function_name, region, since=since, until=now)
+            observed = [call for call in calls if call["cold"] is not None]
+            cold_starts = sum(call["cold"] for call in observed)
+            cold_rate = cold_starts / len(observed) if observed else None
+            span_s = max(60.0, calls[-1]["invoked_at"] - calls[0]["invoked_at"]) if calls else 60.0
+            per_minute = {}
+            for call in calls:
+                minute = int(call["invoked_at"] // 60)
+                per_minute[minute] = per_minute.get(minute, 0) + 1
+            durations = [call["duration_ms"] for call in calls if call["duration_ms"] is not None]
+            mean_duration_s = sum(durations) / len(durations) / 1000 if durations else 1.0
+            inits = [call["init_duration_ms"] for call in observed if call["init_duration_ms"] is not None]
+            recommendation = {
+                "function_name": function_name,
+                "region": region,
+                "invocations": len(calls),
+                "cold_starts": cold_starts,
+                "cold_start_rate": round(cold_rate, 4) if cold_rate is not None else None,
+                "invocations_per_minute": round(len(calls) / span_s * 60, 3),
+                "init_duration_ms": round(sum(inits) / len(inits), 2) if inits else None,
+                "current": sorted(current.get((function_name, region), [])),
+                "concurrency": max(1, math.ceil(max(per_minute.values()) / 60 * mean_duration_s)),
+            }
+            if len(calls) < WARM_POOL_MIN_INVOCATIONS or cold_rate is None:
+                recommendation.update(mode=None, reason="not enough invocation history")
+            elif cold_rate < WARM_POOL_COLD_RATE_THRESHOLD:
+                recommendation.update(mode=None, reason="cold-start rate below threshold")
+            elif recommendation["invocations_per_minute"] >= WARM_POOL_PROVISIONED_MIN_RPM:
+                recommendation.update(mode=MODE_PROVISIONED, reason="steady traffic with frequent cold starts")
+            else:
+                recommendation.update(mode=MODE_KEEP_WARM, interval_s=WARM_POOL_PING_INTERVAL_S,
+                                      reason="sparse traffic; idle environments are reclaimed between calls")
+            recommendations.append(recommendation)
+        return recommendations
+
+    async def apply_recommendations(self, window_s=None, include_provisioned=False):
+        """
+        Enable the recommended warming for functions that are not warmed yet.
+
+        Provisioned concurrency is billed while it is configured, so it is
+        only applied when include_provisioned is set.
+
+        Returns:
+            list: The targets enabled.
+        """
+        applied = []
+        for recommendation in await run_blocking(self.recommend, window_s):
+            if recommendation["current"] or recommendation["mode"] is None:
+                continue
+            if recommendation["mode"] == MODE_KEEP_WARM:
+                applied.append(await run_blocking(
+                    self.set_keep_warm, recommendation["function_name"], recommendation["region"],
+                    recommendation["concurrency"], recommendation["interval_s"]
+                ))
+            elif include_provisioned:
+                applied.append(await self.set_provisioned_concurrency(
+                    recommendation["function_name"], recommendation["region"], recommendation["concurrency"]
+                ))
+        if any(target["mode"] == MODE_KEEP_WARM for target in applied):
+            self.ensure_started()
+        return applied
+
+    def cold_start_report(self, function_name=None, region=None, window_s=None, now=None):
+        """
+        Report cold-start rates of API invocations before and after warming.
+
+        For a warmed function, "before" covers the window_s seconds before
+        warming was first enabled and "after" everything since. Functions
+        that are not warmed report their rate over the last window_s seconds.
+
+        Returns:
+            list: One entry per function.
+        """
+        now = now or time.time()
+        window_s = window_s or WARM_POOL_LEARNING_WINDOW_S
+        warmed = {}
+        for target in self.targets(function_name=function_name, region=region):
+            entry = warmed.setdefault((target["function_name"], target["region"]), {"modes": [], "enabled_at": now})
+            entry["modes"].append(target["mode"])
+            entry["enabled_at"] = min(entry["enabled_at"], target["enabled_at"])
+
+        functions = set(warmed)
+        for key in self.history.functions(since=now - window_s):
+            if (function_name is None or key[0] == function_name) and (region is None or key[1] == region):
+                functions.add(key)
+
+        report = []
+        for key in sorted(functions):
+            entry = {"function_name": key[0], "region": key[1]}
+            if key in warmed:
+                enabled_at = warmed[key]["enabled_at"]
+                before = self.history.cold_start_stats(*key, since=enabled_at - window_s, until=enabled_at)
+                after = self.history.cold_start_stats(*key, since=enabled_at)
+                entry.update(
+                    modes=warmed[key]["modes"],
+                    enabled_at=enabled_at,
+                    before=before,
+                    after=after,
+                    cold_start_rate_change=(
+                        round(after["cold_start_rate"] - before["cold_start_rate"], 4)
+                        if before["cold_start_rate"] is not None and after["cold_start_rate"] is not None else None
+                    ),
+                )
+            else:
+                entry.update(modes=[], current=self.history.cold_start_stats(*key, since=now - window_s))
+            report.append(entry)
+        return report
+
+    def stats(self):
+        return {
+            "pinger_running": self._pinger is not None and not self._pinger.done(),
+            "rounds": self.rounds,
+            "pings": self.pings,
+            "ping_errors": self.ping_errors,
+        }
+
+warm_pool = WarmPool()
@@ -0,0 +1,190 @@
+# wheelhouse.py
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+
+try:
+    from packaging.requirements import Requirement, InvalidRequirement
+except ImportError:  # packaging is optional; fall back to a conservative pattern check
+    Requirement = None
+
+from utils.state_utils import STATE_DIR
+
+WHEELHOUSE_DIR = os.getenv("WHEELHOUSE_DIR")
+WHEELHOUSE_PLATFORM = os.getenv("WHEELHOUSE_PLATFORM", "manylinux2014_x86_64")
+
+# pip options that are safe inside a requirements file copied into the image
+_ALLOWED_OPTIONS = ("--index-url", "--extra-index-url", "--find-links", "--trusted-host", "--pre")
+_REQUIREMENT_PATTERN = re.compile(
+    r"^[A-Za-z0-9][A-Za-z0-9._-]*(\[[A-Za-z0-9,._ -]*\])?\s*"
+    r"(@\s*\S+|((==|!=|<=|>=|~=|===|<|>)\s*[^,;\s]+\s*)(,\s*(==|!=|<=|>=|~=|===|<|>)\s*[^,;\s]+\s*)*)?"
+    r"(;.*)?$"
+)
+
+class InvalidRequirements(ValueError):
+    pass
+
+# Function to validate requirements.txt content
+def parse_requirements(text):
+    """
+    Validate requirements.txt content before anything is installed.
+
+    Comments, blank lines and index options are accepted. References to
+    other files (-r, -c) and editable installs (-e) are rejected because
+    those paths do not exist inside the build context.
+
+    Args:
+        text (str): The requirements.txt content.
+
+    Returns:
+        list: The requirement lines, stripped of comments.
+
+    Raises:
+        InvalidRequirements: If any line is not a valid requirement.
+    """
+    requirements, errors = [], []
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = re.sub(r"(^|\s)#.*$", "", raw).strip()
+        if not line:
+            continue
+        if line.startswith("-"):
+            if not line.startswith(_ALLOWED_OPTIONS):
+                errors.append(f"line {number}: unsupported option '{line}'")
+            continue
+        if Requirement is not None:
+            try:
+                Requirement(line)
+            except InvalidRequirement as e:
+                errors.append(f"line {number}: {e}")
+                continue
+        elif not _REQUIREMENT_PATTERN.match(line):
+            errors.append(f"line {number}: invalid requirement '{line}'")
+            continue
+        requirements.append(line)
+    if errors:
+        raise InvalidRequirements("Invalid requirements: " + "; ".join(errors))
+    return requirements
+
+# Function to hash a set of requirements
+def requirements_hash(requirements):
+    return hashlib.sha256("\n".join(sorted(requirements)).encode("utf-8")).hexdigest()
+
+# Function to read the Python version from a base image name
+def python_version_for_image(base_image):
+    """
+    Return the Python version of a base image such as
+    public.ecr.aws/lambda/python:3.9 or python:3.11-slim, or None if the
+    image name does not say.
+    """
+    match = re.search(r"python:(\d+\.\d+)", base_image)
+    return match.group(1) if match else None
+
+class Wheelhouse:
+    """
+    A local directory of pre-downloaded wheels shared by every build.
+
+    Wheels are kept per Python version and platform so they match the
+    image they are installed into. Once a requirements set has been
+    resolved into the wheelhouse, later builds with the same requirements
+    skip resolution entirely and install offline from the mounted
+    directory.
+
+    The wheelhouse also remembers how long a host-side install of each
+    requirements set took, which is what a deploy saves by not doing one.
+    """
+
+    def __init__(self, root=None, platform=None):
+        self.root = root or WHEELHOUSE_DIR or os.path.join(STATE_DIR, "wheelhouse")
+        self.platform = platform or WHEELHOUSE_PLATFORM
+        self._lock = threading.Lock()
+        self._download_locks = {}
+
+    def path(self, python_version):
+        return os.path.join(self.root, f"py{python_version}-{self.platform}")
+
+    def set_path(self, python_version, req_hash):
+        """
+        Return the directory holding exactly the wheels of one requirements set,
+        for zip packages that unpack them rather than installing from an index.
+        """
+        return os.path.join(self.path(python_version), "sets", req_hash)
+
+    def set_wheels(self, python_version, req_hash):
+        """
+        Return the wheel paths of a fully downloaded requirements set, or None if it is not complete.
+        """
+        directory = self.set_path(python_version, req_hash)
+        if not os.path.exists(os.path.join(directory, ".complete")):
+            return None
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".whl"))
+
+    def mark_set_complete(self, python_version, req_hash):
+        with open(os.path.join(self.set_path(python_version, req_hash), ".complete"), "w") as f:
+            f.write("")
+
+    def _stamp_path(self, python_version, req_hash):
+        return os.path.join(self.path(python_version), ".resolved", req_hash)
+
+    def is_resolved(self, python_version, req_hash):
+        return os.path.exists(self._stamp_path(python_version, req_hash))
+
+    def mark_resolved(self, python_version, req_hash):
+        stamp = self._stamp_path(python_version, req_hash)
+        os.makedirs(os.path.dirname(stamp), exist_ok=True)
+        with open(stamp, "w") as f:
+            f.write("")
+
+    def download_lock(self, python_version):
+        """
+        Return the asyncio lock that serializes downloads into one wheelhouse directory.
+        """
+        with self._lock:
+            return self._download_locks.setdefault(self.path(python_version), asyncio.Lock())
+
+    def download_command(self, requirements_path, python_version, dest=None):
+        """
+        Return the pip command that downloads wheels for the target image
+        (not the host) into the wheelhouse, or into dest if given.
+        """
+        return [
+            "python3", "-m", "pip", "download",
+            "--only-binary=:all:",
+            "--platform", self.platform,
+            "--python-version", python_version,
+            "--implementation", "cp",
+            "--dest", dest or self.path(python_version),
+            "--requirement", requirements_path,
+        ]
+
+    def _baselines_path(self):
+        return os.path.join(self.root, "baselines.json")
+
+    def _read_baselines(self):
+        try:
+            with open(self._baselines_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get_baseline(self, req_hash):
+        """
+        Return the measured host-side install time for a requirements set, in seconds, or None.
+        """
+        with self._lock:
+            return self._read_baselines().get(req_hash)
+
+    def record_baseline(self, req_hash, seconds):
+        with self._lock:
+            baselines = self._read_baselines()
+            baselines[req_hash] = round(seconds, 3)
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = self._baselines_path() + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(baselines, f)
+            os.replace(tmp_path, self._baselines_path())
+
+wheelhouse = Wheelhouse()
@@ -0,0 +1,165 @@
+# zip_packager.py
+
+import base64
+import hashlib
+import os
+import shutil
+import stat
+import threading
+import zipfile
+
+from utils.state_utils import STATE_DIR
+
+ZIP_PACKAGE_DIR = os.getenv("ZIP_PACKAGE_DIR")
+# Packages up to this size are sent inline with the Lambda API call; larger ones go through S3
+ZIP_DIRECT_UPLOAD_MAX_MB = int(os.getenv("ZIP_DIRECT_UPLOAD_MAX_MB", "50"))
+ZIP_S3_BUCKET = os.getenv("ZIP_S3_BUCKET")
+
+# Fixed metadata so identical inputs always produce identical bytes
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+ZIP_FILE_MODE = (stat.S_IFREG | 0o644) << 16
+# Bump when the package layout changes so cached packages are rebuilt
+_PACKAGE_FORMAT = b"agileagents-zip-1"
+
+# Function to map a file inside a wheel to its path in the Lambda package
+def _wheel_member_path(name):
+    """
+    Return where a wheel member belongs in the package root, or None to skip it.
+
+    Lambda adds the package root to sys.path, so purelib and platlib files
+    go to the root; scripts, headers and data files are not needed.
+    """
+    parts = name.split("/")
+    if parts[0].endswith(".data"):
+        if len(parts) > 2 and parts[1] in ("purelib", "platlib"):
+            return "/".join(parts[2:])
+        return None
+    return name
+
+class ZipPackageCache:
+    """
+    Builds deterministic Lambda zip packages and keeps them by input hash.
+
+    Entries are written in sorted order with fixed timestamps and
+    permissions, so the same sources and wheels always produce the same
+    bytes and the same CodeSha256. A package whose inputs were already
+    packaged is served from disk without being rebuilt.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or ZIP_PACKAGE_DIR or os.path.join(STATE_DIR, "zip_packages")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, input_hash):
+        return os.path.join(self.root, f"{input_hash}.zip")
+
+    @staticmethod
+    def input_hash(sources, wheel_paths=(), prefix=""):
+        """
+        Hash the package inputs: source names and contents plus wheel names and contents.
+        """
+        digest = hashlib.sha256(_PACKAGE_FORMAT + b"\0" + prefix.encode("utf-8"))
+        for name in sorted(sources):
+            digest.update(b"src\0" + name.encode("utf-8") + b"\0")
+            digest.update(hashlib.sha256(sources[name]).digest())
+        for wheel_path in sorted(wheel_paths, key=os.path.basename):
+            digest.update(b"whl\0" + os.path.basename(wheel_path).encode("utf-8") + b"\0")
+            with open(wheel_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def build(self, sources, wheel_paths=(), prefix=""):
+        """
+        Return the zip package for the given sources and wheels, building it on a cache miss.
+
+        Args:
+            sources (dict): Package-relative file names mapped to their bytes.
+            wheel_paths (list): Wheels whose contents are unpacked into the package root.
+            prefix (str): Directory the wheels are unpacked into, e.g. "python/" for a layer.
+
+        Returns:
+            dict: The package path, input hash, size, Lambda CodeSha256 and whether it was cached.
+        """
+        input_hash = self.input_hash(sources, wheel_paths, prefix)
+        path = self.path(input_hash)
+        cached = os.path.exists(path)
+        if cached:
+            with self._lock:
+                self.hits += 1
+        else:
+            with self._lock:
+                self.misses += 1
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                write_deterministic_zip(tmp_path, sources, wheel_paths, prefix)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return {
+            "path": path,
+            "input_hash": input_hash,
+            "size": os.path.getsize(path),
+            "code_sha256": code_sha256(path),
+            "cached": cached,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "root": self.root}
+
+# Function to write a zip whose bytes depend only on its contents
+def write_deterministic_zip(target_path, sources, wheel_paths=(), prefix=""):
+    """
+    Write sources and unpacked wheels to a zip file with reproducible bytes.
+
+    Sources take precedence over wheel files of the same name, and wheels
+    are applied in file name order, so overlaps resolve the same way every time.
+
+    Args:
+        target_path (str): The zip file to write.
+        sources (dict): Package-relative file names mapped to their bytes.
+        wheel_paths (list): Wheels to unpack into the package root.
+        prefix (str): Directory the wheels are unpacked into.
+    """
+    wheels = [zipfile.ZipFile(wheel_path) for wheel_path in sorted(wheel_paths, key=os.path.basename)]
+    try:
+        entries = {}
+        for wheel in wheels:
+            for member in wheel.infolist():
+                name = _wheel_member_path(member.filename)
+                if name and not member.is_dir():
+                    entries.setdefault(prefix + name, (wheel, member))
+        for name, data in sources.items():
+            entries[name] = data
+
+        with zipfile.ZipFile(target_path, "w", zipfile.ZIP_DEFLATED) as package:
+            for name in sorted(entries):
+                info = zipfile.ZipInfo(name, date_time=ZIP_EPOCH)
+                info.external_attr = ZIP_FILE_MODE
+                info.compress_type = zipfile.ZIP_DEFLATED
+                entry = entries[name]
+                if isinstance(entry, bytes):
+                    package.writestr(info, entry)
+                else:
+                    wheel, member = entry
+                    info.file_size = member.file_size
+                    with wheel.open(member) as source, package.open(info, "w") as target:
+                        shutil.copyfileobj(source, target, 1024 * 1024)
+    finally:
+        for wheel in wheels:
+            wheel.close()
+
+# Function to compute the CodeSha256 Lambda reports for a zip package
+def code_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode("ascii")
+
+zip_packages = ZipPackageCache()
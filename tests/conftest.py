@@ -1,6 +1,278 @@
+import base64
+import hashlib
+import json
+import os
+import stat
+import sys
+import textwrap
 import warnings
+from datetime import datetime, timedelta, timezone
+
 import pytest
 
 @pytest.fixture(autouse=True)
 def ignore_pydantic_warnings():
     warnings.filterwarnings("ignore", category=DeprecationWarning, module="pydantic")
+
+
+# Stand-ins for the docker, aws and python3 binaries used by the deploy pipeline.
+# The fake docker copies each build context to $FAKE_DOCKER_OUT/images/<tag>,
+# derives the image ID from its contents, records pushes under
+# $FAKE_DOCKER_OUT/registry/<region>/<repo>/<tag> and logs every command to
+# $FAKE_DOCKER_OUT/commands.log.
+FAKE_DOCKER = """
+import hashlib, os, random, shutil, sys, time
+args = sys.argv[1:]
+out = os.environ["FAKE_DOCKER_OUT"]
+with open(os.path.join(out, "commands.log"), "a") as log:
+    log.write(" ".join(args) + "\\n")
+
+def image_id(image):
+    digest = hashlib.sha256()
+    root = os.path.join(out, "images", image)
+    for dirpath, dirnames, filenames in sorted(os.walk(root)):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return "sha256:" + digest.hexdigest()
+
+if args[0] in ("build", "buildx"):
+    tag = args[args.index("-t") + 1]
+    context = args[-1]
+    time.sleep(random.uniform(0, 0.2))
+    shutil.copytree(context, os.path.join(out, "images", tag))
+elif args[0] == "tag":
+    os.makedirs(os.path.join(out, "tags"), exist_ok=True)
+    with open(os.path.join(out, "tags", args[2].rsplit("/", 1)[-1]), "w") as f:
+        f.write(args[1])
+elif args[:2] == ["image", "inspect"]:
+    print(image_id(args[-1]))
+elif args[0] == "push":
+    registry, name = args[1].split("/", 1)
+    region = registry.split(".")[3]
+    repository, tag = name.split(":")
+    with open(os.path.join(out, "tags", f"{repository}:{tag}")) as f:
+        local_image = f.read()
+    os.makedirs(os.path.join(out, "registry", region, repository), exist_ok=True)
+    with open(os.path.join(out, "registry", region, repository, tag), "w") as f:
+        f.write(image_id(local_image))
+"""
+
+FAKE_AWS = """
+import sys
+if "get-login-password" in sys.argv:
+    print("password")
+"""
+
+FAKE_PYTHON3 = """
+import os, sys, zipfile
+if sys.argv[1:4] == ["-m", "pip", "download"]:
+    dest = sys.argv[sys.argv.index("--dest") + 1]
+    os.makedirs(dest, exist_ok=True)
+    with zipfile.ZipFile(os.path.join(dest, "fakepkg-1.0-py3-none-any.whl"), "w") as wheel:
+        wheel.writestr("fakepkg/__init__.py", "VERSION = '1.0'\\n")
+        wheel.writestr("fakepkg-1.0.dist-info/METADATA", "Name: fakepkg\\n")
+elif sys.argv[1:3] == ["-m", "venv"]:
+    bin_dir = os.path.join(sys.argv[3], "bin")
+    os.makedirs(bin_dir)
+    pip = os.path.join(bin_dir, "pip")
+    with open(pip, "w") as f:
+        f.write("#!/bin/sh\\nexit 0\\n")
+    os.chmod(pip, 0o755)
+"""
+
+
+def write_fake_binary(bin_dir, name, source):
+    path = bin_dir / name
+    path.write_text(f"#!{sys.executable}\n" + textwrap.dedent(source))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+
+
+class FakeAWSClient:
+    """A stand-in for the ECR and Lambda clients of one region."""
+
+    class exceptions:
+        class RepositoryAlreadyExistsException(Exception):
+            pass
+
+        class ResourceConflictException(Exception):
+            pass
+
+        class ImageNotFoundException(Exception):
+            pass
+
+        class RepositoryNotFoundException(Exception):
+            pass
+
+        class ResourceNotFoundException(Exception):
+            pass
+
+    def __init__(self, out, region="us-west-2"):
+        self.out = out
+        self.region = region
+        self.digests = set()
+        self.functions = {}
+        self.put_images = []
+        self.layers = {}
+
+    def get_caller_identity(self):
+        return {"Account": "123456789012"}
+
+    def describe_registry(self):
+        return {"registryId": "123456789012", "replicationConfiguration": {"rules": []}}
+
+    def create_repository(self, **kwargs):
+        pass
+
+    def get_authorization_token(self, **kwargs):
+        self.token_requests = getattr(self, "token_requests", 0) + 1
+        return {"authorizationData": [{
+            "authorizationToken": base64.b64encode(f"AWS:password-{self.token_requests}".encode()).decode(),
+            "proxyEndpoint": f"https://123456789012.dkr.ecr.{self.region}.amazonaws.com",
+            "expiresAt": datetime.now(timezone.utc) + timedelta(hours=12),
+        }]}
+
+    @staticmethod
+    def manifest(config_digest):
+        return json.dumps({
+            "schemaVersion": 2,
+            "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+            "config": {"digest": config_digest, "size": 100},
+            "layers": [{"digest": "sha256:layer", "size": 1000}],
+        })
+
+    def registry(self, repository_name):
+        """Map each pushed image digest to its config digest and push time."""
+        images = {}
+        directory = self.out / "registry" / self.region / repository_name
+        for path in directory.iterdir() if directory.exists() else []:
+            manifest = self.manifest(path.read_text())
+            digest = "sha256:" + hashlib.sha256(manifest.encode()).hexdigest()
+            images[digest] = {"manifest": manifest, "tag": path.name, "pushed_at": path.stat().st_mtime}
+        return images
+
+    def describe_images(self, repositoryName, imageIds=None, **kwargs):
+        images = self.registry(repositoryName)
+        if imageIds is None:
+            return {"imageDetails": [
+                {"imageDigest": digest, "imagePushedAt": image["pushed_at"]} for digest, image in images.items()
+            ]}
+        image_id = imageIds[0]
+        for digest, image in images.items():
+            if image_id.get("imageTag") == image["tag"] or image_id.get("imageDigest") == digest:
+                return {"imageDetails": [{"imageDigest": digest}]}
+        if image_id.get("imageDigest") in self.digests:
+            return {"imageDetails": [{"imageDigest": image_id["imageDigest"]}]}
+        raise self.exceptions.ImageNotFoundException()
+
+    def batch_get_image(self, repositoryName, imageIds, **kwargs):
+        images = self.registry(repositoryName)
+        return {"images": [
+            {"imageId": image_id, "imageManifest": images[image_id["imageDigest"]]["manifest"]}
+            for image_id in imageIds if image_id["imageDigest"] in images
+        ]}
+
+    def put_image(self, repositoryName, imageManifest, imageTag, **kwargs):
+        self.put_images.append(imageTag)
+        directory = self.out / "registry" / self.region / repositoryName
+        (directory / imageTag).write_text(json.loads(imageManifest)["config"]["digest"])
+
+    def upload_file(self, Filename, Bucket, Key):
+        self.uploads = getattr(self, "uploads", []) + [(Bucket, Key)]
+
+    def create_function(self, FunctionName, **kwargs):
+        if FunctionName in self.functions:
+            raise self.exceptions.ResourceConflictException()
+        self.functions[FunctionName] = kwargs
+        return {"FunctionArn": f"arn:aws:lambda:{self.region}:123456789012:function:{FunctionName}"}
+
+    def update_function_code(self, FunctionName, Publish=True, **code):
+        self.functions[FunctionName]["Code"] = code
+        return {"FunctionArn": f"arn:aws:lambda:{self.region}:123456789012:function:{FunctionName}"}
+
+    def update_function_configuration(self, FunctionName, **kwargs):
+        self.functions[FunctionName].update(kwargs)
+
+    def get_function_configuration(self, FunctionName):
+        if FunctionName not in self.functions:
+            raise self.exceptions.ResourceNotFoundException()
+        return {"FunctionName": FunctionName, "State": "Active", "LastUpdateStatus": "Successful"}
+
+    def get_waiter(self, name):
+        class Waiter:
+            def wait(self, **kwargs):
+                pass
+        return Waiter()
+
+    def publish_layer_version(self, LayerName, Content, **kwargs):
+        arn = f"arn:aws:lambda:{self.region}:123456789012:layer:{LayerName}:{len(self.layers) + 1}"
+        self.layers[arn] = Content
+        return {"LayerVersionArn": arn}
+
+    def get_layer_version_by_arn(self, Arn):
+        if Arn not in self.layers:
+            raise self.exceptions.ResourceNotFoundException()
+        return {"LayerVersionArn": Arn}
+
+
+class FakeToolchain:
+    def __init__(self, out, fake_client, clients):
+        self.out = out
+        self.fake_client = fake_client
+        self.clients = clients
+
+    @property
+    def client(self):
+        return self.fake_client("ecr", "us-west-2")
+
+    @property
+    def images(self):
+        return self.out / "images"
+
+    def build_count(self):
+        return len(os.listdir(self.images)) if self.images.exists() else 0
+
+    def commands(self):
+        log = self.out / "commands.log"
+        return log.read_text().splitlines() if log.exists() else []
+
+
+@pytest.fixture
+def fake_toolchain(tmp_path, monkeypatch):
+    from deployment.aws import deploy as deploy_module
+    from services import aws_services, build_cache, build_workspace, lambda_readiness, layer_manager
+    from services.warm_pool import WarmPool
+    from services.wheelhouse import Wheelhouse
+    from services.zip_packager import ZipPackageCache
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    write_fake_binary(bin_dir, "docker", FAKE_DOCKER)
+    write_fake_binary(bin_dir, "aws", FAKE_AWS)
+    write_fake_binary(bin_dir, "python3", FAKE_PYTHON3)
+    out = tmp_path / "docker-out"
+    out.mkdir()
+    clients = {}
+    fake_client = lambda service_name, region_name=None: clients.setdefault(
+        region_name or "us-west-2", FakeAWSClient(out, region_name or "us-west-2")
+    )
+
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_DOCKER_OUT", str(out))
+    monkeypatch.setattr(build_workspace, "BUILD_WORKSPACE_ROOT", str(tmp_path / "builds"))
+    monkeypatch.setattr(deploy_module, "build_cache", build_cache.BuildCache(str(tmp_path / "build_cache.sqlite3")))
+    monkeypatch.setattr(deploy_module, "wheelhouse", Wheelhouse(str(tmp_path / "wheelhouse")))
+    monkeypatch.setattr(deploy_module, "zip_packages", ZipPackageCache(str(tmp_path / "zip_packages")))
+    monkeypatch.setattr(build_cache, "get_aws_client", fake_client)
+    monkeypatch.setattr(layer_manager, "get_aws_client", fake_client)
+    monkeypatch.setattr(lambda_readiness, "get_aws_client", fake_client)
+    monkeypatch.setattr(deploy_module, "layer_manager", layer_manager.LayerManager(str(tmp_path / "layers.sqlite3")))
+    monkeypatch.setattr(deploy_module, "warm_pool", WarmPool(str(tmp_path / "warm_pool.sqlite3")))
+    monkeypatch.setattr(deploy_module, "get_account_id", lambda: "123456789012")
+    monkeypatch.setattr(deploy_module, "ensure_iam_role", lambda role_name, account_id: "arn:role")
+    monkeypatch.setattr(deploy_module, "get_aws_client", fake_client)
+    monkeypatch.setattr(aws_services, "get_aws_client", fake_client)
+    monkeypatch.setattr(deploy_module, "ecr_credentials", aws_services.ECRCredentialManager())
+    return FakeToolchain(out, fake_client, clients)
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from routers.costs_router import router as costs_router
+from services import aws_services
+from services.aws_services import call_aws, run_blocking
+
+SLOW_CALL_SECONDS = 0.3
+CONCURRENT_CALLS = 8
+
+
+class SlowCostExplorer:
+    def get_cost_and_usage(self, **kwargs):
+        time.sleep(SLOW_CALL_SECONDS)
+        return {"ResultsByTime": [{"TimePeriod": kwargs["TimePeriod"]}]}
+
+
+@pytest.fixture
+def slow_clients(monkeypatch):
+    monkeypatch.setattr(aws_services, "get_aws_client", lambda service_name, region_name=None: SlowCostExplorer())
+
+
+@pytest.mark.asyncio
+async def test_run_blocking_calls_overlap():
+    start = time.perf_counter()
+    await asyncio.gather(*(run_blocking(time.sleep, SLOW_CALL_SECONDS) for _ in range(CONCURRENT_CALLS)))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < SLOW_CALL_SECONDS * 2
+
+
+@pytest.mark.asyncio
+async def test_call_aws_does_not_block_event_loop(slow_clients):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        call_aws('ce', 'get_cost_and_usage', TimePeriod={"Start": "2024-01-01", "End": "2024-02-01"})
+        for _ in range(CONCURRENT_CALLS)
+    ))
+    elapsed = time.perf_counter() - start
+
+    assert len(results) == CONCURRENT_CALLS
+    assert elapsed < SLOW_CALL_SECONDS * 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_to_cost_endpoint(slow_clients):
+    app = FastAPI()
+    app.include_router(costs_router, prefix="/costs")
+    transport = ASGITransport(app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            ac.post("/costs/get-cost-and-usage", json={
+                "time_period": {"Start": "2024-01-01", "End": "2024-02-01"},
+                "metrics": ["UnblendedCost"],
+            })
+            for _ in range(CONCURRENT_CALLS)
+        ))
+        elapsed = time.perf_counter() - start
+
+    assert all(response.status_code == 200 for response in responses)
+    assert elapsed < SLOW_CALL_SECONDS * 2
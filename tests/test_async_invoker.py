@@ -0,0 +1,155 @@
+import json
+import sys
+import threading
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from routers.management_router import management_router
+from services import async_invoker as async_invoker_module
+from services.async_invoker import AsyncInvoker, LocalResultQueue, SQSResultQueue, FAILED, PENDING, SUCCEEDED
+
+QUEUE_ARN = "arn:aws:sqs:us-west-2:123456789012:agileagents-async-results"
+
+
+def destination_record(request_id, payload, error=None):
+    return {
+        "version": "1.0",
+        "requestContext": {"requestId": request_id, "condition": "RetriesExhausted" if error else "Success",
+                           "approximateInvokeCount": 3 if error else 1},
+        "requestPayload": payload,
+        "responseContext": {"statusCode": 200, "functionError": "Unhandled"} if error else {"statusCode": 200},
+        "responsePayload": {"errorMessage": error} if error else {"greeting": f"Hello {payload['name']}"},
+    }
+
+
+class FakeLambda:
+    """Queues Event invocations and delivers their records to a result queue after payload['delay_s']."""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self.invocations = []
+        self.event_invoke_configs = []
+
+    def put_function_event_invoke_config(self, FunctionName, DestinationConfig, **kwargs):
+        self.event_invoke_configs.append((FunctionName, DestinationConfig))
+
+    def invoke(self, FunctionName, InvocationType, Payload, **kwargs):
+        payload = json.loads(Payload)
+        request_id = str(uuid.uuid4())
+        self.invocations.append((FunctionName, InvocationType, payload))
+        if not payload.get("lost"):
+            record = destination_record(request_id, payload, payload.get("error"))
+            threading.Timer(payload.get("delay_s", 0), self.deliver, (record,)).start()
+        return {"StatusCode": 202, "ResponseMetadata": {"RequestId": request_id}}
+
+
+class FakeSQS:
+    def __init__(self):
+        self.messages = []
+        self.deleted = []
+
+    def create_queue(self, QueueName):
+        return {"QueueUrl": f"https://sqs.us-west-2.amazonaws.com/123456789012/{QueueName}"}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames):
+        return {"Attributes": {"QueueArn": QUEUE_ARN}}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds):
+        messages, self.messages = self.messages[:MaxNumberOfMessages], self.messages[MaxNumberOfMessages:]
+        return {"Messages": messages}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.deleted.extend(entry["ReceiptHandle"] for entry in Entries)
+
+
+@pytest.fixture
+def local_invoker(tmp_path, monkeypatch):
+    result_queue = LocalResultQueue()
+    fake = FakeLambda(result_queue.put)
+    invoker = AsyncInvoker(str(tmp_path / "async_invocations.sqlite3"), queue_factory=lambda region: result_queue)
+    monkeypatch.setattr(async_invoker_module, "get_aws_client", lambda service_name, region_name=None: fake)
+    monkeypatch.setattr(async_invoker_module, "ASYNC_RESULTS_WAIT_S", 0.05)
+    monkeypatch.setattr(sys.modules["routers.management_router"], "async_invoker", invoker)
+    fake.invoker = invoker
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_event_invocation_results_are_collected_and_polled(local_invoker):
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        submitted = await ac.post("/management/invoke-lambda/async",
+                                  json={"function_name": "agent", "payload": {"name": "World", "delay_s": 0.1},
+                                        "correlation_id": "job-1"})
+        failing = await ac.post("/management/invoke-lambda/async",
+                                json={"function_name": "agent", "payload": {"name": "World", "error": "boom"}})
+        duplicate = await ac.post("/management/invoke-lambda/async",
+                                  json={"function_name": "agent", "payload": {}, "correlation_id": "job-1"})
+        polled = (await ac.get("/management/async-invocations/job-1")).json()
+        done = (await ac.get("/management/async-invocations/job-1?wait_s=5")).json()
+        failed = (await ac.get(f"/management/async-invocations/{failing.json()['correlation_id']}?wait_s=5")).json()
+        missing = await ac.get("/management/async-invocations/nope")
+    await local_invoker.invoker.stop()
+
+    assert submitted.status_code == 202 and submitted.json()["status"] == PENDING
+    assert [call[1] for call in local_invoker.invocations] == ["Event", "Event"]
+    # The local stand-in has no ARN, so no destination is configured on the function
+    assert local_invoker.event_invoke_configs == []
+    assert duplicate.status_code == 409
+    assert polled["status"] == PENDING
+    assert done["status"] == SUCCEEDED and done["response"] == {"greeting": "Hello World"}
+    assert done["request_id"] == submitted.json()["request_id"] and done["turnaround_s"] >= 0.1
+    assert (failed["status"], failed["function_error"], failed["attempts"]) == (FAILED, "Unhandled", 3)
+    assert failed["response"] == {"errorMessage": "boom"}
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_results_stream_in_completion_order(local_invoker):
+    invoker = local_invoker.invoker
+    slow = invoker.invoke("agent", {"name": "slow", "delay_s": 0.3}, "us-west-2")
+    fast = invoker.invoke("agent", {"name": "fast", "delay_s": 0.05}, "us-west-2")
+    lost = invoker.invoke("agent", {"name": "lost", "lost": True}, "us-west-2")
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+    ids = ",".join([slow["correlation_id"], fast["correlation_id"], lost["correlation_id"], "unknown"])
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.get(f"/management/async-invocations/stream?correlation_ids={ids}&timeout_s=1")
+    await invoker.stop()
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    results = [r for r in records if r["type"] == "result"]
+    assert [r["correlation_id"] for r in results] == [fast["correlation_id"], slow["correlation_id"], lost["correlation_id"]]
+    assert [r["status"] for r in results] == [SUCCEEDED, SUCCEEDED, PENDING]
+    assert records[-1] == {"type": "summary", "total": 4, "statuses": {SUCCEEDED: 2, PENDING: 1}, "unknown": 1}
+
+
+def test_sqs_destination_records_match_even_when_they_arrive_first(tmp_path, monkeypatch):
+    sqs = FakeSQS()
+    fake = FakeLambda(lambda record: None)
+    clients = {"sqs": sqs, "lambda": fake}
+    monkeypatch.setattr(async_invoker_module, "get_aws_client", lambda service_name, region_name=None: clients[service_name])
+    invoker = AsyncInvoker(str(tmp_path / "async_invocations.sqlite3"),
+                           queue_factory=lambda region: SQSResultQueue(region))
+    fake.invoke = lambda **kwargs: {"ResponseMetadata": {"RequestId": "req-1"}}
+
+    destination = invoker.configure_destination("agent", "us-west-2")
+    # The record is received before the invocation that produced it is stored
+    sqs.messages.append({"Body": json.dumps(destination_record("req-1", {"name": "World"})), "ReceiptHandle": "r-1"})
+    messages = invoker.queue("us-west-2").receive()
+    assert invoker.record_result(messages[0][0]) is None
+    invoker.queue("us-west-2").delete([receipt for _, receipt in messages])
+    invocation = invoker.invoke("agent", {"name": "World"}, "us-west-2")
+
+    assert destination == QUEUE_ARN
+    assert fake.event_invoke_configs == [("agent", {"OnSuccess": {"Destination": QUEUE_ARN},
+                                                    "OnFailure": {"Destination": QUEUE_ARN}})]
+    assert sqs.deleted == ["r-1"]
+    assert invocation["status"] == SUCCEEDED and invocation["response"] == {"greeting": "Hello World"}
+    assert invoker.pending_regions() == []
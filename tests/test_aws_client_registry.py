@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from services import aws_services
+from services.aws_services import configure_aws_clients, get_aws_client, invalidate_aws_clients
+
+
+@pytest.fixture(autouse=True)
+def aws_env(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    invalidate_aws_clients()
+    yield
+    invalidate_aws_clients()
+
+
+def test_clients_are_reused_per_service_and_region():
+    first = get_aws_client("lambda", region_name="us-east-1")
+    assert get_aws_client("lambda", region_name="us-east-1") is first
+    assert get_aws_client("lambda", region_name="eu-west-1") is not first
+    assert get_aws_client("ecr", region_name="us-east-1") is not first
+
+
+def test_default_region_resolves_to_same_client():
+    assert get_aws_client("lambda") is get_aws_client("lambda", region_name="us-west-2")
+
+
+def test_concurrent_lookups_create_a_single_client():
+    clients = []
+
+    def lookup():
+        clients.append(get_aws_client("sqs", region_name="us-east-1"))
+
+    threads = [threading.Thread(target=lookup) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in clients}) == 1
+
+
+def test_invalidation_is_scoped():
+    lambda_client = get_aws_client("lambda", region_name="us-east-1")
+    ecr_client = get_aws_client("ecr", region_name="us-east-1")
+
+    assert invalidate_aws_clients(service_name="lambda") == 1
+    assert get_aws_client("lambda", region_name="us-east-1") is not lambda_client
+    assert get_aws_client("ecr", region_name="us-east-1") is ecr_client
+
+
+def test_configure_applies_pool_and_retry_settings(monkeypatch):
+    monkeypatch.setattr(aws_services, "AWS_MAX_POOL_CONNECTIONS", aws_services.AWS_MAX_POOL_CONNECTIONS)
+    monkeypatch.setattr(aws_services, "AWS_MAX_ATTEMPTS", aws_services.AWS_MAX_ATTEMPTS)
+    old = get_aws_client("lambda", region_name="us-east-1")
+
+    configure_aws_clients(max_pool_connections=7, max_attempts=2)
+    client = get_aws_client("lambda", region_name="us-east-1")
+
+    assert client is not old
+    assert client.meta.config.max_pool_connections == 7
+    assert client.meta.config.retries["total_max_attempts"] == 2
+
+
+def test_credential_rotation_does_not_grow_the_registry(monkeypatch):
+    session = aws_services.get_aws_session()
+    first = get_aws_client("lambda", region_name="us-east-1")
+    credentials = session.get_credentials()
+    for i in range(5):
+        # Refreshed temporary credentials come with a new access key each time
+        monkeypatch.setattr(credentials, "access_key", f"ASIA{i}", raising=False)
+        assert get_aws_client("lambda", region_name="us-east-1") is first
+
+    assert len(aws_services._clients) == 1
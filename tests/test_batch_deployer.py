@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from models.base_models import FunctionConfig
+from services import batch_deployer, lambda_readiness
+from services.batch_deployer import AdaptiveBackoff, deploy_functions
+from services.lambda_readiness import function_lock
+from services.warm_pool import WarmPool
+
+
+class FakeExceptions:
+    class ResourceConflictException(Exception):
+        pass
+
+    class ResourceAlreadyExistsException(Exception):
+        pass
+
+
+class FakeLambdaAndLogs:
+    exceptions = FakeExceptions
+
+    def __init__(self, existing=(), throttle_first=0):
+        self.existing = set(existing)
+        self.throttles_left = throttle_first
+        self.created = []
+        self.updated = []
+        self.updating = set()
+        self.configured = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def create_function(self, FunctionName, **kwargs):
+        with self.lock:
+            if self.throttles_left:
+                self.throttles_left -= 1
+                raise ClientError({"Error": {"Code": "TooManyRequestsException"}}, "CreateFunction")
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.05)
+            if FunctionName in self.existing:
+                raise FakeExceptions.ResourceConflictException()
+            self.created.append(FunctionName)
+            return {"FunctionArn": f"arn:{FunctionName}"}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def update_function_code(self, FunctionName, **kwargs):
+        self.updated.append(FunctionName)
+        self.updating.add(FunctionName)
+
+    def update_function_configuration(self, FunctionName, **kwargs):
+        if FunctionName in self.updating:
+            raise FakeExceptions.ResourceConflictException("An update is in progress")
+        self.configured.append(FunctionName)
+
+    def get_function_configuration(self, FunctionName):
+        # Each update finishes after one poll
+        self.updating.discard(FunctionName)
+        return {"State": "Active", "LastUpdateStatus": "Successful"}
+
+    def create_log_group(self, **kwargs):
+        pass
+
+    def put_retention_policy(self, **kwargs):
+        pass
+
+
+@pytest.fixture
+def fake_aws(tmp_path, monkeypatch):
+    fake = FakeLambdaAndLogs()
+    prepared = []
+
+    def prepare_batch(repository_name, image_tag, region):
+        prepared.append(region)
+        return {"account_id": "123", "role_arn": "arn:role", "region": region, "image_uri": "uri"}
+
+    monkeypatch.setattr(batch_deployer, "prepare_batch", prepare_batch)
+    monkeypatch.setattr(batch_deployer, "get_aws_client", lambda service_name, region_name=None: fake)
+    monkeypatch.setattr(lambda_readiness, "get_aws_client", lambda service_name, region_name=None: fake)
+    monkeypatch.setattr(batch_deployer, "warm_pool", WarmPool(str(tmp_path / "warm_pool.sqlite3")))
+    fake.prepared = prepared
+    return fake
+
+
+def make_config(**overrides):
+    values = dict(
+        repository_name="repo", image_tag="latest", function_name_prefix="agent", number_of_functions=12,
+        vpc_id="vpc", subnet_ids=["subnet"], security_group_ids=["sg"], max_workers=4,
+    )
+    values.update(overrides)
+    return FunctionConfig(**values)
+
+
+@pytest.mark.asyncio
+async def test_functions_deploy_in_parallel_after_shared_setup(fake_aws):
+    fake_aws.existing = {"agent-3"}
+    names = [f"agent-{i}" for i in range(12)]
+
+    outcome = await deploy_functions(names, make_config(), "us-west-2")
+
+    assert fake_aws.prepared == ["us-west-2"]
+    assert fake_aws.max_in_flight == 4
+    assert [r["function_name"] for r in outcome["results"]] == names
+    assert outcome["results"][3]["action"] == "updated"
+    # The configuration update waited for the code update to finish
+    assert fake_aws.configured == ["agent-3"]
+    assert all(r["time_to_ready_s"] >= 0 for r in outcome["results"])
+    assert outcome["summary"]["succeeded"] == 12
+    assert outcome["summary"]["functions_per_minute"] > 0
+
+
+@pytest.mark.asyncio
+async def test_throttling_is_retried_with_backoff(fake_aws):
+    fake_aws.throttles_left = 3
+
+    outcome = await deploy_functions(["agent-0", "agent-1"], make_config(max_workers=2), "us-west-2")
+
+    assert outcome["summary"]["succeeded"] == 2
+    assert outcome["summary"]["throttled"] == 3
+    assert sum(r["attempts"] for r in outcome["results"]) > 2 * 3
+
+
+@pytest.mark.asyncio
+async def test_function_updates_wait_for_the_function_lock(fake_aws):
+    fake_aws.existing = {"agent-1"}
+    lock = function_lock("agent-1", "us-west-2")
+    await lock.acquire()
+
+    batch = asyncio.ensure_future(deploy_functions(["agent-0", "agent-1"], make_config(max_workers=1), "us-west-2"))
+    await asyncio.sleep(0.3)
+    # agent-0 went ahead on the only worker slot; agent-1 waits for whoever holds its lock
+    assert fake_aws.created == ["agent-0"] and fake_aws.updated == []
+    lock.release()
+    outcome = await batch
+
+    assert outcome["summary"]["succeeded"] == 2
+    assert fake_aws.updated == ["agent-1"] and fake_aws.configured == ["agent-1"]
+
+
+def test_backoff_grows_on_throttle_and_decays_on_success():
+    backoff = AdaptiveBackoff(base_delay=0.1, max_delay=0.4)
+    for _ in range(5):
+        backoff.on_throttle()
+    assert backoff.delay == 0.4
+
+    backoff.on_success()
+    assert backoff.delay == 0.2
+    backoff.on_success()
+    backoff.on_success()
+    assert backoff.delay == 0.0
@@ -0,0 +1,72 @@
+import pytest
+
+from deployment.aws import deploy as deploy_module
+from services.build_cache import BuildCache, compute_context_hash
+from services.deploy_jobs import DeployJobManager, JobStore
+
+
+def deploy_request(**overrides):
+    request = {
+        "python_script": "def lambda_handler(event, context):\n    return 'ok'\n",
+        "requirements": "requests\n",
+        "repository_name": "agents",
+        "image_tag": "v1",
+        "region": "us-west-2",
+        "function_name": "agent-0",
+    }
+    request.update(overrides)
+    return request
+
+
+@pytest.fixture
+def manager(tmp_path, fake_toolchain):
+    manager = DeployJobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")))
+    manager.register("dockerdeploy", deploy_module.run_deploy_pipeline)
+    return manager
+
+
+def test_context_hash_tracks_paths_and_contents(tmp_path):
+    (tmp_path / "app.py").write_text("a")
+    (tmp_path / "requirements.txt").write_text("b")
+    first = compute_context_hash(str(tmp_path))
+
+    assert compute_context_hash(str(tmp_path)) == first
+    (tmp_path / "requirements.txt").write_text("c")
+    assert compute_context_hash(str(tmp_path)) != first
+
+
+@pytest.mark.asyncio
+async def test_identical_redeploy_skips_build_and_push(manager, fake_toolchain):
+    first = await manager.wait(manager.submit("dockerdeploy", deploy_request()))
+    second = await manager.wait(manager.submit("dockerdeploy", deploy_request(function_name="agent-1", image_tag="v2")))
+
+    assert first["result"]["build_cache"] == "miss"
+    assert second["result"]["build_cache"] == "hit"
+    assert fake_toolchain.build_count() == 1
+    assert "docker_build" not in [stage["name"] for stage in second["stages"]]
+    # The cached image is deployed pinned to its digest
+    assert second["result"]["image_uri"].startswith("123456789012.dkr.ecr.us-west-2.amazonaws.com/agents@sha256:")
+    assert fake_toolchain.client.functions["agent-1"]["Code"]["ImageUri"] == second["result"]["image_uri"]
+
+
+@pytest.mark.asyncio
+async def test_changed_inputs_or_disabled_cache_rebuild(manager, fake_toolchain):
+    await manager.wait(manager.submit("dockerdeploy", deploy_request()))
+    changed = await manager.wait(manager.submit("dockerdeploy", deploy_request(requirements="numpy\n", image_tag="v2")))
+    disabled = await manager.wait(manager.submit("dockerdeploy", deploy_request(image_tag="v3", use_build_cache=False)))
+
+    assert changed["result"]["build_cache"] == "miss"
+    assert disabled["result"]["build_cache"] == "disabled"
+    assert fake_toolchain.build_count() == 3
+
+
+def test_entries_for_deleted_images_are_evicted(tmp_path, fake_toolchain, monkeypatch):
+    cache = BuildCache(str(tmp_path / "cache.sqlite3"))
+    cache.store("hash", "agents", "us-west-2", "uri/agents:v1", "sha256:gone")
+
+    assert cache.lookup("hash", "agents", "us-west-2") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["evictions"] == 1
+
+    cache.store("hash", "agents", "us-west-2", "uri/agents:v1", "sha256:kept")
+    assert cache.purge(repository_name="agents") == 1
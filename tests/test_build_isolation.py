@@ -0,0 +1,65 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from deployment.aws import deploy as deploy_module
+from services.build_workspace import BuildWorkspace, WorkspaceQuotaExceeded, cleanup_stale_workspaces
+from services.deploy_jobs import DeployJobManager, JobStore
+
+CONCURRENT_DEPLOYS = 12
+
+@pytest.mark.asyncio
+async def test_concurrent_deploys_do_not_cross_contaminate(tmp_path, fake_toolchain):
+    manager = DeployJobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")), max_workers=CONCURRENT_DEPLOYS)
+    manager.register("dockerdeploy", deploy_module.run_deploy_pipeline)
+
+    job_ids = [
+        manager.submit("dockerdeploy", {
+            "python_script": f"AGENT = {i}\n",
+            "requirements": f"agent-dependency-{i}\n",
+            "repository_name": "agents",
+            "image_tag": f"v{i}",
+            "region": "us-west-2",
+            "function_name": f"agent-{i}",
+        })
+        for i in range(CONCURRENT_DEPLOYS)
+    ]
+    jobs = await asyncio.gather(*(manager.wait(job_id) for job_id in job_ids))
+
+    assert [job["status"] for job in jobs] == ["succeeded"] * CONCURRENT_DEPLOYS
+    images = fake_toolchain.images
+    for i, job in enumerate(jobs):
+        local_image = (fake_toolchain.out / "tags" / f"agents:v{i}").read_text()
+        context = images / local_image
+        assert (context / "app.py").read_text() == f"AGENT = {i}\n"
+        assert (context / "requirements.txt").read_text() == f"agent-dependency-{i}\n"
+        assert not (context / "venv").exists()
+        assert job["result"]["lambda_arn"].endswith(f"agent-{i}")
+    assert len(os.listdir(images)) == CONCURRENT_DEPLOYS
+    # Every workspace is removed once its build finishes
+    assert os.listdir(tmp_path / "builds") == []
+
+
+def test_workspace_quota_and_path_safety(tmp_path):
+    with BuildWorkspace(root=str(tmp_path), quota_bytes=10) as workspace:
+        workspace.write_text("app.py", "x" * 8)
+        with pytest.raises(WorkspaceQuotaExceeded):
+            workspace.write_text("more.py", "x" * 8)
+        with pytest.raises(ValueError):
+            workspace.context_path("..", "..", "etc", "passwd")
+        path = workspace.path
+    assert not os.path.exists(path)
+
+
+def test_stale_workspaces_are_removed_except_queued_ones(tmp_path):
+    stale, queued, recent = (BuildWorkspace(name, root=str(tmp_path)).create() for name in ("stale", "queued", "recent"))
+    old = time.time() - 7 * 3600
+    for workspace in (stale, queued):
+        os.utime(workspace.path, (old, old))
+
+    removed = cleanup_stale_workspaces(root=str(tmp_path), keep={"queued", None})
+
+    assert removed == 1
+    assert sorted(os.listdir(tmp_path)) == ["queued", "recent"]
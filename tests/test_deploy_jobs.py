@@ -0,0 +1,204 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from deployment.aws.deploy import deploy_router
+from services.deploy_jobs import DeployJobManager, IdempotencyKeyConflict, JobStore, deploy_jobs
+
+
+async def quick_pipeline(job, request):
+    async with job.stage("build"):
+        job.log(f"building {request['name']}")
+        await asyncio.sleep(0.01)
+    async with job.stage("push"):
+        await asyncio.sleep(0.01)
+    return {"message": "ok", "name": request["name"]}
+
+
+async def failing_pipeline(job, request):
+    async with job.stage("build"):
+        raise RuntimeError("docker build failed")
+
+
+async def fake_deploy_pipeline(job, request):
+    async with job.stage("create_or_update_function"):
+        return {"message": "Deployment successful", "function_name": request["function_name"]}
+
+
+async def slow_pipeline(job, request):
+    async with job.stage("build"):
+        await asyncio.sleep(10)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = DeployJobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")), max_workers=2)
+    manager.register("quick", quick_pipeline)
+    manager.register("failing", failing_pipeline)
+    manager.register("slow", slow_pipeline)
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_job_records_stages_logs_and_result(manager):
+    job_id = manager.submit("quick", {"name": "agent"})
+    assert manager.get(job_id)["status"] == "queued"
+
+    job = await manager.wait(job_id)
+
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"message": "ok", "name": "agent"}
+    assert [stage["name"] for stage in job["stages"]] == ["build", "push"]
+    assert all(stage["status"] == "succeeded" and stage["duration_s"] >= 0 for stage in job["stages"])
+    assert "building agent" in job["logs"]
+
+
+@pytest.mark.asyncio
+async def test_failed_stage_is_reported(manager):
+    job = await manager.wait(manager.submit("failing", {}))
+
+    assert job["status"] == "failed"
+    assert job["error"] == "docker build failed"
+    assert job["stages"][0]["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_is_bounded_and_jobs_can_be_cancelled(manager):
+    job_ids = [manager.submit("slow", {}) for _ in range(3)]
+    await asyncio.sleep(0.05)
+
+    statuses = [manager.get(job_id)["status"] for job_id in job_ids]
+    assert statuses == ["running", "running", "queued"]
+
+    cancelled = [await manager.cancel(job_id) for job_id in job_ids]
+    assert [job["status"] for job in cancelled] == ["cancelled"] * 3
+
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    running_id = store.create("quick", {"name": "a"})
+    store.update(running_id, status="running")
+    queued_id = store.create("quick", {"name": "b"})
+
+    retired_id = store.create("retired-kind", {})
+
+    restarted = DeployJobManager(store=JobStore(path))
+    restarted.register("quick", quick_pipeline)
+    # What the application lifespan does at startup, before any request arrives
+    restarted.ensure_started()
+
+    assert restarted.get(running_id)["status"] == "interrupted"
+    assert restarted.get(retired_id)["status"] == "interrupted"
+    assert (await restarted.wait(queued_id))["status"] == "succeeded"
+
+
+@pytest.mark.asyncio
+async def test_background_deploy_returns_job_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(deploy_jobs, "_store", JobStore(str(tmp_path / "jobs.sqlite3")))
+    monkeypatch.setitem(deploy_jobs._runners, "deploy", fake_deploy_pipeline)
+    app = FastAPI()
+    app.include_router(deploy_router, prefix="/deployment")
+    body = {
+        "python_script": "def lambda_handler(event, context): pass", "requirements": "",
+        "repository_name": "repo", "image_tag": "latest", "region": "us-west-2", "function_name": "agent",
+    }
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.post("/deployment/deploy?background=true", json=body)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        await deploy_jobs.wait(job_id)
+
+        job = (await ac.get(f"/deployment/jobs/{job_id}")).json()
+        listing = (await ac.get("/deployment/jobs")).json()
+        missing = await ac.get("/deployment/jobs/unknown")
+
+    assert job["status"] == "succeeded"
+    assert job["result"]["function_name"] == "agent"
+    assert listing["jobs"][0]["job_id"] == job_id
+    assert "logs" not in listing["jobs"][0]
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_attach_to_the_in_flight_job(manager):
+    first, reused_first = manager.submit_once("quick", {"name": "agent"}, single_flight_key="agent")
+    second, reused_second = manager.submit_once("quick", {"name": "agent"}, single_flight_key="agent")
+    other, _ = manager.submit_once("quick", {"name": "other"}, single_flight_key="other")
+
+    assert (second, reused_first, reused_second) == (first, None, "in_flight")
+    assert other != first
+    await manager.wait(first)
+    # Once the job has finished, the same request starts a new build
+    again, reused_again = manager.submit_once("quick", {"name": "agent"}, single_flight_key="agent")
+    assert (reused_again, again != first) == (None, True)
+    await manager.wait(again)
+
+
+@pytest.mark.asyncio
+async def test_idempotency_key_replays_its_job(manager, monkeypatch):
+    from services import deploy_jobs as deploy_jobs_module
+
+    job_id, _ = manager.submit_once("quick", {"name": "agent"}, idempotency_key="key-1")
+    await manager.wait(job_id)
+
+    replayed, reused = manager.submit_once("quick", {"name": "agent", "workspace_id": "x"},
+                                           idempotency_key="key-1", ignore_fields=("workspace_id",))
+    assert (replayed, reused) == (job_id, "idempotency_key")
+    with pytest.raises(IdempotencyKeyConflict):
+        manager.submit_once("quick", {"name": "changed"}, idempotency_key="key-1")
+
+    monkeypatch.setattr(deploy_jobs_module, "DEPLOY_IDEMPOTENCY_TTL_S", -1)
+    expired, reused = manager.submit_once("quick", {"name": "agent"}, idempotency_key="key-1")
+    assert (expired != job_id, reused) == (True, None)
+    await manager.wait(expired)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_deploys_build_once_and_serialize_function_updates(tmp_path, fake_toolchain, monkeypatch):
+    monkeypatch.setattr(deploy_jobs, "_store", JobStore(str(tmp_path / "jobs.sqlite3")))
+    client = fake_toolchain.client
+    active, overlaps = [], []
+    create_function = client.create_function
+
+    def slow_create_function(**kwargs):
+        overlaps.append(len(active))
+        active.append(1)
+        time.sleep(0.05)
+        try:
+            return create_function(**kwargs)
+        finally:
+            active.pop()
+
+    monkeypatch.setattr(client, "create_function", slow_create_function)
+    app = FastAPI()
+    app.include_router(deploy_router, prefix="/deployment")
+    body = {
+        "python_script": "def lambda_handler(event, context): pass", "requirements": "",
+        "repository_name": "repo", "image_tag": "latest", "region": "us-west-2", "function_name": "agent",
+    }
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test", timeout=30) as ac:
+        responses = await asyncio.gather(
+            ac.post("/deployment/deploy", json=body, headers={"Idempotency-Key": "retry-1"}),
+            ac.post("/deployment/deploy", json=body),
+            ac.post("/deployment/deploy", json={**body, "image_tag": "v2", "python_script": "X = 2"}),
+        )
+        retried = await ac.post("/deployment/deploy", json=body, headers={"Idempotency-Key": "retry-1"})
+        conflict = await ac.post("/deployment/deploy", json={**body, "image_tag": "v3"},
+                                 headers={"Idempotency-Key": "retry-1"})
+
+    first, duplicate, different = (response.json() for response in responses)
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert duplicate["job_id"] == first["job_id"] and duplicate["deduplicated"] == "in_flight"
+    assert different["job_id"] != first["job_id"]
+    assert fake_toolchain.build_count() == 2
+    # The two different deploys of "agent" never called Lambda at the same time
+    assert overlaps == [0, 0]
+    assert retried.json()["job_id"] == first["job_id"] and retried.json()["deduplicated"] == "idempotency_key"
+    assert conflict.status_code == 422
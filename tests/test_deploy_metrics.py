@@ -0,0 +1,56 @@
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from deployment.aws.deploy import deploy_router
+from services import deploy_metrics
+from services.deploy_jobs import JobStore, deploy_jobs
+from services.deploy_metrics import summarize_stages
+
+
+def test_summarize_stages_groups_regions_and_reports_percentiles():
+    jobs = [
+        {"duration_s": 10.0, "stages": [
+            {"name": "docker_build", "status": "succeeded", "duration_s": float(i), "bytes": 100},
+            {"name": f"docker_push[{region}]", "status": "succeeded", "duration_s": 2.0, "bytes": None},
+        ]}
+        for i, region in zip(range(1, 21), ["us-east-1", "eu-west-1"] * 10)
+    ]
+    jobs[0]["stages"].append({"name": "create_or_update_function", "status": "failed", "duration_s": 0.5})
+
+    summary = summarize_stages(jobs)
+
+    assert summary["jobs"] == 20
+    build = summary["stages"]["docker_build"]
+    assert (build["count"], build["p50_s"], build["p95_s"], build["max_s"]) == (20, 10.0, 19.0, 20.0)
+    assert (build["bytes_p50"], build["bytes_total"]) == (100, 2000)
+    assert summary["stages"]["docker_push"]["count"] == 20
+    assert summary["stages"]["docker_push"]["bytes_total"] is None
+    assert summary["stages"]["create_or_update_function"]["outcomes"] == {"failed": 1}
+    # Slowest stages first
+    assert list(summary["stages"])[0] == "docker_build"
+
+
+@pytest.mark.asyncio
+async def test_deploy_response_and_metrics_endpoint_report_stages(tmp_path, fake_toolchain, monkeypatch):
+    monkeypatch.setattr(deploy_jobs, "_store", JobStore(str(tmp_path / "jobs.sqlite3")))
+    app = FastAPI()
+    app.include_router(deploy_router, prefix="/deployment")
+    body = {
+        "python_script": "def lambda_handler(event, context): pass", "requirements": "",
+        "repository_name": "repo", "image_tag": "latest", "region": "us-west-2", "function_name": "agent",
+    }
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test", timeout=30) as ac:
+        deployed = (await ac.post("/deployment/deploy", json=body)).json()
+        metrics = (await ac.get("/deployment/metrics")).json()
+        prometheus = await ac.get("/deployment/metrics/prometheus")
+
+    stages = {stage["name"]: stage for stage in deployed["stages"]}
+    assert {"write_sources", "docker_build", "docker_push", "create_or_update_function"} <= set(stages)
+    assert all(stage["status"] == "succeeded" and stage["duration_s"] >= 0 for stage in stages.values())
+    assert stages["write_sources"]["bytes"] == stages["docker_build"]["bytes"] > 0
+    assert metrics["jobs"] == 1
+    assert metrics["stages"]["docker_build"]["count"] == 1
+    assert metrics["stages"]["docker_build"]["p95_s"] == stages["docker_build"]["duration_s"]
+    assert prometheus.status_code == (200 if deploy_metrics.Histogram is not None else 501)
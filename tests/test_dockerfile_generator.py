@@ -0,0 +1,33 @@
+from services.dockerfile_generator import generate_dockerfile, pip_install_instruction
+
+
+def test_dependency_layer_comes_before_code():
+    dockerfile = generate_dockerfile(
+        "python:3.11-slim", '["app.lambda_handler"]',
+        build_commands=["yum install -y git"], pip_cache_mount=False
+    ).splitlines()
+
+    assert dockerfile == [
+        "FROM python:3.11-slim",
+        "COPY requirements.txt .",
+        "RUN pip install --no-cache-dir -r requirements.txt",
+        "RUN yum install -y git",
+        "COPY . .",
+        'CMD ["app.lambda_handler"]',
+    ]
+
+
+def test_source_files_and_no_requirements():
+    dockerfile = generate_dockerfile("base", '["app.handler"]', source_files=["app.py"], requirements_file=None)
+
+    assert dockerfile == 'FROM base\nCOPY app.py ./\nCMD ["app.handler"]\n'
+
+
+def test_buildkit_mounts():
+    assert pip_install_instruction(pip_cache_mount=True) == (
+        "RUN --mount=type=cache,target=/root/.cache/pip pip install -r requirements.txt"
+    )
+    assert pip_install_instruction(wheelhouse=True, pip_cache_mount=False) == (
+        "RUN --mount=type=bind,from=wheelhouse,target=/wheelhouse "
+        "pip install --no-index --find-links /wheelhouse --no-cache-dir -r requirements.txt"
+    )
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from deployment.aws import deploy as deploy_module
+from services.aws_services import ECRCredentialManager
+from services.deploy_jobs import DeployJobManager, JobStore
+
+
+def test_token_and_login_are_reused_until_near_expiry(fake_toolchain):
+    manager = ECRCredentialManager(refresh_margin=1800)
+
+    first = manager.ensure_docker_login("us-west-2")
+    second = manager.ensure_docker_login("us-west-2")
+
+    assert first == {"registry": "123456789012.dkr.ecr.us-west-2.amazonaws.com", "logged_in": True}
+    assert second["logged_in"] is False
+    assert manager.stats()["token_fetches"] == 1
+    assert sum(command.startswith("login") for command in fake_toolchain.commands()) == 1
+
+    # A token inside the refresh margin is replaced and Docker logs in again
+    manager.refresh_margin = 13 * 3600
+    assert manager.ensure_docker_login("us-west-2")["logged_in"] is True
+    assert manager.stats()["token_fetches"] == 2
+
+
+def test_concurrent_logins_share_one_fetch(fake_toolchain):
+    manager = ECRCredentialManager()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: manager.ensure_docker_login("us-west-2"), range(8)))
+
+    assert sum(result["logged_in"] for result in results) == 1
+    assert manager.stats() == {"cached_tokens": 1, "token_fetches": 1, "docker_logins": 1, "reused_logins": 7}
+
+
+@pytest.mark.asyncio
+async def test_deploys_reuse_the_docker_login(tmp_path, fake_toolchain):
+    manager = DeployJobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")))
+    manager.register("dockerdeploy", deploy_module.run_deploy_pipeline)
+    for i in range(3):
+        job = await manager.wait(manager.submit("dockerdeploy", {
+            "python_script": f"AGENT = {i}\n",
+            "requirements": "requests\n",
+            "repository_name": "agents",
+            "image_tag": f"v{i}",
+            "region": "us-west-2",
+            "function_name": f"agent-{i}",
+        }))
+        assert job["status"] == "succeeded"
+
+    commands = fake_toolchain.commands()
+    assert sum(command.startswith("login") for command in commands) == 1
+    assert sum(command.startswith("push") for command in commands) == 3
+
+
+@pytest.mark.asyncio
+async def test_identical_image_is_tagged_without_pushing(tmp_path, fake_toolchain):
+    manager = DeployJobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")))
+    manager.register("dockerdeploy", deploy_module.run_deploy_pipeline)
+    request = {
+        "python_script": "AGENT = 1\n",
+        "requirements": "requests\n",
+        "repository_name": "agents",
+        "region": "us-west-2",
+        "use_build_cache": False,
+    }
+    first = await manager.wait(manager.submit("dockerdeploy", {**request, "image_tag": "v1", "function_name": "a"}))
+    second = await manager.wait(manager.submit("dockerdeploy", {**request, "image_tag": "v2", "function_name": "b"}))
+
+    assert first["result"]["push_skipped"] is False
+    assert second["result"]["push_skipped"] is True
+    assert second["result"]["push_bytes_avoided"] == 1100
+    assert second["result"]["image_uri"].endswith("/agents:v2")
+    assert fake_toolchain.client.put_images == ["v2"]
+    assert sum(command.startswith("push") for command in fake_toolchain.commands()) == 1
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from routers.management_router import management_router
+from services import lambda_invoker
+from services.lambda_invoker import invoke_many
+
+
+class FakeLambda:
+    def __init__(self, delay=0.05, failing=(), slow=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.slow = set(slow)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, function_name, payload, region_name=None, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(1.0 if function_name in self.slow else self.delay)
+            if function_name in self.failing:
+                raise RuntimeError(f"{function_name} failed")
+            return {"payload": {"echo": payload, "function": function_name}, "function_error": None}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_lambda(monkeypatch):
+    fake = FakeLambda()
+    monkeypatch.setattr(lambda_invoker, "invoke_lambda_function", fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_fan_out_is_bounded_and_concurrent(fake_lambda):
+    names = [f"fn-{i}" for i in range(20)]
+
+    outcome = await invoke_many(names, {"name": "World"}, max_concurrency=5)
+
+    assert fake_lambda.max_in_flight == 5
+    assert [r["function_name"] for r in outcome["results"]] == names
+    assert outcome["summary"]["succeeded"] == 20
+    # 20 calls of 50 ms at concurrency 5 take about 4 rounds, not 20.
+    assert outcome["summary"]["wall_time_ms"] < 20 * 50 / 2
+    assert all(r["latency_ms"] >= 40 for r in outcome["results"])
+
+
+@pytest.mark.asyncio
+async def test_partial_failures_do_not_abort(fake_lambda):
+    fake_lambda.failing = {"fn-1"}
+    fake_lambda.slow = {"fn-2"}
+
+    outcome = await invoke_many(["fn-0", "fn-1", "fn-2", "fn-3"], {}, max_concurrency=4, timeout_seconds=0.3)
+
+    statuses = [r["status"] for r in outcome["results"]]
+    assert statuses == ["success", "error", "timeout", "success"]
+    assert outcome["summary"]["failed"] == 2
+    assert "fn-1 failed" in outcome["results"][1]["error"]
+
+
+@pytest.mark.asyncio
+async def test_abort_policy_skips_pending_calls(fake_lambda):
+    fake_lambda.failing = {"fn-0"}
+
+    outcome = await invoke_many([f"fn-{i}" for i in range(6)], {}, max_concurrency=1, failure_policy="abort")
+
+    assert outcome["results"][0]["status"] == "error"
+    assert all(r["status"] == "skipped" for r in outcome["results"][1:])
+    assert outcome["summary"]["skipped"] == 5
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_emits_results_then_summary(fake_lambda):
+    fake_lambda.failing = {"fn"}
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+    body = {"function_name_prefix": "fn", "number_of_functions": 3, "payload": {"name": "World"}}
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.post("/management/invoke-multiple-functions/stream", json=body)
+        records = [json.loads(line) for line in response.text.splitlines()]
+
+        sse = await ac.post("/management/invoke-multiple-functions/stream?stream_format=sse", json=body)
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [r["type"] for r in records] == ["result", "result", "result", "summary"]
+    assert records[-1]["failed"] == 3
+    assert sse.headers["content-type"].startswith("text/event-stream")
+    assert sse.text.count("event: result") == 3
+    assert "event: summary" in sse.text
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from services import aws_services, lambda_readiness
+from services.lambda_readiness import FunctionNotReady, ReadinessTracker
+
+
+class FakeLambda:
+    """Functions stay Pending for a number of polls, then turn Active."""
+
+    class exceptions:
+        class ResourceNotFoundException(Exception):
+            pass
+
+    def __init__(self, pending_polls, failed=(), throttle_first=0):
+        self.pending_polls = dict(pending_polls)
+        self.failed = set(failed)
+        self.throttles_left = throttle_first
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def get_function_configuration(self, FunctionName):
+        with self.lock:
+            self.calls.append(FunctionName)
+            if self.throttles_left:
+                self.throttles_left -= 1
+                raise ClientError({"Error": {"Code": "TooManyRequestsException"}}, "GetFunctionConfiguration")
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if FunctionName in self.failed:
+                return {"State": "Failed", "StateReason": "Image not found"}
+            if self.pending_polls.get(FunctionName, 0) > 0:
+                self.pending_polls[FunctionName] -= 1
+                return {"State": "Pending", "LastUpdateStatus": "InProgress"}
+            return {"State": "Active", "LastUpdateStatus": "Successful"}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_lambda(monkeypatch):
+    holder = {}
+    monkeypatch.setattr(lambda_readiness, "get_aws_client", lambda service_name, region_name=None: holder["client"])
+    return holder
+
+
+@pytest.mark.asyncio
+async def test_many_functions_share_one_poller_with_backoff(fake_lambda):
+    names = [f"agent-{i}" for i in range(20)]
+    fake = fake_lambda["client"] = FakeLambda({name: i % 3 for i, name in enumerate(names)})
+    tracker = ReadinessTracker(interval=0.01, max_interval=0.04, max_concurrency=5)
+
+    results = await asyncio.gather(*(tracker.wait(name, "us-west-2") for name in names))
+
+    assert [r["function_name"] for r in results] == names
+    assert all(r["state"] == "Active" and r["time_to_ready_s"] >= 0 for r in results)
+    assert [r["polls"] for r in results] == [i % 3 + 1 for i in range(20)]
+    # One call per poll, polled in rounds rather than by one waiter per function
+    assert len(fake.calls) == sum(i % 3 + 1 for i in range(20))
+    assert 3 <= tracker.rounds < len(fake.calls) // 3
+    assert fake.max_in_flight <= 5
+    assert results[2]["time_to_ready_s"] >= 0.01 + 0.02
+
+
+@pytest.mark.asyncio
+async def test_concurrent_waits_on_one_function_share_polls(fake_lambda):
+    fake = fake_lambda["client"] = FakeLambda({"agent": 1})
+    tracker = ReadinessTracker(interval=0.01)
+
+    first, second = await asyncio.gather(tracker.wait("agent", "us-west-2"), tracker.wait("agent", "us-west-2"))
+
+    assert first["polls"] == second["polls"] == 2
+    assert fake.calls == ["agent", "agent"]
+
+
+@pytest.mark.asyncio
+async def test_failed_and_stuck_functions_are_reported(fake_lambda):
+    fake_lambda["client"] = FakeLambda({"stuck": 1000}, failed={"broken"}, throttle_first=1)
+    tracker = ReadinessTracker(interval=0.01, max_interval=0.02, timeout=0.2)
+
+    with pytest.raises(FunctionNotReady, match="Image not found"):
+        await tracker.wait("broken", "us-west-2")
+    results = await tracker.wait_many([("ok", "us-west-2"), ("stuck", "us-west-2")], timeout=0.1)
+
+    assert results[0]["status"] == "ready"
+    assert results[1]["status"] == "error" and "did not become ready" in results[1]["error"]
+    assert tracker.throttled == 1
+
+
+def test_create_or_update_waits_between_updates(monkeypatch):
+    calls = []
+
+    class ConflictingLambda:
+        class exceptions:
+            class ResourceConflictException(Exception):
+                pass
+
+        def create_function(self, **kwargs):
+            raise self.exceptions.ResourceConflictException()
+
+        def get_waiter(self, name):
+            class Waiter:
+                def wait(self, FunctionName):
+                    calls.append(name)
+            return Waiter()
+
+        def update_function_code(self, FunctionName, **kwargs):
+            calls.append("update_function_code")
+            return {"FunctionArn": f"arn:aws:lambda:us-west-2:123456789012:function:{FunctionName}"}
+
+        def update_function_configuration(self, FunctionName, **kwargs):
+            calls.append("update_function_configuration")
+
+    monkeypatch.setattr(aws_services, "get_aws_client", lambda service_name, region_name=None: ConflictingLambda())
+
+    aws_services.create_or_update_lambda_function(
+        "agent", "123456789012.dkr.ecr.us-west-2.amazonaws.com/agents:v1", "role", "us-west-2",
+        vpc_config={"SubnetIds": ["subnet-1"], "SecurityGroupIds": ["sg-1"]}
+    )
+
+    assert calls == ["function_updated", "update_function_code", "function_updated", "update_function_configuration"]
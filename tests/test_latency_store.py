@@ -0,0 +1,70 @@
+import base64
+import io
+import sys
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from routers.management_router import management_router
+from services import lambda_invoker
+from services.invocation_history import InvocationHistory, SOURCE_KEEP_WARM
+from services.latency_store import LatencyStore, histogram
+
+
+def test_ring_is_bounded_and_counters_survive_it():
+    store = LatencyStore(size=5)
+    for i in range(8):
+        report = {"duration_ms": 10.0 * i, "billed_duration_ms": 10.0 * i + 1, "init_duration_ms": 300.0 if i == 0 else None}
+        store.record("agent", "us-west-2", 20.0 * (i + 1), report)
+
+    summary = store.summary("agent")
+
+    assert summary["samples"] == 5
+    assert summary["lifetime"] == {"invocations": 8, "cold_starts": 1, "errors": 0}
+    assert summary["cold_starts"] == 0 and summary["init_duration_ms"] is None
+    assert summary["client_rtt_ms"]["p50"] == 120.0 and summary["client_rtt_ms"]["max"] == 160.0
+    assert summary["duration_ms"]["histogram"]["50"] == 3
+
+
+def test_histogram_buckets_are_disjoint():
+    counts = histogram([5, 10, 11, 1000, 10 ** 7])
+
+    assert counts["10"] == 2 and counts["25"] == 1 and counts["1000"] == 1 and counts["+Inf"] == 1
+    assert sum(counts.values()) == 5
+
+
+@pytest.mark.asyncio
+async def test_latency_endpoint_reports_invocations(tmp_path, monkeypatch):
+    class FakeLambda:
+        calls = 0
+
+        def invoke(self, FunctionName, Payload, **kwargs):
+            FakeLambda.calls += 1
+            init = "\tInit Duration: 412.5 ms" if FakeLambda.calls == 1 else ""
+            log = f"REPORT RequestId: 1\tDuration: 20.0 ms\tBilled Duration: 21 ms\tMemory Size: 128 MB\tMax Memory Used: 64 MB{init}\n"
+            return {"Payload": io.BytesIO(b"{}"), "LogResult": base64.b64encode(log.encode()).decode()}
+
+    store = LatencyStore()
+    monkeypatch.setattr(lambda_invoker, "get_aws_client", lambda service_name, region_name=None: FakeLambda())
+    monkeypatch.setattr(lambda_invoker, "invocation_history", InvocationHistory(str(tmp_path / "invocations.sqlite3")))
+    monkeypatch.setattr(lambda_invoker, "latency_store", store)
+    monkeypatch.setattr(sys.modules["routers.management_router"], "latency_store", store)
+    store.record("agent", "us-west-2", 5.0, {"duration_ms": 1.0}, source=SOURCE_KEEP_WARM)
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+    body = {"function_name_prefix": "agent", "number_of_functions": 3, "payload": {}, "region": "us-west-2"}
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        invoked = (await ac.post("/management/invoke-multiple-functions", json=body)).json()
+        latency = (await ac.get("/management/functions/agent/latency?region=us-west-2")).json()
+        with_pings = (await ac.get("/management/functions/agent/latency?include_keep_warm=true")).json()
+
+    assert invoked["summary"]["cold_starts"] == 1
+    assert invoked["summary"]["billed_duration_ms"] == 63
+    assert all(r["report"]["max_memory_used_mb"] == 64 for r in invoked["results"])
+    assert latency["samples"] == 3 and with_pings["samples"] == 4
+    assert latency["cold_starts"] == 1 and latency["cold_start_rate"] == 0.3333
+    assert latency["init_duration_ms"]["max"] == 412.5
+    assert latency["client_rtt_ms_cold"]["count"] == 1 and latency["client_rtt_ms_warm"]["count"] == 2
+    assert latency["max_memory_used_mb"] == 64
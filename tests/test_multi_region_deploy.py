@@ -0,0 +1,82 @@
+import shutil
+
+import pytest
+
+from deployment.aws import deploy as deploy_module
+from services.deploy_jobs import DeployJobManager, JobStore
+
+REGIONS = ["us-east-1", "eu-west-1"]
+
+
+def deploy_request(**overrides):
+    request = {
+        "python_script": "def lambda_handler(event, context):\n    return 'ok'\n",
+        "requirements": "requests\n",
+        "repository_name": "agents",
+        "image_tag": "v1",
+        "region": "us-west-2",
+        "regions": REGIONS,
+        "function_name": "agent",
+    }
+    request.update(overrides)
+    return request
+
+
+@pytest.fixture
+def manager(tmp_path, fake_toolchain):
+    manager = DeployJobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")))
+    manager.register("dockerdeploy", deploy_module.run_deploy_pipeline)
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_builds_once_and_deploys_every_region(manager, fake_toolchain):
+    job = await manager.wait(manager.submit("dockerdeploy", deploy_request()))
+
+    assert job["status"] == "succeeded"
+    result = job["result"]
+    assert result["summary"] == {"total": 3, "succeeded": 3, "failed": 0}
+    assert fake_toolchain.build_count() == 1
+    for region in ["us-west-2", *REGIONS]:
+        record = result["regions"][region]
+        assert record["status"] == "success"
+        assert record["image_uri"] == f"123456789012.dkr.ecr.{region}.amazonaws.com/agents:v1"
+        assert record["lambda_arn"] == f"arn:aws:lambda:{region}:123456789012:function:agent"
+        assert record["push_s"] >= 0 and record["lambda_s"] >= 0
+        assert record["time_to_ready_s"] >= 0
+    assert sum(command.startswith("push") for command in fake_toolchain.commands()) == 3
+    assert {"docker_push[eu-west-1]", "wait_for_ready[eu-west-1]"} <= {stage["name"] for stage in job["stages"]}
+
+
+@pytest.mark.asyncio
+async def test_replicated_regions_are_not_pushed(manager, fake_toolchain, monkeypatch):
+    def replicate(repository_name, image_tag, region_name):
+        source = fake_toolchain.out / "registry" / "us-west-2" / repository_name
+        shutil.copytree(source, fake_toolchain.out / "registry" / region_name / repository_name)
+        return "sha256:replicated"
+
+    monkeypatch.setattr(deploy_module, "get_ecr_replication_regions", lambda repository_name, region: ["eu-west-1"])
+    monkeypatch.setattr(deploy_module, "wait_for_ecr_image", replicate)
+    job = await manager.wait(manager.submit("dockerdeploy", deploy_request()))
+
+    regions = job["result"]["regions"]
+    assert regions["eu-west-1"]["replicated"] is True
+    assert regions["eu-west-1"]["status"] == "success"
+    pushes = [command for command in fake_toolchain.commands() if command.startswith("push")]
+    assert len(pushes) == 2 and not any("eu-west-1" in push for push in pushes)
+
+
+@pytest.mark.asyncio
+async def test_region_failures_are_reported_per_region(manager, fake_toolchain):
+    def fail(**kwargs):
+        raise RuntimeError("Lambda is unavailable")
+
+    fake_toolchain.fake_client("lambda", "eu-west-1").create_function = fail
+    job = await manager.wait(manager.submit("dockerdeploy", deploy_request()))
+
+    assert job["status"] == "succeeded"
+    assert job["result"]["summary"]["failed"] == 1
+    assert job["result"]["regions"]["eu-west-1"] == {
+        **job["result"]["regions"]["eu-west-1"], "status": "error", "error": "Lambda is unavailable"
+    }
+    assert job["result"]["message"] == "Deployment succeeded in 2 of 3 regions"
@@ -0,0 +1,172 @@
+import base64
+import io
+import json
+import os
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError, ReadTimeoutError
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from routers.management_router import management_router
+from services import lambda_invoker
+from services.invocation_history import InvocationHistory
+from services.lambda_invoker import invoke_lambda_function, iter_invocations
+from utils import payload_codec
+from utils.payload_codec import payload_handler
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[(Bucket, Key)]
+
+
+class FakeLambda:
+    """Runs an agent handler wrapped with the shipped payload helper, the way Lambda would."""
+
+    def __init__(self, s3):
+        self.s3 = s3
+        self.request_sizes = []
+        self.events = []
+
+        @payload_handler
+        def lambda_handler(event, context):
+            self.events.append(event)
+            return {"summary": event["document"][:10], "pages": [event["document"]] * event.get("pages", 1)}
+
+        self.handler = lambda_handler
+
+    def __call__(self, service_name, region_name=None):
+        return self.s3 if service_name == "s3" else self
+
+    def invoke(self, FunctionName, Payload, **kwargs):
+        self.request_sizes.append(len(Payload))
+        result = self.handler(json.loads(Payload), None)
+        return {"Payload": io.BytesIO(json.dumps(result).encode()), "LogResult": None}
+
+
+@pytest.fixture
+def fake_lambda(tmp_path, monkeypatch):
+    s3 = FakeS3()
+    fake = FakeLambda(s3)
+    monkeypatch.setattr(lambda_invoker, "get_aws_client", fake)
+    monkeypatch.setattr(payload_codec, "_default_s3_client", lambda: s3)
+    monkeypatch.setattr(lambda_invoker, "invocation_history", InvocationHistory(str(tmp_path / "invocations.sqlite3")))
+    return fake
+
+
+def test_small_payloads_stay_plain_json(fake_lambda):
+    response = invoke_lambda_function("agent", {"document": "short text"}, "us-west-2")
+
+    assert response["payload"] == {"summary": "short text", "pages": ["short text"]}
+    assert response["payload_encoding"] == {"request": None, "response": None}
+    assert fake_lambda.request_sizes == [len(payload_codec.dumps({"document": "short text"}))]
+
+
+def test_large_payloads_are_gzipped_both_ways(fake_lambda):
+    document = "lorem ipsum dolor sit amet " * 40000
+
+    response = invoke_lambda_function("agent", {"document": document, "pages": 3}, "us-west-2")
+
+    assert response["payload_encoding"] == {"request": "gzip", "response": "gzip"}
+    assert response["payload"]["pages"] == [document] * 3
+    assert fake_lambda.events[0]["document"] == document
+    # The repetitive document compresses far below its 1 MB size
+    assert fake_lambda.request_sizes[0] < len(document) / 50
+
+
+def test_payloads_over_the_inline_limit_are_offloaded_to_s3(fake_lambda, monkeypatch):
+    document = base64.b64encode(os.urandom(300 * 1024)).decode()
+    monkeypatch.setattr(payload_codec, "LAMBDA_SYNC_PAYLOAD_LIMIT_BYTES", 200 * 1024)
+    monkeypatch.setattr(payload_codec, "PAYLOAD_S3_BUCKET", "payloads-{region}")
+
+    response = invoke_lambda_function("agent", {"document": document}, "us-west-2")
+
+    assert response["payload_encoding"] == {"request": "s3", "response": "s3"}
+    assert response["payload"]["pages"] == [document]
+    assert fake_lambda.events[0]["document"] == document
+    assert fake_lambda.request_sizes[0] < 1024
+    # Both the request object (after the call) and the response object (once read) are deleted
+    assert fake_lambda.s3.objects == {}
+
+
+def test_offloaded_payload_is_kept_while_the_function_may_still_read_it(fake_lambda, monkeypatch):
+    document = base64.b64encode(os.urandom(300 * 1024)).decode()
+    monkeypatch.setattr(payload_codec, "LAMBDA_SYNC_PAYLOAD_LIMIT_BYTES", 200 * 1024)
+    monkeypatch.setattr(payload_codec, "PAYLOAD_S3_BUCKET", "payloads-{region}")
+
+    def timed_out(**kwargs):
+        raise ReadTimeoutError(endpoint_url="https://lambda.us-west-2.amazonaws.com")
+    monkeypatch.setattr(fake_lambda, "invoke", timed_out)
+    with pytest.raises(ReadTimeoutError):
+        invoke_lambda_function("agent", {"document": document}, "us-west-2")
+    # The function may still be running, so its request object stays for the lifecycle rule
+    assert len(fake_lambda.s3.objects) == 1
+
+    def rejected(**kwargs):
+        raise ClientError({"Error": {"Code": "TooManyRequestsException"}}, "Invoke")
+    monkeypatch.setattr(fake_lambda, "invoke", rejected)
+    fake_lambda.s3.objects.clear()
+    with pytest.raises(ClientError):
+        invoke_lambda_function("agent", {"document": document}, "us-west-2")
+    # A rejected call never ran, so nothing will read the object
+    assert fake_lambda.s3.objects == {}
+
+
+@pytest.mark.asyncio
+async def test_fan_out_payload_outlives_timed_out_calls(fake_lambda, monkeypatch):
+    document = base64.b64encode(os.urandom(300 * 1024)).decode()
+    monkeypatch.setattr(payload_codec, "LAMBDA_SYNC_PAYLOAD_LIMIT_BYTES", 200 * 1024)
+    monkeypatch.setattr(payload_codec, "PAYLOAD_S3_BUCKET", "payloads-{region}")
+    release = threading.Event()
+    invoke = fake_lambda.invoke
+
+    def slow_invoke(FunctionName, Payload, **kwargs):
+        if FunctionName == "slow":
+            release.wait(5)
+        return invoke(FunctionName, Payload, **kwargs)
+    monkeypatch.setattr(fake_lambda, "invoke", slow_invoke)
+
+    results = [r async for r in iter_invocations(["fast", "slow"], {"document": document}, "us-west-2",
+                                                 timeout_seconds=0.2)]
+
+    assert sorted(r["status"] for r in results) == ["success", "timeout"]
+    # The timed-out call is still running and has yet to read the payload
+    assert len(fake_lambda.s3.objects) == 1
+    release.set()
+    for _ in range(100):
+        if not fake_lambda.s3.objects:
+            break
+        time.sleep(0.01)
+    assert len(fake_lambda.events) == 2 and fake_lambda.s3.objects == {}
+
+
+@pytest.mark.asyncio
+async def test_oversized_payload_without_bucket_is_rejected(fake_lambda, monkeypatch):
+    monkeypatch.setattr(payload_codec, "LAMBDA_SYNC_PAYLOAD_LIMIT_BYTES", 1024)
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+    document = base64.b64encode(os.urandom(4096)).decode()
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.post("/management/invoke-lambda",
+                                 json={"function_name": "agent", "payload": {"document": document}})
+        streamed = await ac.post("/management/invoke-multiple-functions/stream",
+                                 json={"function_name_prefix": "agent", "number_of_functions": 2,
+                                       "payload": {"document": document}})
+
+    assert response.status_code == streamed.status_code == 413
+    assert "AGILEAGENTS_PAYLOAD_BUCKET" in response.json()["detail"]
+    assert "AGILEAGENTS_PAYLOAD_BUCKET" in streamed.json()["detail"]
+    assert fake_lambda.events == []
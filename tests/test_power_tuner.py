@@ -0,0 +1,210 @@
+import base64
+import io
+import math
+import sys
+import threading
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from routers.management_router import management_router
+from services import deploy_jobs, lambda_invoker, lambda_readiness, power_tuner
+from services.lambda_readiness import function_lock
+from services.deploy_jobs import JobStore, SUCCEEDED
+from services.invocation_history import InvocationHistory
+from services.power_tuner import PowerTuner, PowerTuningStore, choose_memory
+
+
+def duration_for(memory_size):
+    # CPU-bound work: more memory means more CPU and a shorter run, on top of fixed I/O time
+    return 100 + 3200 * 128 / memory_size
+
+
+class FakeLambda:
+    class exceptions:
+        class ResourceNotFoundException(Exception):
+            pass
+
+    def __init__(self, memory_size=128):
+        self.memory_size = memory_size
+        self.versions = {}
+        self.aliases = {}
+        self.warm = set()
+        self.lock = threading.Lock()
+        self.function_lock = None
+        self.undeletable_aliases = set()
+        self.locked_updates = []
+
+    def get_function_configuration(self, FunctionName):
+        return {"MemorySize": self.memory_size, "State": "Active", "LastUpdateStatus": "Successful"}
+
+    def update_function_configuration(self, FunctionName, MemorySize):
+        self.locked_updates.append(self.function_lock.locked() if self.function_lock else None)
+        self.memory_size = MemorySize
+
+    def list_versions_by_function(self, FunctionName, **kwargs):
+        return {"Versions": [{"Version": "$LATEST"}] + [{"Version": v} for v in self.versions]}
+
+    def publish_version(self, FunctionName):
+        # Like Lambda, publishing an unchanged $LATEST returns the latest version instead of a new one
+        if self.versions and self.versions[max(self.versions, key=int)] == self.memory_size:
+            return {"Version": max(self.versions, key=int)}
+        version = str(max(map(int, self.versions), default=0) + 1)
+        self.versions[version] = self.memory_size
+        return {"Version": version}
+
+    def update_alias(self, FunctionName, Name, FunctionVersion):
+        if Name not in self.aliases:
+            raise self.exceptions.ResourceNotFoundException()
+        self.aliases[Name] = FunctionVersion
+
+    def create_alias(self, FunctionName, Name, FunctionVersion):
+        self.aliases[Name] = FunctionVersion
+
+    def delete_alias(self, FunctionName, Name):
+        if Name in self.undeletable_aliases:
+            raise Exception(f"Cannot delete {Name}")
+        del self.aliases[Name]
+
+    def delete_function(self, FunctionName, Qualifier):
+        if Qualifier in self.aliases.values():
+            raise Exception(f"Version {Qualifier} is still referenced by an alias")
+        del self.versions[Qualifier]
+
+    def invoke(self, FunctionName, Payload, Qualifier, **kwargs):
+        memory_size = self.versions[self.aliases[Qualifier]]
+        with self.lock:
+            cold = Qualifier not in self.warm
+            self.warm.add(Qualifier)
+        duration = duration_for(memory_size)
+        report = (f"REPORT RequestId: 1\tDuration: {duration:.2f} ms\tBilled Duration: {math.ceil(duration)} ms\t"
+                  f"Memory Size: {memory_size} MB\tMax Memory Used: 60 MB" + ("\tInit Duration: 800.00 ms" if cold else ""))
+        return {"Payload": io.BytesIO(b"{}"), "LogResult": base64.b64encode(report.encode()).decode()}
+
+
+@pytest.fixture
+def fake_lambda(tmp_path, monkeypatch):
+    fake = FakeLambda()
+    client = lambda service_name, region_name=None: fake
+    for module in (power_tuner, lambda_invoker, lambda_readiness):
+        monkeypatch.setattr(module, "get_aws_client", client)
+    monkeypatch.setattr(lambda_invoker, "invocation_history", InvocationHistory(str(tmp_path / "invocations.sqlite3")))
+    monkeypatch.setattr(power_tuner, "power_tuning_store", PowerTuningStore(str(tmp_path / "power_tuning.sqlite3")))
+    monkeypatch.setattr(power_tuner, "power_tuner", PowerTuner())
+    for name in ("power_tuner", "power_tuning_store"):
+        monkeypatch.setattr(sys.modules["routers.management_router"], name, getattr(power_tuner, name))
+    monkeypatch.setattr(deploy_jobs.deploy_jobs, "_store", JobStore(str(tmp_path / "jobs.sqlite3")))
+    return fake
+
+
+def test_strategies_pick_cheapest_fastest_or_balanced():
+    results = [
+        {"memory_size": memory_size, "duration_ms": duration_for(memory_size),
+         "cost_usd": power_tuner.invocation_cost(math.ceil(duration_for(memory_size)), memory_size)}
+        for memory_size in (128, 256, 512, 1024, 2048)
+    ]
+
+    assert choose_memory(results, "cost") == 128
+    assert choose_memory(results, "speed") == 2048
+    assert choose_memory(results, "balanced") == 1024
+    assert choose_memory([{"memory_size": 128, "duration_ms": None, "cost_usd": None}]) is None
+
+
+@pytest.mark.asyncio
+async def test_power_tuning_applies_recommendation_and_cleans_up(fake_lambda):
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+    body = {"memory_sizes": [2048, 128, 512, 256, 1024], "invocations": 3, "apply": True, "region": "us-west-2"}
+    fake_lambda.function_lock = function_lock("agent", "us-west-2")
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test", timeout=30) as ac:
+        run = (await ac.post("/management/functions/agent/power-tuning", json=body)).json()
+        stored = (await ac.get(f"/management/power-tuning/{run['run_id']}")).json()
+        listed = (await ac.get("/management/power-tuning?function_name=agent")).json()["runs"]
+        invalid = await ac.post("/management/functions/agent/power-tuning", json={"memory_sizes": [64]})
+
+    assert [r["memory_size"] for r in run["results"]] == [128, 256, 512, 1024, 2048]
+    # The warm-up call per alias absorbs the cold start, so every measured call is warm
+    assert all(r["measured"] == 3 and r["cold_starts_discarded"] == 0 for r in run["results"])
+    assert run["results"][0]["billed_duration_ms"] == 3300
+    assert (run["original_memory"], run["recommended_memory"], run["applied"]) == (128, 1024, True)
+    assert run["duration_change"] < -0.8 and run["cost_change"] > 0
+    assert fake_lambda.memory_size == 1024
+    assert fake_lambda.aliases == {} and fake_lambda.versions == {}
+    # Every configuration change, cleanup included, happens under the function's deploy lock
+    assert fake_lambda.locked_updates == [True] * 6
+    assert stored == run and [r["run_id"] for r in listed] == [run["run_id"]]
+    assert run["status"] == SUCCEEDED and run["stage"] is None
+    assert [stage["name"] for stage in run["stages"]][:3] == ["read_configuration", "publish_128", "publish_256"]
+    # Sweeps run apart from the deploy job manager, so they stay out of deploy jobs and metrics
+    assert deploy_jobs.deploy_jobs.list() == []
+    assert invalid.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_background_tuning_is_tracked_in_its_own_history(fake_lambda):
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+    body = {"memory_sizes": [128, 256], "invocations": 2, "region": "us-west-2"}
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test", timeout=30) as ac:
+        submitted = await ac.post("/management/functions/agent/power-tuning?background=true", json=body)
+        duplicate = await ac.post("/management/functions/agent/power-tuning", json=body)
+        queued = (await ac.get(f"/management/power-tuning/{submitted.json()['run_id']}")).json()
+        run = await power_tuner.power_tuner.wait(submitted.json()["run_id"])
+
+    assert submitted.status_code == 202 and duplicate.status_code == 409
+    assert queued["status"] in ("queued", "running") and queued["results"] is None
+    assert run["status"] == SUCCEEDED and run["recommended_memory"] in (128, 256)
+    assert fake_lambda.memory_size == 128
+
+
+@pytest.mark.asyncio
+async def test_tuning_is_rejected_while_the_function_is_deployed(fake_lambda, monkeypatch):
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+    body = {"memory_sizes": [128, 256], "invocations": 1, "region": "us-west-2"}
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test", timeout=30) as ac:
+        async with function_lock("agent", "us-west-2"):
+            updating = await ac.post("/management/functions/agent/power-tuning", json=body)
+        monkeypatch.setattr(deploy_jobs.deploy_jobs, "_in_flight", {("deploy", "agent", "hash"): "job-1"})
+        queued = await ac.post("/management/functions/agent/power-tuning", json=body)
+
+    assert updating.status_code == queued.status_code == 409
+    assert "being deployed" in queued.json()["detail"]
+    assert fake_lambda.locked_updates == []
+
+
+@pytest.mark.asyncio
+async def test_cleanup_keeps_versions_the_sweep_did_not_create(fake_lambda):
+    # The last deploy published version 1 at 128 MB, and the warm pool's alias serves it
+    fake_lambda.versions["1"] = 128
+    fake_lambda.aliases["live"] = "1"
+    fake_lambda.undeletable_aliases.add("power-tuning-256")
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+    body = {"memory_sizes": [128, 256, 512], "invocations": 1, "region": "us-west-2"}
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test", timeout=30) as ac:
+        run = (await ac.post("/management/functions/agent/power-tuning", json=body)).json()
+
+    assert run["status"] == SUCCEEDED
+    # 128 MB reused version 1; the 256 MB alias could not be deleted, so neither could its version,
+    # but the 512 MB alias and version were still removed
+    assert fake_lambda.aliases == {"live": "1", "power-tuning-256": "2"}
+    assert fake_lambda.versions == {"1": 128, "2": 256}
+    assert fake_lambda.memory_size == 128
+
+
+def test_runs_left_by_a_restart_are_marked_interrupted(fake_lambda):
+    store = power_tuner.power_tuning_store
+    running = store.create({"function_name": "agent", "region": "us-west-2"})
+    store.update(running, status="running", stage="invoke")
+    queued = store.create({"function_name": "other", "region": "us-west-2"})
+
+    PowerTuner().recover()
+
+    assert [store.get(run_id)["status"] for run_id in (running, queued)] == ["interrupted", "interrupted"]
+    assert "restarted" in store.get(running)["error"]
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import sys
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from deployment.aws import deploy as deploy_module
+from deployment.aws.deploy import deploy_router, run_job_command
+from services.deploy_jobs import JobStore, deploy_jobs
+from utils.subprocess_runner import CommandTimeout, run_command
+
+
+@pytest.mark.asyncio
+async def test_output_is_streamed_and_bounded():
+    lines = []
+    result = await run_command(
+        [sys.executable, "-c", "import sys\nfor i in range(100): print(i)\nprint('oops', file=sys.stderr)"],
+        on_line=lambda stream, line: lines.append((stream, line)),
+        max_lines=10
+    )
+
+    assert result.returncode == 0
+    assert len(lines) == 101 and ("stderr", "oops") in lines
+    assert result.stdout.splitlines() == [str(i) for i in range(90, 100)]
+    assert result.stderr == "oops"
+
+
+@pytest.mark.asyncio
+async def test_timeout_and_cancellation_stop_the_process():
+    start = time.monotonic()
+    with pytest.raises(CommandTimeout):
+        await run_command([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.2)
+    assert time.monotonic() - start < 5
+
+    task = asyncio.ensure_future(run_command([sys.executable, "-c", "import time; time.sleep(30)"]))
+    await asyncio.sleep(0.2)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert time.monotonic() - start < 10
+
+
+async def noisy_pipeline(job, request):
+    async with job.stage("docker_build"):
+        await run_job_command(job, [sys.executable, "-u", "-c", "import time; [print(f'step {i}') or time.sleep(0.05) for i in range(3)]"])
+    return {"message": "ok"}
+
+
+@pytest.mark.asyncio
+async def test_job_logs_can_be_followed(tmp_path, monkeypatch):
+    monkeypatch.setattr(deploy_jobs, "_store", JobStore(str(tmp_path / "jobs.sqlite3")))
+    monkeypatch.setitem(deploy_jobs._runners, "noisy", noisy_pipeline)
+    app = FastAPI()
+    app.include_router(deploy_router, prefix="/deployment")
+
+    job_id = deploy_jobs.submit("noisy", {})
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.get(f"/deployment/jobs/{job_id}/logs/stream?stream_format=ndjson")
+        replay = await ac.get(f"/deployment/jobs/{job_id}/logs/stream?from_line=2")
+        missing = await ac.get("/deployment/jobs/unknown/logs/stream")
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["line"] for r in records if r["type"] == "log"][1:] == ["step 0", "step 1", "step 2"]
+    assert records[-1] == {"type": "status", "status": "succeeded", "stage": None, "error": None}
+    assert replay.headers["content-type"].startswith("text/event-stream")
+    assert 'data: {"line_no": 2, "line": "step 1"}' in replay.text
+    assert "step 0" not in replay.text
+    assert missing.status_code == 404
@@ -0,0 +1,107 @@
+import hashlib
+import io
+import json
+import tarfile
+import zipfile
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from deployment.aws import deploy as deploy_module
+from services import build_workspace
+from services.build_workspace import BuildWorkspace, WorkspaceQuotaExceeded
+from services.uploads import ChecksumMismatch, UploadTooLarge, save_upload
+
+
+def make_tar(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_save_upload_streams_in_chunks_and_hashes(tmp_path):
+    data = b"x" * 10_000
+    with BuildWorkspace(root=str(tmp_path)) as workspace:
+        record = save_upload(workspace, "../model.bin", io.BytesIO(data), hashlib.sha256(data).hexdigest(), chunk_size=1024)
+        assert record == {"filename": "model.bin", "size": 10_000, "sha256": hashlib.sha256(data).hexdigest()}
+        with open(workspace.context_path("model.bin"), "rb") as f:
+            assert f.read() == data
+        with pytest.raises(ChecksumMismatch):
+            save_upload(workspace, "other.bin", io.BytesIO(data), "0" * 64)
+
+
+def test_save_upload_enforces_limits(tmp_path):
+    with BuildWorkspace(root=str(tmp_path), quota_bytes=4096) as workspace:
+        with pytest.raises(UploadTooLarge):
+            save_upload(workspace, "big.bin", io.BytesIO(b"x" * 2048), chunk_size=512, max_bytes=1024)
+        with pytest.raises(WorkspaceQuotaExceeded):
+            save_upload(workspace, "huge.bin", io.BytesIO(b"x" * 8192), chunk_size=512)
+
+
+def test_save_upload_extracts_archives(tmp_path):
+    files = {"app.py": b"print('hi')\n", "pkg/util.py": b"X = 1\n"}
+    with BuildWorkspace(root=str(tmp_path)) as workspace:
+        tar_record = save_upload(workspace, "bundle.tar.gz", io.BytesIO(make_tar(files)))
+        zip_record = save_upload(workspace, "bundle.zip", io.BytesIO(make_zip({"lib/data.txt": b"data"})))
+        assert tar_record["extracted"] == ["app.py", "pkg/util.py"]
+        assert tar_record["sha256"] == hashlib.sha256(make_tar(files)).hexdigest()
+        assert zip_record["extracted"] == ["lib/data.txt"]
+        with open(workspace.context_path("pkg", "util.py"), "rb") as f:
+            assert f.read() == b"X = 1\n"
+        with pytest.raises(ValueError):
+            save_upload(workspace, "evil.tar.gz", io.BytesIO(make_tar({"../../evil.py": b"x"})))
+        with pytest.raises(ValueError):
+            save_upload(workspace, "broken.zip", io.BytesIO(b"not a zip"))
+
+
+@pytest.mark.asyncio
+async def test_advanced_deploy_accepts_json_form_field(tmp_path, monkeypatch):
+    submitted = {}
+
+    async def fake_run_or_submit_job(kind, request, background, idempotency_key=None):
+        submitted.update(request)
+        return {"status": "succeeded"}
+
+    monkeypatch.setattr(build_workspace, "BUILD_WORKSPACE_ROOT", str(tmp_path))
+    monkeypatch.setattr(deploy_module, "run_or_submit_job", fake_run_or_submit_job)
+    app = FastAPI()
+    app.include_router(deploy_module.deploy_router)
+    settings = {
+        "base_image": "public.ecr.aws/lambda/python:3.11",
+        "repository_name": "agents",
+        "image_tag": "v1",
+        "build_commands": [],
+        "function_name": "agent",
+    }
+    data = b"print('hi')\n"
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/advanced-deploy", data={
+            "request": json.dumps(settings),
+            "checksums": json.dumps({"app.py": hashlib.sha256(data).hexdigest()}),
+        }, files={"files": ("app.py", data)})
+        assert response.status_code == 200
+        assert submitted["uploads"][0]["size"] == len(data)
+
+        response = await client.post("/advanced-deploy", data={
+            "request": json.dumps(settings),
+            "checksums": json.dumps({"app.py": "0" * 64}),
+        }, files={"files": ("app.py", data)})
+        assert response.status_code == 400
+        # The rejected upload's workspace is removed; the accepted one is left for the job
+        assert len(list(tmp_path.iterdir())) == 1
+
+        response = await client.post("/advanced-deploy", data={"request": "{}"}, files={"files": ("app.py", data)})
+        assert response.status_code == 422
@@ -0,0 +1,212 @@
+import asyncio
+import base64
+import io
+import json
+import sqlite3
+import sys
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from routers.management_router import management_router
+from services import lambda_invoker, lambda_readiness, warm_pool as warm_pool_module
+from services.lambda_readiness import function_lock
+from services.invocation_history import InvocationHistory, SOURCE_KEEP_WARM
+from services.lambda_invoker import invoke_lambda_function, parse_report
+from services.warm_pool import WarmPool, WARMUP_EVENT
+
+
+def log_tail(init_duration_ms=None):
+    report = "REPORT RequestId: 1\tDuration: 12.50 ms\tBilled Duration: 13 ms\tMemory Size: 128 MB\tMax Memory Used: 40 MB"
+    if init_duration_ms is not None:
+        report += f"\tInit Duration: {init_duration_ms} ms"
+    return base64.b64encode(f"START RequestId: 1\nEND RequestId: 1\n{report}\n".encode()).decode()
+
+
+class FakeLambda:
+    class exceptions:
+        class ResourceNotFoundException(Exception):
+            pass
+
+    def __init__(self):
+        self.invocations = []
+        self.aliases = {}
+        self.provisioned = {}
+        self.versions = 0
+        self.warm = set()
+
+    def invoke(self, FunctionName, Payload, Qualifier=None, **kwargs):
+        self.invocations.append((FunctionName, Qualifier, json.loads(Payload), kwargs.get("LogType")))
+        cold = FunctionName not in self.warm
+        self.warm.add(FunctionName)
+        return {"Payload": io.BytesIO(b'{"ok": true}'), "LogResult": log_tail(180.2 if cold else None)}
+
+    def get_function_configuration(self, FunctionName):
+        return {"State": "Active", "LastUpdateStatus": "Successful"}
+
+    def publish_version(self, FunctionName):
+        self.versions += 1
+        return {"Version": str(self.versions)}
+
+    def get_alias(self, FunctionName, Name):
+        if (FunctionName, Name) not in self.aliases:
+            raise self.exceptions.ResourceNotFoundException()
+        return {"FunctionVersion": self.aliases[(FunctionName, Name)]}
+
+    def create_alias(self, FunctionName, Name, FunctionVersion):
+        self.aliases[(FunctionName, Name)] = FunctionVersion
+
+    def update_alias(self, FunctionName, Name, FunctionVersion):
+        self.aliases[(FunctionName, Name)] = FunctionVersion
+
+    def put_provisioned_concurrency_config(self, FunctionName, Qualifier, ProvisionedConcurrentExecutions):
+        self.provisioned[(FunctionName, Qualifier)] = ProvisionedConcurrentExecutions
+        return {"Status": "IN_PROGRESS"}
+
+    def delete_provisioned_concurrency_config(self, FunctionName, Qualifier):
+        self.provisioned.pop((FunctionName, Qualifier))
+
+
+@pytest.fixture
+def fake_lambda(tmp_path, monkeypatch):
+    fake = FakeLambda()
+    history = InvocationHistory(str(tmp_path / "invocations.sqlite3"))
+    pool = WarmPool(str(tmp_path / "warm_pool.sqlite3"), history=history)
+    monkeypatch.setattr(lambda_invoker, "get_aws_client", lambda service_name, region_name=None: fake)
+    monkeypatch.setattr(warm_pool_module, "get_aws_client", lambda service_name, region_name=None: fake)
+    monkeypatch.setattr(lambda_readiness, "get_aws_client", lambda service_name, region_name=None: fake)
+    monkeypatch.setattr(lambda_invoker, "invocation_history", history)
+    monkeypatch.setattr(warm_pool_module, "warm_pool", pool)
+    monkeypatch.setattr(sys.modules["routers.management_router"], "warm_pool", pool)
+    fake.history, fake.pool = history, pool
+    return fake
+
+
+def test_report_line_tells_cold_from_warm_starts():
+    cold = parse_report(log_tail(250.75))
+    warm = parse_report(log_tail())
+
+    assert cold["init_duration_ms"] == 250.75 and cold["duration_ms"] == 12.5
+    assert cold["billed_duration_ms"] == 13 and cold["max_memory_used_mb"] == 40
+    assert warm["init_duration_ms"] is None
+    assert parse_report(None) is None
+
+
+def test_invocations_are_recorded_with_cold_starts(fake_lambda):
+    first = invoke_lambda_function("agent", {"name": "World"}, "us-west-2")
+    second = invoke_lambda_function("agent", {"name": "World"}, "us-west-2", qualifier="live")
+
+    assert (first["cold_start"], second["cold_start"]) == (True, False)
+    assert fake_lambda.invocations[1][1:] == ("live", {"name": "World"}, "Tail")
+    stats = fake_lambda.history.cold_start_stats("agent", "us-west-2")
+    assert stats == {"invocations": 2, "cold_starts": 1, "cold_start_rate": 0.5, "init_duration_ms": 180.2}
+
+
+def test_invocations_are_buffered_and_written_in_one_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys.modules["services.invocation_history"], "INVOCATION_HISTORY_FLUSH_INTERVAL_S", 3600)
+    path = str(tmp_path / "buffered.sqlite3")
+    history = InvocationHistory(path)
+    now = time.time()
+    for i in range(50):
+        history.record("agent", "us-west-2", {"init_duration_ms": None, "duration_ms": 1.0}, invoked_at=now + i)
+
+    statements = []
+    history.conn.set_trace_callback(statements.append)
+    assert len(history.invocations("agent", "us-west-2")) == 50
+    assert sum(statement.startswith("INSERT") for statement in statements) == 50
+    assert sum(statement == "COMMIT" for statement in statements) == 1
+
+    history.record("agent", "us-west-2", None)
+    history.flush()
+    other = sqlite3.connect(path)
+    assert other.execute("SELECT COUNT(*) FROM invocations").fetchone()[0] == 51
+
+
+def test_recommendations_learn_from_history(fake_lambda):
+    history, now = fake_lambda.history, time.time()
+    report = lambda cold: {"duration_ms": 30000.0, "init_duration_ms": 900.0 if cold else None}
+    # Steady traffic: 5 calls a minute for an hour, every third call cold
+    for i in range(300):
+        history.record("busy", "us-west-2", report(i % 3 == 0), invoked_at=now - 3600 + i * 12)
+    # Sparse traffic: a call every 20 minutes, almost always cold
+    for i in range(30):
+        history.record("sparse", "us-west-2", report(i % 10 != 0), invoked_at=now - 36000 + i * 1200)
+    # Frequent but already warm
+    for i in range(50):
+        history.record("steady", "us-west-2", report(False), invoked_at=now - 600 + i * 10)
+
+    recommendations = {r["function_name"]: r for r in fake_lambda.pool.recommend(now=now)}
+
+    assert recommendations["busy"]["mode"] == "provisioned"
+    # Busiest minute: 5 calls of 30 s each need about 3 environments
+    assert recommendations["busy"]["concurrency"] == 3
+    assert recommendations["sparse"]["mode"] == "keep_warm"
+    assert recommendations["sparse"]["cold_start_rate"] == 0.9
+    assert recommendations["steady"]["mode"] is None
+
+
+@pytest.mark.asyncio
+async def test_provisioned_concurrency_is_set_on_an_alias(fake_lambda):
+    pool = fake_lambda.pool
+
+    target = await pool.set_provisioned_concurrency("agent", "us-west-2", 2)
+    await pool.set_provisioned_concurrency("agent", "us-west-2", 4)
+
+    assert target["status"] == "IN_PROGRESS" and target["alias"] == "live"
+    assert fake_lambda.aliases == {("agent", "live"): "2"}
+    assert fake_lambda.provisioned == {("agent", "live"): 4}
+    assert pool.targets()[0]["enabled_at"] == target["enabled_at"]
+
+    await pool.set_provisioned_concurrency("agent", "us-west-2", 0)
+    assert fake_lambda.provisioned == {} and pool.targets() == []
+
+
+@pytest.mark.asyncio
+async def test_deploys_move_the_provisioned_alias_under_the_function_lock(fake_lambda):
+    pool = fake_lambda.pool
+    assert await pool.advance_alias("agent", "us-west-2") is None
+    assert fake_lambda.versions == 0
+
+    async with function_lock("agent", "us-west-2"):
+        setting = asyncio.create_task(pool.set_provisioned_concurrency("agent", "us-west-2", 2))
+        await asyncio.sleep(0.05)
+        # A deploy holds the lock, so nothing is published until it is done
+        assert fake_lambda.versions == 0 and not setting.done()
+    await setting
+    assert fake_lambda.aliases == {("agent", "live"): "1"}
+
+    # A redeploy publishes the new code and moves the alias to it
+    async with function_lock("agent", "us-west-2"):
+        assert await pool.advance_alias("agent", "us-west-2") == "2"
+    assert fake_lambda.aliases == {("agent", "live"): "2"}
+    assert fake_lambda.provisioned == {("agent", "live"): 2}
+
+
+@pytest.mark.asyncio
+async def test_keep_warm_pings_and_cold_start_report(fake_lambda):
+    history, pool = fake_lambda.history, fake_lambda.pool
+    for i in range(10):
+        history.record("agent", "us-west-2", {"duration_ms": 10.0, "init_duration_ms": 500.0 if i % 2 else None},
+                       invoked_at=time.time() - 600 + i)
+    app = FastAPI()
+    app.include_router(management_router, prefix="/management")
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.put("/management/warm-pool/agent/keep-warm", json={"concurrency": 3, "region": "us-west-2"})
+        for _ in range(100):
+            if len(fake_lambda.invocations) == 3 and pool.targets()[0]["pings"] == 3:
+                break
+            await asyncio.sleep(0.01)
+        await ac.post("/management/invoke-lambda", json={"function_name": "agent", "payload": {}, "region": "us-west-2"})
+        report = (await ac.get("/management/cold-starts?function_name=agent")).json()["functions"][0]
+    await pool.stop()
+
+    assert response.status_code == 200 and response.json()["target"]["interval_s"] == 300
+    assert [call[2] for call in fake_lambda.invocations[:3]] == [WARMUP_EVENT] * 3
+    assert len(history.invocations("agent", source=SOURCE_KEEP_WARM)) == 3
+    assert report["modes"] == ["keep_warm"]
+    assert report["before"]["cold_start_rate"] == 0.5
+    # The pings warmed the environment, so the caller's invocation was warm
+    assert report["after"] == {"invocations": 1, "cold_starts": 0, "cold_start_rate": 0.0, "init_duration_ms": None}
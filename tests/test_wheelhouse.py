@@ -0,0 +1,77 @@
+import pytest
+
+from deployment.aws import deploy as deploy_module
+from services.deploy_jobs import DeployJobManager, JobStore
+from services.wheelhouse import InvalidRequirements, parse_requirements, python_version_for_image
+
+
+def deploy_request(**overrides):
+    request = {
+        "python_script": "def lambda_handler(event, context):\n    return 'ok'\n",
+        "requirements": "requests==2.31.0  # http\n\n--extra-index-url https://example.com/simple\n",
+        "repository_name": "agents",
+        "image_tag": "v1",
+        "region": "us-west-2",
+        "function_name": "agent-0",
+        "use_build_cache": False,
+    }
+    request.update(overrides)
+    return request
+
+
+@pytest.fixture
+def manager(tmp_path, fake_toolchain):
+    manager = DeployJobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")))
+    manager.register("dockerdeploy", deploy_module.run_deploy_pipeline)
+    return manager
+
+
+def test_parse_requirements():
+    assert parse_requirements("requests==2.31.0  # http\n\n--extra-index-url https://x\nboto3>=1.0; python_version>'3'\n") == [
+        "requests==2.31.0",
+        "boto3>=1.0; python_version>'3'",
+    ]
+    with pytest.raises(InvalidRequirements, match="line 2"):
+        parse_requirements("requests\n-r other.txt\n")
+    with pytest.raises(InvalidRequirements):
+        parse_requirements("not a requirement!\n")
+    assert python_version_for_image("public.ecr.aws/lambda/python:3.9") == "3.9"
+    assert python_version_for_image("python:3.11-slim") == "3.11"
+    assert python_version_for_image("ubuntu:22.04") is None
+
+
+@pytest.mark.asyncio
+async def test_image_mode_skips_host_install(manager, fake_toolchain):
+    job = await manager.wait(manager.submit("dockerdeploy", deploy_request()))
+
+    assert job["status"] == "succeeded"
+    stages = [stage["name"] for stage in job["stages"]]
+    assert "create_venv" not in stages and "install_dependencies" not in stages
+    assert stages[0] == "validate_requirements"
+    assert job["metrics"]["dependency_mode"] == "image"
+
+
+@pytest.mark.asyncio
+async def test_wheelhouse_is_resolved_once_and_mounted(manager, fake_toolchain):
+    baseline = await manager.wait(manager.submit("dockerdeploy", deploy_request(dependency_mode="host_venv")))
+    first = await manager.wait(manager.submit("dockerdeploy", deploy_request(dependency_mode="wheelhouse")))
+    second = await manager.wait(manager.submit("dockerdeploy", deploy_request(dependency_mode="wheelhouse")))
+
+    assert [job["status"] for job in (baseline, first, second)] == ["succeeded"] * 3
+    assert baseline["metrics"]["host_install_baseline_s"] is not None
+    assert second["metrics"]["dependency_time_saved_s"] is not None
+    assert second["result"]["dependency_time_saved_s"] == second["metrics"]["dependency_time_saved_s"]
+
+    commands = fake_toolchain.commands()
+    builds = [command for command in commands if command.startswith("build")]
+    assert all("--build-context wheelhouse=" in build for build in builds[1:])
+    assert "Requirements already resolved in the wheelhouse" in second["logs"]
+
+
+@pytest.mark.asyncio
+async def test_invalid_requirements_fail_before_building(manager, fake_toolchain):
+    job = await manager.wait(manager.submit("dockerdeploy", deploy_request(requirements="-e ./local\n")))
+
+    assert job["status"] == "failed"
+    assert "unsupported option" in job["error"]
+    assert fake_toolchain.build_count() == 0
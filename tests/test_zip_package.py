@@ -0,0 +1,173 @@
+import io
+import zipfile
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from deployment.aws import deploy as deploy_module
+from services.deploy_jobs import DeployJobManager, JobStore
+from services import layer_manager as layer_manager_module
+from services.layer_manager import LayerManager
+from services.zip_packager import ZipPackageCache
+
+
+def make_wheel(path):
+    with zipfile.ZipFile(path, "w") as wheel:
+        wheel.writestr("dep/__init__.py", "X = 1\n")
+        wheel.writestr("dep-1.0.data/purelib/dep_extra.py", "Y = 2\n")
+        wheel.writestr("dep-1.0.data/scripts/dep-cli", "#!/bin/sh\n")
+    return str(path)
+
+
+def zip_request(**overrides):
+    return {
+        "python_script": "def lambda_handler(event, context):\n    return event\n",
+        "requirements": "fakepkg==1.0\n",
+        "repository_name": "agents",
+        "image_tag": "v1",
+        "region": "us-west-2",
+        "function_name": "zip-agent",
+        "package_type": "Zip",
+        "dependency_layer": "never",
+        **overrides,
+    }
+
+
+async def run_jobs(tmp_path, *requests):
+    manager = DeployJobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")))
+    manager.register("deploy", deploy_module.run_deploy_pipeline)
+    return [await manager.wait(manager.submit("deploy", request)) for request in requests]
+
+
+def test_zip_packages_are_deterministic_and_cached(tmp_path):
+    wheel = make_wheel(tmp_path / "dep-1.0-py3-none-any.whl")
+    sources = {"app.py": b"print('hi')\n"}
+    first = ZipPackageCache(str(tmp_path / "a")).build(sources, [wheel])
+    cache = ZipPackageCache(str(tmp_path / "b"))
+    second = cache.build(sources, [wheel])
+    again = cache.build(sources, [wheel])
+
+    with open(first["path"], "rb") as f, open(second["path"], "rb") as g:
+        assert f.read() == g.read()
+    assert first["code_sha256"] == second["code_sha256"] == again["code_sha256"]
+    assert (second["cached"], again["cached"]) == (False, True)
+    assert cache.stats()["hits"] == 1
+    with zipfile.ZipFile(first["path"]) as package:
+        assert package.namelist() == ["app.py", "dep/__init__.py", "dep_extra.py"]
+        assert {info.date_time for info in package.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+    assert cache.build({"app.py": b"print('bye')\n"}, [wheel])["input_hash"] != second["input_hash"]
+
+
+@pytest.mark.asyncio
+async def test_zip_deploy_skips_docker(tmp_path, fake_toolchain):
+    first, second = await run_jobs(tmp_path, zip_request(), zip_request(function_name="zip-agent-2"))
+
+    assert [job["status"] for job in (first, second)] == ["succeeded", "succeeded"]
+    assert first["result"]["package_type"] == "Zip"
+    assert (first["result"]["package_cache"], second["result"]["package_cache"]) == ("miss", "hit")
+    assert first["result"]["code_sha256"] == second["result"]["code_sha256"]
+    assert not any(command.startswith(("build", "push")) for command in fake_toolchain.commands())
+
+    function = fake_toolchain.client.functions["zip-agent"]
+    assert function["PackageType"] == "Zip"
+    assert (function["Runtime"], function["Handler"]) == ("python3.9", "app.lambda_handler")
+    with zipfile.ZipFile(io.BytesIO(function["Code"]["ZipFile"])) as package:
+        assert package.namelist() == [
+            "agileagents_payload.py", "app.py", "fakepkg-1.0.dist-info/METADATA", "fakepkg/__init__.py"
+        ]
+
+
+@pytest.mark.asyncio
+async def test_zip_deploys_without_a_usable_handler_are_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(deploy_module, "deploy_jobs", DeployJobManager(store=JobStore(str(tmp_path / "jobs.sqlite3"))))
+    app = FastAPI()
+    app.include_router(deploy_module.deploy_router, prefix="/deployment")
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        responses = [
+            await ac.post("/deployment/dockerdeploy", json=zip_request(dockerfile_cmd=cmd))
+            for cmd in ("app.lambda_handler", "[]", '[1]', '{"handler": "app.lambda_handler"}')
+        ]
+
+    assert [response.status_code for response in responses] == [400] * 4
+    assert "set handler for zip packages" in responses[0].json()["detail"]
+    assert deploy_module.deploy_jobs.list() == []
+    assert deploy_module.zip_package_handler("app.main", "not json") == "app.main"
+
+
+@pytest.mark.asyncio
+async def test_large_zip_packages_go_through_s3(tmp_path, fake_toolchain, monkeypatch):
+    monkeypatch.setattr(deploy_module, "ZIP_DIRECT_UPLOAD_MAX_MB", 0)
+    monkeypatch.setattr(deploy_module, "ZIP_S3_BUCKET", None)
+    missing_bucket, uploaded = await run_jobs(
+        tmp_path, zip_request(), zip_request(s3_bucket="packages-{region}")
+    )
+
+    assert missing_bucket["status"] == "failed"
+    assert "s3_bucket" in missing_bucket["error"]
+    assert uploaded["status"] == "succeeded"
+    bucket, key = fake_toolchain.client.uploads[0]
+    assert bucket == "packages-us-west-2"
+    assert fake_toolchain.client.functions["zip-agent"]["Code"] == {"S3Bucket": bucket, "S3Key": key}
+
+
+@pytest.mark.asyncio
+async def test_shared_requirements_are_published_once_as_a_layer(tmp_path, fake_toolchain):
+    jobs = await run_jobs(tmp_path, *(
+        zip_request(function_name=f"agent-{i}", dependency_layer="auto") for i in (0, 1, 2, 0)
+    ))
+
+    assert [job["result"]["dependency_layer"] for job in jobs] == [None, "published", "reused", "reused"]
+    client = fake_toolchain.client
+    (layer_arn, content), = client.layers.items()
+    with zipfile.ZipFile(io.BytesIO(content["ZipFile"])) as layer:
+        assert "python/fakepkg/__init__.py" in layer.namelist()
+    # agent-0 bundled its dependencies at first and attaches the layer on redeploy
+    for name in ("agent-0", "agent-1", "agent-2"):
+        assert client.functions[name]["Layers"] == [layer_arn]
+        with zipfile.ZipFile(io.BytesIO(client.functions[name]["Code"]["ZipFile"])) as package:
+            assert package.namelist() == ["agileagents_payload.py", "app.py"]
+
+    stats = deploy_module.layer_manager.stats()
+    assert (stats["layers"], stats["reuses"], stats["shared_sets"]) == (1, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_redeploys_of_one_function_do_not_share_its_requirements(tmp_path, fake_toolchain):
+    jobs = await run_jobs(tmp_path, *(zip_request(dependency_layer="auto") for _ in range(3)))
+
+    assert [job["result"]["dependency_layer"] for job in jobs] == [None, None, None]
+    assert fake_toolchain.client.layers == {}
+    stats = deploy_module.layer_manager.stats()
+    assert (stats["dependency_sets"], stats["deploys"], stats["shared_sets"]) == (1, 3, 0)
+
+
+def test_a_missing_layer_evicts_only_its_python_version(tmp_path, monkeypatch):
+    class FakeLambda:
+        class exceptions:
+            class ResourceNotFoundException(Exception):
+                pass
+
+        def __init__(self):
+            self.arns = set()
+
+        def publish_layer_version(self, LayerName, **kwargs):
+            arn = f"arn:aws:lambda:us-west-2:123456789012:layer:{LayerName}:1"
+            self.arns.add(arn)
+            return {"LayerVersionArn": arn}
+
+        def get_layer_version_by_arn(self, Arn):
+            if Arn not in self.arns:
+                raise self.exceptions.ResourceNotFoundException()
+
+    fake = FakeLambda()
+    monkeypatch.setattr(layer_manager_module, "get_aws_client", lambda service_name, region_name=None: fake)
+    manager = LayerManager(str(tmp_path / "layers.sqlite3"))
+    py311 = manager.publish("abc", "3.11", "us-west-2", {"ZipFile": b""}, 0, "python3.11")
+    manager.publish("abc", "3.12", "us-west-2", {"ZipFile": b""}, 0, "python3.12")
+    fake.arns.discard(py311["layer_version_arn"])
+
+    assert manager.lookup("abc", "3.11", "us-west-2") is None
+    assert manager.lookup("abc", "3.12", "us-west-2") is not None
+    assert [entry["python_version"] for entry in manager.inventory()] == ["3.12"]
@@ -0,0 +1,179 @@
+# payload_codec.py
+#
+# Encoding of large invocation payloads and responses. This module only
+# depends on the standard library (orjson and boto3 are used when present),
+# because deployments also ship it next to the agent as agileagents_payload.py.
+
+import base64
+import functools
+import gzip
+import json
+import os
+import uuid
+
+try:
+    import orjson
+except ImportError:  # Agents may not ship orjson; the standard library encoder is used instead
+    orjson = None
+
+# Key of the envelope that replaces a compressed or offloaded payload
+ENVELOPE_KEY = "agileagents_payload"
+ENCODING_GZIP = "gzip"
+ENCODING_S3 = "s3"
+
+# Payloads above this size are gzipped
+PAYLOAD_GZIP_THRESHOLD_BYTES = int(os.getenv("PAYLOAD_GZIP_THRESHOLD_BYTES", str(64 * 1024)))
+# Largest payloads Lambda accepts inline, minus headroom for the envelope
+LAMBDA_SYNC_PAYLOAD_LIMIT_BYTES = int(os.getenv("LAMBDA_SYNC_PAYLOAD_LIMIT_BYTES", str(6 * 1024 * 1024 - 4096)))
+LAMBDA_ASYNC_PAYLOAD_LIMIT_BYTES = int(os.getenv("LAMBDA_ASYNC_PAYLOAD_LIMIT_BYTES", str(256 * 1024 - 4096)))
+# Bucket and key prefix for payloads too large even when gzipped ({region} in the bucket is replaced)
+PAYLOAD_S3_BUCKET = os.getenv("AGILEAGENTS_PAYLOAD_BUCKET")
+PAYLOAD_S3_PREFIX = os.getenv("AGILEAGENTS_PAYLOAD_PREFIX", "agileagents-payloads/")
+
+# Module name under which deployments ship this file next to the agent's app.py
+AGENT_MODULE_NAME = "agileagents_payload.py"
+
+class PayloadTooLarge(Exception):
+    """Raised when a payload exceeds the inline limit even when gzipped and no bucket is configured."""
+
+# Function to get the payload bucket for a region
+def payload_bucket(region=None):
+    region = region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
+    return PAYLOAD_S3_BUCKET.replace("{region}", region) if PAYLOAD_S3_BUCKET else None
+
+# Function to serialize an object to JSON bytes, with orjson when it is installed
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=str, separators=(",", ":")).encode("utf-8")
+
+# Function to parse JSON bytes or text, with orjson when it is installed
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Function to encode a payload so it fits the inline limit of an invocation
+def encode_payload(obj, max_inline_bytes=None, bucket=None, s3_client=None, gzip_threshold_bytes=None):
+    """
+    Serialize a payload, compressing or offloading it when it is large.
+
+    Payloads up to gzip_threshold_bytes are sent as plain JSON. Larger ones
+    are gzipped and wrapped in an envelope; if that still exceeds
+    max_inline_bytes, the gzipped body is uploaded to S3 and the envelope
+    carries its location instead.
+
+    Args:
+        obj: The JSON-serializable payload.
+        max_inline_bytes (int, optional): The largest body that may be sent inline.
+            Defaults to LAMBDA_SYNC_PAYLOAD_LIMIT_BYTES.
+        bucket (str, optional): The bucket for offloaded payloads.
+        s3_client (optional): The S3 client used to upload offloaded payloads.
+        gzip_threshold_bytes (int, optional): Defaults to PAYLOAD_GZIP_THRESHOLD_BYTES.
+
+    Returns:
+        tuple: The body (bytes) and, for an envelope, its encoding and original
+            size, plus the bucket and key of an offloaded payload; None for plain JSON.
+    """
+    body = dumps(obj)
+    max_inline_bytes = LAMBDA_SYNC_PAYLOAD_LIMIT_BYTES if max_inline_bytes is None else max_inline_bytes
+    threshold = PAYLOAD_GZIP_THRESHOLD_BYTES if gzip_threshold_bytes is None else gzip_threshold_bytes
+    if len(body) <= min(threshold, max_inline_bytes):
+        return body, None
+    compressed = gzip.compress(body, compresslevel=6)
+    envelope = dumps({ENVELOPE_KEY: {
+        "encoding": ENCODING_GZIP, "size": len(body), "data": base64.b64encode(compressed).decode("ascii")
+    }})
+    if len(envelope) <= max_inline_bytes:
+        return envelope, {"encoding": ENCODING_GZIP, "size": len(body)}
+    if not bucket or s3_client is None:
+        raise PayloadTooLarge(
+            f"Payload of {len(body)} bytes exceeds {max_inline_bytes} bytes even when gzipped; "
+            "set AGILEAGENTS_PAYLOAD_BUCKET to offload it to S3"
+        )
+    key = f"{PAYLOAD_S3_PREFIX}{uuid.uuid4().hex}.json.gz"
+    s3_client.put_object(Bucket=bucket, Key=key, Body=compressed, ContentEncoding="gzip",
+                         ContentType="application/json")
+    info = {"encoding": ENCODING_S3, "size": len(body), "bucket": bucket, "key": key}
+    return dumps({ENVELOPE_KEY: info}), dict(info)
+
+# Function to get the envelope of an encoded payload, if it is one
+def payload_envelope(obj):
+    if isinstance(obj, dict) and len(obj) == 1 and isinstance(obj.get(ENVELOPE_KEY), dict):
+        return obj[ENVELOPE_KEY]
+    return None
+
+# Function to restore a payload produced by encode_payload
+def decode_payload(obj, s3_client=None, delete=False):
+    """
+    Restore a payload from its envelope; plain payloads are returned unchanged.
+
+    Args:
+        obj: The parsed payload.
+        s3_client (optional): The S3 client used to fetch offloaded payloads.
+        delete (bool): Delete an offloaded payload's object once it has been read.
+
+    Returns:
+        The original payload.
+    """
+    envelope = payload_envelope(obj)
+    if envelope is None:
+        return obj
+    if envelope["encoding"] == ENCODING_GZIP:
+        return loads(gzip.decompress(base64.b64decode(envelope["data"])))
+    if envelope["encoding"] == ENCODING_S3:
+        body = s3_client.get_object(Bucket=envelope["bucket"], Key=envelope["key"])["Body"].read()
+        if delete:
+            s3_client.delete_object(Bucket=envelope["bucket"], Key=envelope["key"])
+        return loads(gzip.decompress(body))
+    raise ValueError(f"Unknown payload encoding {envelope['encoding']}")
+
+def _default_s3_client():
+    import boto3
+    return boto3.client("s3")
+
+# Decorator for agent handlers that receive and return large payloads
+def payload_handler(handler=None, max_response_bytes=None):
+    """
+    Wrap a Lambda handler so it sees plain events and may return large results.
+
+    Deployed agents can import this module as agileagents_payload:
+
+        from agileagents_payload import payload_handler
+
+        @payload_handler
+        def lambda_handler(event, context):
+            ...
+
+    Compressed and offloaded events are restored before the handler runs;
+    offloaded events are left in place, since one object may feed a whole
+    fan-out or a retried asynchronous event. Large results are encoded
+    the same way; they are offloaded to AGILEAGENTS_PAYLOAD_BUCKET or, if
+    that is not set, the bucket the event came from.
+    """
+    if handler is None:
+        return functools.partial(payload_handler, max_response_bytes=max_response_bytes)
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        envelope = payload_envelope(event)
+        s3_client = _default_s3_client() if envelope and envelope["encoding"] == ENCODING_S3 else None
+        result = handler(decode_payload(event, s3_client), context)
+        body = dumps(result)
+        if len(body) <= PAYLOAD_GZIP_THRESHOLD_BYTES:
+            return result
+        bucket = payload_bucket() or (envelope or {}).get("bucket")
+        try:
+            encoded, _ = encode_payload(result, max_response_bytes, bucket, s3_client)
+        except PayloadTooLarge:
+            if not bucket or s3_client is not None:
+                raise
+            encoded, _ = encode_payload(result, max_response_bytes, bucket, _default_s3_client())
+        return loads(encoded)
+
+    return wrapper
+
+# Function to get the source of this module, to ship it with a deployed agent
+def agent_module_source():
+    with open(__file__, "rb") as f:
+        return f.read()
@@ -0,0 +1,10 @@
+import os
+
+# Directory for local state that must survive a worker restart (job database, caches)
+STATE_DIR = os.getenv("AGILEAGENTS_STATE_DIR", os.path.join(os.path.expanduser("~"), ".agileagents"))
+
+# Function to get the path of a file in the local state directory
+def get_state_path(*parts):
+    path = os.path.join(STATE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,38 @@
+import json
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# Function to encode one record as an NDJSON line
+def format_ndjson(record):
+    return json.dumps(record, default=str) + "\n"
+
+# Function to encode one record as a server-sent event
+def format_sse(record, event=None):
+    message = ""
+    if event:
+        message += f"event: {event}\n"
+    message += f"data: {json.dumps(record, default=str)}\n\n"
+    return message
+
+# Function to encode records of an async iterator in the requested stream format
+async def encode_stream(records, stream_format="ndjson"):
+    """
+    Encode (event, record) pairs as NDJSON lines or server-sent events.
+
+    Args:
+        records (AsyncIterator[tuple]): Pairs of event name and JSON-serializable record.
+        stream_format (str): 'ndjson' or 'sse'.
+
+    Yields:
+        str: Encoded chunks ready for a StreamingResponse.
+    """
+    async for event, record in records:
+        if stream_format == "sse":
+            yield format_sse(record, event=event)
+        else:
+            yield format_ndjson({"type": event, **record})
+
+# Function to get the media type for a stream format
+def stream_media_type(stream_format):
+    return SSE_MEDIA_TYPE if stream_format == "sse" else NDJSON_MEDIA_TYPE
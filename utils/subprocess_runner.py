@@ -0,0 +1,112 @@
+import asyncio
+import collections
+import os
+import subprocess
+import time
+
+# Default timeout for one command of a build step, in seconds
+COMMAND_TIMEOUT_S = float(os.getenv("COMMAND_TIMEOUT_S", "1800"))
+# Lines of stdout/stderr kept per command; older output is dropped
+COMMAND_OUTPUT_MAX_LINES = int(os.getenv("COMMAND_OUTPUT_MAX_LINES", "2000"))
+# Seconds a terminated process gets to exit before it is killed
+TERMINATE_GRACE_S = 5.0
+
+_READ_CHUNK = 64 * 1024
+
+class CommandTimeout(subprocess.TimeoutExpired):
+    pass
+
+async def _read_lines(stream, name, buffer, on_line):
+    # Read in chunks rather than readline() so very long lines (progress bars) cannot overflow the reader
+    pending = ""
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            break
+        pending += chunk.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            buffer.append(line)
+            if on_line is not None:
+                on_line(name, line)
+    if pending:
+        buffer.append(pending)
+        if on_line is not None:
+            on_line(name, pending)
+
+async def _stop(process):
+    if process.returncode is not None:
+        return
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), TERMINATE_GRACE_S)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+# Function to run a command without blocking the event loop
+async def run_command(cmd, input=None, timeout=None, on_line=None, max_lines=None, cwd=None, env=None):
+    """
+    Run a command as an asyncio subprocess, streaming its output line by line.
+
+    Output is kept in bounded ring buffers, so a verbose `docker build`
+    never holds more than max_lines lines per stream in memory. The
+    process is terminated (then killed) when the timeout expires or the
+    calling task is cancelled.
+
+    Args:
+        cmd (list): The command and its arguments.
+        input (str, optional): Text written to the command's stdin.
+        timeout (float, optional): Seconds before the command is stopped.
+            Defaults to COMMAND_TIMEOUT_S; 0 disables the timeout.
+        on_line (callable, optional): Called as on_line(stream, line) for
+            every output line, with stream "stdout" or "stderr".
+        max_lines (int, optional): Lines kept per stream. Defaults to COMMAND_OUTPUT_MAX_LINES.
+        cwd (str, optional): The working directory.
+        env (dict, optional): The environment.
+
+    Returns:
+        subprocess.CompletedProcess: The return code and the retained stdout and stderr.
+
+    Raises:
+        CommandTimeout: If the command did not finish in time.
+    """
+    timeout = COMMAND_TIMEOUT_S if timeout is None else timeout
+    max_lines = max_lines or COMMAND_OUTPUT_MAX_LINES
+    stdout = collections.deque(maxlen=max_lines)
+    stderr = collections.deque(maxlen=max_lines)
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+        env=env
+    )
+
+    async def communicate():
+        if input is not None:
+            process.stdin.write(input.encode("utf-8"))
+            try:
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            process.stdin.close()
+        await asyncio.gather(
+            _read_lines(process.stdout, "stdout", stdout, on_line),
+            _read_lines(process.stderr, "stderr", stderr, on_line)
+        )
+        return await process.wait()
+
+    start = time.monotonic()
+    try:
+        returncode = await asyncio.wait_for(communicate(), timeout or None)
+    except asyncio.TimeoutError:
+        await _stop(process)
+        raise CommandTimeout(cmd, timeout, "\n".join(stdout), "\n".join(stderr))
+    except asyncio.CancelledError:
+        await asyncio.shield(_stop(process))
+        raise
+    result = subprocess.CompletedProcess(cmd, returncode, "\n".join(stdout), "\n".join(stderr))
+    result.duration_s = round(time.monotonic() - start, 3)
+    return result